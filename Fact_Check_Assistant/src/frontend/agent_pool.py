@@ -0,0 +1,185 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator, List, Optional, Tuple
+
+import anyio
+from mcp import StdioServerParameters, stdio_client
+from mcp.shared.exceptions import McpError
+from strands import Agent
+from strands.agent.state import AgentState
+from strands.telemetry.metrics import EventLoopMetrics
+from strands.tools.mcp import MCPClient
+from strands.types.exceptions import MCPClientInitializationError
+
+logger = logging.getLogger(__name__)
+
+# Errors of the connection to the MCP server, as opposed to e.g. Bedrock throttling the model
+MCP_TRANSPORT_ERRORS = (
+    McpError,
+    MCPClientInitializationError,
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    BrokenPipeError,
+)
+
+
+def create_duckduckgo_mcp_client() -> MCPClient:
+    """Create the MCP client of the DuckDuckGo search server"""
+    return MCPClient(
+        lambda: stdio_client(
+            StdioServerParameters(
+                command="uvx",
+                args=["duckduckgo-mcp-server"],
+            )
+        )
+    )
+
+
+def is_mcp_transport_error(error: BaseException) -> bool:
+    """Whether an error, or the error it was raised from, comes from the MCP connection"""
+    while error is not None:
+        if isinstance(error, MCP_TRANSPORT_ERRORS):
+            return True
+        error = error.__cause__
+    return False
+
+
+class SharedMCPClient:
+    """
+    An MCP client connected once and shared by all requests.
+
+    Entering `with client:` for every request spawns a new MCP server subprocess each time.
+    Instead, the server is started on first use and stays connected until the process exits.
+    The MCP session multiplexes requests, so its tools can be called from several threads at
+    the same time.
+
+    Every connection has a generation number, which increases when the client is reset. Agents built
+    with the tools of a generation are only reused while that generation is connected.
+
+    Args:
+        create: Returns a new, not yet started, MCPClient
+    """
+
+    def __init__(self, create: Callable[[], MCPClient]):
+        self._create = create
+        self._client = None
+        self._tools = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def connection(self) -> Tuple[int, Optional[List]]:
+        """
+        Return the generation and the tools of the MCP server, connecting to it if needed.
+
+        Returns:
+            The generation of the connection, and the MCP tools or None if the server could not be started
+        """
+        with self._lock:
+            if self._client is None:
+                try:
+                    client = self._create()
+                    client.start()
+                except Exception as e:
+                    logger.warning(f"Failed to start MCP client: {e}")
+                    return self._generation, None
+                try:
+                    self._tools = client.list_tools_sync()
+                except Exception as e:
+                    logger.warning(f"Failed to list MCP tools: {e}")
+                    client.stop(None, None, None)
+                    return self._generation, None
+                self._client = client
+            return self._generation, self._tools
+
+    def tools(self) -> Optional[List]:
+        """Return the tools of the MCP server, or None if the server could not be started"""
+        return self.connection()[1]
+
+    def reset(self, generation: Optional[int] = None):
+        """
+        Disconnect from the MCP server, the next request starts a new one.
+
+        Args:
+            generation: Only reset if this connection is still the current one, so that requests
+                failing on the same broken connection do not also reset its replacement
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            client, self._client, self._tools = self._client, None, None
+            self._generation += 1
+        if client is not None:
+            try:
+                client.stop(None, None, None)
+            except Exception as e:
+                logger.warning(f"Failed to stop MCP client: {e}")
+
+
+class AgentPool:
+    """
+    Agents built once per configuration and reused across requests.
+
+    A Strands Agent keeps its conversation in `messages` and handles one call at a time, so each
+    request takes an idle agent of its configuration (or builds one when all are busy) and starts
+    it with an empty conversation, state and metrics. Agents that fail are dropped instead of
+    being reused.
+    """
+
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clear(agent: Agent):
+        agent.messages = []
+        agent.state = AgentState()
+        agent.event_loop_metrics = EventLoopMetrics()
+
+    @contextmanager
+    def agent(
+        self, key: Hashable, build: Callable[[], Agent], generation: int = 0
+    ) -> Iterator[Agent]:
+        """
+        Borrow an agent for one request.
+
+        Args:
+            key: Identifies the configuration (model, prompt and tools) of the agent
+            build: Creates a new agent of that configuration
+            generation: Generation of the MCP connection whose tools the agent uses, idle agents
+                of another generation are dropped
+
+        Yields:
+            An agent with an empty conversation
+        """
+        with self._lock:
+            if self._generations.get(key, generation) != generation:
+                self._idle.pop(key, None)
+            self._generations[key] = generation
+            agent = self._idle[key].pop() if self._idle[key] else None
+        if agent is None:
+            agent = build()
+        self._clear(agent)
+
+        yield agent
+
+        self._clear(agent)
+        with self._lock:
+            # Agents of an older connection are not given back, their tools no longer work
+            if self._generations[key] == generation:
+                self._idle[key].append(agent)
+
+
+duckduckgo_mcp = SharedMCPClient(create_duckduckgo_mcp_client)
+agent_pool = AgentPool()
+
+atexit.register(duckduckgo_mcp.reset)
+
+
+def warm_up():
+    """Start the MCP server in the background, so the first request does not wait for it"""
+    threading.Thread(target=duckduckgo_mcp.tools, daemon=True).start()
@@ -1,5 +1,6 @@
 import logging
 import sys
+import time
 from pathlib import Path
 
 import streamlit as st
@@ -15,7 +16,12 @@ logger = logging.getLogger(__name__)
 
 try:
     # Import fact_check_supervisor directly
-    from fact_check_supervisor import fact_check_supervisor
+    from agent_pool import warm_up
+    from fact_check_supervisor import (
+        PipelineResult,
+        fact_check_pipeline,
+        fact_check_supervisor,
+    )
 
     logger.info("Successfully imported fact_check_supervisor")
 except Exception as e:
@@ -23,6 +29,16 @@ except Exception as e:
     st.error(f"Application startup error: {e}")
     st.stop()
 
+
+# Connect to the MCP server once per process, while the page loads
+@st.cache_resource
+def start_agent_pool():
+    warm_up()
+    return True
+
+
+start_agent_pool()
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="Fact Check Assistant",
@@ -49,6 +65,9 @@ if "captions_content" not in st.session_state:
 if "captions_loaded" not in st.session_state:
     st.session_state.captions_loaded = False
 
+if "orchestration" not in st.session_state:
+    st.session_state.orchestration = "supervisor"
+
 # Configuration
 ASSETS_DIR = Path(__file__).parent / "assets"
 
@@ -91,8 +110,22 @@ def is_asking_about_captions(message):
     return any(keyword.lower() in message.lower() for keyword in caption_keywords)
 
 
+def describe_latency(response, elapsed):
+    """One line with the latency of each stage, to compare the orchestration modes"""
+    if isinstance(response, PipelineResult):
+        latency = response.stage_latency
+        parts = [f"Claim detection {latency['claim_detection']:.1f}s"]
+        if "verification" in latency:
+            parts.append(
+                f"Verification of {len(response.claims)} claims {latency['verification']:.1f}s"
+            )
+            parts.append(f"Synthesis {latency['synthesis']:.1f}s")
+        return f"⏱️ Pipeline: {' · '.join(parts)} · Total {elapsed:.1f}s"
+    return f"⏱️ Supervisor: Total {elapsed:.1f}s"
+
+
 def send_message_to_supervisor(message):
-    """Send message to fact_check_supervisor"""
+    """Send message to fact_check_supervisor, or to the fact-check pipeline in pipeline mode"""
     try:
         # Include captions if analyzing video content
         message_to_send = message
@@ -100,11 +133,16 @@ def send_message_to_supervisor(message):
             message_to_send = f"{message}\n\n[CAPTIONS TO ANALYZE]:\n{st.session_state.captions_content}"
 
         # Call the supervisor directly
-        response = fact_check_supervisor(message_to_send)
-        return response, st.session_state.session_id
+        start = time.perf_counter()
+        if st.session_state.orchestration == "pipeline":
+            response = fact_check_pipeline(message_to_send)
+        else:
+            response = fact_check_supervisor(message_to_send)
+        latency = describe_latency(response, time.perf_counter() - start)
+        return response, st.session_state.session_id, latency
     except Exception as e:
         logging.error(f"Error using fact_check_supervisor: {str(e)}")
-        return f"Error: {str(e)}", None
+        return f"Error: {str(e)}", None, None
 
 
 def send_predefined_message(message):
@@ -112,7 +150,7 @@ def send_predefined_message(message):
     st.session_state.messages.append({"role": "user", "content": message})
 
     with st.spinner("Analyzing..."):
-        response, new_session_id = send_message_to_supervisor(message)
+        response, new_session_id, latency = send_message_to_supervisor(message)
 
     if new_session_id:
         st.session_state.session_id = new_session_id
@@ -127,7 +165,9 @@ def send_predefined_message(message):
     else:
         response_text = str(response)
 
-    st.session_state.messages.append({"role": "assistant", "content": response_text})
+    st.session_state.messages.append(
+        {"role": "assistant", "content": response_text, "latency": latency}
+    )
     st.rerun()
 
 
@@ -168,6 +208,17 @@ with col1:
 with col2:
     st.subheader("💬 Chat Interface")
 
+    # The supervisor chooses each step, the pipeline verifies all the claims at once
+    st.radio(
+        "Orchestration",
+        options=["supervisor", "pipeline"],
+        format_func=lambda x: (
+            "Supervisor agent" if x == "supervisor" else "Parallel pipeline"
+        ),
+        horizontal=True,
+        key="orchestration",
+    )
+
     # Quick action button
     if st.session_state.captions_loaded:
         if st.button(
@@ -182,6 +233,8 @@ with col2:
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
                 st.write(message["content"])
+                if message.get("latency"):
+                    st.caption(message["latency"])
 
     # Chat input
     if prompt := st.chat_input(
@@ -200,7 +253,9 @@ with col2:
         with chat_container:
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
-                    response, new_session_id = send_message_to_supervisor(prompt)
+                    response, new_session_id, latency = send_message_to_supervisor(
+                        prompt
+                    )
 
                 if new_session_id:
                     st.session_state.session_id = new_session_id
@@ -216,10 +271,12 @@ with col2:
                     response_text = str(response)
 
                 st.write(response_text)
+                if latency:
+                    st.caption(latency)
 
         # Add assistant message to history
         st.session_state.messages.append(
-            {"role": "assistant", "content": response_text}
+            {"role": "assistant", "content": response_text, "latency": latency}
         )
 
 # Footer
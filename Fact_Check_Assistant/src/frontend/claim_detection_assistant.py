@@ -1,5 +1,7 @@
 from strands import Agent, tool
 
+from agent_pool import agent_pool
+
 CLAIM_DETECTION_ASSISTANT_SYSTEM_PROMPT = """
 You are an assistant specialized in identifying erroneous or misleading claims in text.
 
@@ -51,13 +53,15 @@ def claim_detection_assistant(query: str) -> str:
     formatted_query = f"Please identify erroneous or misleading claims with supporting evidence and context: {query}"
 
     try:
-        research_agent = Agent(
-            model="anthropic.claude-3-5-haiku-20241022-v1:0",
-            system_prompt=CLAIM_DETECTION_ASSISTANT_SYSTEM_PROMPT,
-        )
-
-        agent_response = research_agent(formatted_query)
-        text_response = str(agent_response)
+        with agent_pool.agent(
+            "claim_detection_assistant",
+            lambda: Agent(
+                model="anthropic.claude-3-5-haiku-20241022-v1:0",
+                system_prompt=CLAIM_DETECTION_ASSISTANT_SYSTEM_PROMPT,
+            ),
+        ) as research_agent:
+            agent_response = research_agent(formatted_query)
+            text_response = str(agent_response)
 
         if len(text_response) > 0:
             return text_response
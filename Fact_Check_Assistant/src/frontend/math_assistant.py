@@ -1,6 +1,8 @@
 from strands import Agent, tool
 from strands_tools import calculator
 
+from agent_pool import agent_pool
+
 MATH_ASSISTANT_SYSTEM_PROMPT = """
 You are math wizard, a specialized mathematics applying mathematics across a wide variety of domains.
 
@@ -55,15 +57,17 @@ def math_assistant(query: str) -> str:
     formatted_query = f"Please solve the following mathematical problem, showing all steps and explaining concepts clearly: {query}"
 
     try:
-        # Create the math agent with calculator capability
-        math_agent = Agent(
-            model="anthropic.claude-3-5-haiku-20241022-v1:0",
-            tools=[calculator],
-            system_prompt=MATH_ASSISTANT_SYSTEM_PROMPT,
-        )
-
-        agent_response = math_agent(formatted_query)
-        text_response = str(agent_response)
+        # Reuse a math agent with calculator capability
+        with agent_pool.agent(
+            "math_assistant",
+            lambda: Agent(
+                model="anthropic.claude-3-5-haiku-20241022-v1:0",
+                tools=[calculator],
+                system_prompt=MATH_ASSISTANT_SYSTEM_PROMPT,
+            ),
+        ) as math_agent:
+            agent_response = math_agent(formatted_query)
+            text_response = str(agent_response)
 
         if len(text_response) > 0:
             return text_response
@@ -1,6 +1,6 @@
-from mcp import StdioServerParameters, stdio_client
 from strands import Agent, tool
-from strands.tools.mcp import MCPClient
+
+from agent_pool import agent_pool, duckduckgo_mcp, is_mcp_transport_error
 
 RESEARCH_ASSISTANT_SYSTEM_PROMPT = """
 You are an assistant specialized in identifying erroneous or misleading claims in text.
@@ -38,23 +38,6 @@ Output:
 No erroneous claims found.
 """
 
-def create_research_mcp_client():
-    """Create MCP client for research with error handling"""
-    try:
-        return MCPClient(
-            lambda: stdio_client(
-                StdioServerParameters(
-                    command="uvx",
-                    args=["duckduckgo-mcp-server"],
-                )
-            )
-        )
-    except Exception as e:
-        print(f"Failed to create research MCP client: {e}")
-        return None
-
-stdio_mcp_client = create_research_mcp_client()
-
 
 @tool
 def research_assistant(query: str) -> str:
@@ -69,40 +52,48 @@ def research_assistant(query: str) -> str:
     """
     formatted_query = f"Please fact-check this statement and provide a clear verdict (TRUE/FALSE/PARTIALLY TRUE) with supporting evidence and context: {query}"
 
-    # Check if MCP client is available
-    if stdio_mcp_client is not None:
+    # Get the tools of the MCP server, which stays connected between requests
+    generation, tools = duckduckgo_mcp.connection()
+    if tools is not None:
         try:
             print("Routed to Fact Checker with MCP")
-            with stdio_mcp_client:
-                # Get the tools from the MCP server
-                tools = stdio_mcp_client.list_tools_sync()
-
-                # Create an agent with MCP tools and fact-checking prompt
-                fact_checker_agent = Agent(
+            # Reuse an agent with MCP tools and fact-checking prompt
+            with agent_pool.agent(
+                "research_assistant",
+                lambda: Agent(
                     model="anthropic.claude-3-5-haiku-20241022-v1:0",
                     tools=tools,
                     system_prompt=RESEARCH_ASSISTANT_SYSTEM_PROMPT,
-                )
+                ),
+                generation=generation,
+            ) as fact_checker_agent:
                 agent_response = fact_checker_agent(formatted_query)
                 text_response = str(agent_response)
 
-                if len(text_response) > 0:
-                    return text_response
+            if len(text_response) > 0:
+                return text_response
 
-                return "I apologize, but I couldn't fact-check this statement. Please provide a clear, specific claim to verify."
+            return "I apologize, but I couldn't fact-check this statement. Please provide a clear, specific claim to verify."
         except Exception as e:
             print(f"MCP fact-checking failed, using fallback: {e}")
+            # Reconnect on the next request if the MCP server went away, agents holding the old
+            # tools are not reused
+            if is_mcp_transport_error(e):
+                duckduckgo_mcp.reset(generation)
 
     # Fallback without MCP tools
     print("Using fallback fact-checking without external search")
-    fallback_agent = Agent(
-        model="anthropic.claude-3-5-haiku-20241022-v1:0",
-        system_prompt=RESEARCH_ASSISTANT_SYSTEM_PROMPT,
-    )
     
     try:
-        agent_response = fallback_agent(formatted_query)
-        text_response = str(agent_response)
+        with agent_pool.agent(
+            "research_assistant_fallback",
+            lambda: Agent(
+                model="anthropic.claude-3-5-haiku-20241022-v1:0",
+                system_prompt=RESEARCH_ASSISTANT_SYSTEM_PROMPT,
+            ),
+        ) as fallback_agent:
+            agent_response = fallback_agent(formatted_query)
+            text_response = str(agent_response)
         
         if len(text_response) > 0:
             return f"[Note: Limited fact-checking without external search] {text_response}"
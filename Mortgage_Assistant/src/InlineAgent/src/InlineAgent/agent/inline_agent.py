@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, UTC
 
 import json
@@ -6,11 +6,8 @@ import uuid
 import copy
 import os
 import boto3
-from typing import Callable, Dict, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
 from pydantic import Field
-from termcolor import colored
-from rich.console import Console
-from rich.markdown import Markdown
 
 
 from InlineAgent.action_group import ActionGroups
@@ -22,6 +19,12 @@ from InlineAgent.constants import (
 )
 from InlineAgent.agent.process_roc import ProcessROC
 from InlineAgent.observability import Trace
+from InlineAgent.observability.usage import BudgetExceededError, UsageLedger
+from InlineAgent.observability.output import (
+    OutputSink,
+    get_output_sink,
+    use_output_sink,
+)
 from InlineAgent.knowledge_base import KnowledgeBasePlugin
 from InlineAgent.tools.mcp import MCPServer
 from InlineAgent.types import (
@@ -50,6 +53,8 @@ class InlineAgent:
     profile: str = field(default="default")
     user_input: bool = False
     tool_map: Dict[str, Callable] = None
+    # Optional bedrock-agent-runtime client, e.g. a ReplayClient for benchmarks
+    bedrock_agent_runtime_client: Optional[Any] = field(default=None, repr=False)
 
     @property
     def session(self) -> boto3.Session:
@@ -217,189 +222,200 @@ class InlineAgent:
         bedrock_model_configurations: Dict = {
             "performanceConfig": {"latency": "standard"}
         },
+        output_sink: OutputSink = None,
+        usage_ledger: UsageLedger = None,
     ):
-        if session_state is None:
-            session_state = {}
-
-        print(f"SessionId: {session_id}")
-        if "returnControlInvocationResults" in session_state:
-            raise ValueError(
-                "returnControlInvocationResults key is not supported in inlineSessionState"
-            )
+        with use_output_sink(output_sink or get_output_sink()) as sink:
+            if session_state is None:
+                session_state = {}
 
-        if "invocationId" in session_state:
-            raise ValueError("invocationId key is not supported in inlineSessionState")
-
-        agent_answer = ""
-
-        bedrock_agent_runtime = boto3.Session(profile_name=self.profile).client(
-            "bedrock-agent-runtime"
-        )
-
-        inlineSessionState = copy.deepcopy(session_state)
-
-        total_input_tokens = 0
-        total_output_tokens = 0
-        total_llm_calls = 0
-
-        time_before_call = datetime.now(UTC)
-        cite = None
-        orch_step = 0
-        sub_step = 0
-
-        stream_final_response = streaming_configurations["streamFinalResponse"]
-        # print(self.get_invoke_params())
-        while not agent_answer:
-            if inlineSessionState:
-                response = bedrock_agent_runtime.invoke_inline_agent(
-                    sessionId=session_id,
-                    inputText=input_text,
-                    enableTrace=enable_trace,
-                    endSession=end_session,
-                    inlineSessionState=inlineSessionState,
-                    streamingConfigurations=streaming_configurations,
-                    bedrockModelConfigurations=bedrock_model_configurations,
-                    **self.get_invoke_params(),
+            sink.write(f"SessionId: {session_id}")
+            if "returnControlInvocationResults" in session_state:
+                raise ValueError(
+                    "returnControlInvocationResults key is not supported in inlineSessionState"
                 )
-            else:
-                response = bedrock_agent_runtime.invoke_inline_agent(
-                    sessionId=session_id,
-                    inputText=input_text,
-                    enableTrace=enable_trace,
-                    endSession=end_session,
-                    streamingConfigurations=streaming_configurations,
-                    bedrockModelConfigurations=bedrock_model_configurations,
-                    **self.get_invoke_params(),
+
+            if "invocationId" in session_state:
+                raise ValueError(
+                    "invocationId key is not supported in inlineSessionState"
                 )
 
-            if not process_response:
-                return response
+            agent_answer = ""
+
+            bedrock_agent_runtime = self.bedrock_agent_runtime_client
+            if bedrock_agent_runtime is None:
+                bedrock_agent_runtime = boto3.Session(profile_name=self.profile).client(
+                    "bedrock-agent-runtime"
+                )
 
             inlineSessionState = copy.deepcopy(session_state)
 
-            event_stream = response["completion"]
-
-            try:
-                for event in event_stream:
-                    # print(json.dumps(event, indent=2, default=str))
-                    if "files" in event:
-                        files_event = event["files"]
-
-                        console = Console()
-                        print("\n\n")
-                        console.print(Markdown("**Files saved in output directory**"))
-
-                        files_list = files_event["files"]
-                        for idx, this_file in enumerate(files_list):
-                            file_bytes = this_file["bytes"]
-
-                            # save bytes to file, given the name of file and the bytes
-                            directory_path = os.path.join(os.getcwd(), "output")
-                            if not os.path.exists(directory_path):
-                                try:
-                                    os.makedirs(directory_path, exist_ok=True)
-                                except OSError as e:
-                                    print(f"Error creating directory output: {e}")
-                                    raise
-
-                            if not os.path.exists(
-                                os.path.join(directory_path, str(session_id))
-                            ):
-                                try:
-                                    os.makedirs(
-                                        os.path.join(directory_path, str(session_id)),
-                                        exist_ok=True,
-                                    )
-                                except OSError as e:
-                                    print(f"Error creating directory output: {e}")
-                                    raise
+            total_input_tokens = 0
+            total_output_tokens = 0
+            total_llm_calls = 0
+
+            time_before_call = datetime.now(UTC)
+            cite = None
+            orch_step = 0
+            sub_step = 0
+
+            # print(self.get_invoke_params())
+            while not agent_answer:
+                if inlineSessionState:
+                    response = bedrock_agent_runtime.invoke_inline_agent(
+                        sessionId=session_id,
+                        inputText=input_text,
+                        enableTrace=enable_trace,
+                        endSession=end_session,
+                        inlineSessionState=inlineSessionState,
+                        streamingConfigurations=streaming_configurations,
+                        bedrockModelConfigurations=bedrock_model_configurations,
+                        **self.get_invoke_params(),
+                    )
+                else:
+                    response = bedrock_agent_runtime.invoke_inline_agent(
+                        sessionId=session_id,
+                        inputText=input_text,
+                        enableTrace=enable_trace,
+                        endSession=end_session,
+                        streamingConfigurations=streaming_configurations,
+                        bedrockModelConfigurations=bedrock_model_configurations,
+                        **self.get_invoke_params(),
+                    )
 
-                            file_name = os.path.join(
-                                directory_path, str(session_id), this_file["name"]
+                if not process_response:
+                    return response
+
+                inlineSessionState = copy.deepcopy(session_state)
+
+                event_stream = response["completion"]
+
+                try:
+                    for event in event_stream:
+                        # print(json.dumps(event, indent=2, default=str))
+                        if "files" in event:
+                            files_event = event["files"]
+
+                            sink.write("\n\n")
+                            sink.markdown("**Files saved in output directory**")
+
+                            files_list = files_event["files"]
+                            for idx, this_file in enumerate(files_list):
+                                file_bytes = this_file["bytes"]
+
+                                # save bytes to file, given the name of file and the bytes
+                                directory_path = os.path.join(os.getcwd(), "output")
+                                if not os.path.exists(directory_path):
+                                    try:
+                                        os.makedirs(directory_path, exist_ok=True)
+                                    except OSError as e:
+                                        print(f"Error creating directory output: {e}")
+                                        raise
+
+                                if not os.path.exists(
+                                    os.path.join(directory_path, str(session_id))
+                                ):
+                                    try:
+                                        os.makedirs(
+                                            os.path.join(
+                                                directory_path, str(session_id)
+                                            ),
+                                            exist_ok=True,
+                                        )
+                                    except OSError as e:
+                                        print(f"Error creating directory output: {e}")
+                                        raise
+
+                                file_name = os.path.join(
+                                    directory_path, str(session_id), this_file["name"]
+                                )
+                                with open(file_name, "wb") as f:
+                                    f.write(file_bytes)
+
+                        if "returnControl" in event:
+                            inlineSessionState = await ProcessROC.process_roc(
+                                inlineSessionState=inlineSessionState,
+                                roc_event=event["returnControl"],
+                                tool_map=self.tool_map,
                             )
-                            with open(file_name, "wb") as f:
-                                f.write(file_bytes)
-
-                    if "returnControl" in event:
-                        inlineSessionState = await ProcessROC.process_roc(
-                            inlineSessionState=inlineSessionState,
-                            roc_event=event["returnControl"],
-                            tool_map=self.tool_map,
-                        )
 
-                    # Process trace
-                    if "trace" in event and "trace" in event["trace"] and enable_trace:
-
-                        # print(json.dumps(event["trace"], indent=2))
-                        input_tokens, output_tokens, llm_calls = Trace.parse_trace(
-                            trace=event["trace"]["trace"],
-                            truncateResponse=truncate_response,
-                            agentName=self.agent_name,
-                        )
-                        total_input_tokens += int(input_tokens)
-                        total_output_tokens += int(output_tokens)
-                        total_llm_calls += int(llm_calls)
-
-                    # Get Final Answer
-                    if "chunk" in event:
-                        if add_citation:
-                            if "attribution" in event["chunk"]:
-                                agent_answer, cite = Trace.add_citation(
-                                    citations=event["chunk"]["attribution"][
-                                        "citations"
-                                    ],
-                                    cite=1 if not cite else cite,
-                                )
-                            else:
+                        # Process trace
+                        if (
+                            "trace" in event
+                            and "trace" in event["trace"]
+                            and enable_trace
+                        ):
+
+                            # print(json.dumps(event["trace"], indent=2))
+                            input_tokens, output_tokens, llm_calls = Trace.parse_trace(
+                                trace=event["trace"]["trace"],
+                                truncateResponse=truncate_response,
+                                agentName=self.agent_name,
+                            )
+                            total_input_tokens += int(input_tokens)
+                            total_output_tokens += int(output_tokens)
+                            total_llm_calls += int(llm_calls)
+
+                            if usage_ledger is not None:
+                                usage_ledger.record(event["trace"])
+
+                        # Get Final Answer
+                        if "chunk" in event:
+                            if add_citation:
+                                if "attribution" in event["chunk"]:
+                                    agent_answer, cite = Trace.add_citation(
+                                        citations=event["chunk"]["attribution"][
+                                            "citations"
+                                        ],
+                                        cite=1 if not cite else cite,
+                                    )
+                                else:
+                                    data = event["chunk"]["bytes"]
+                                    agent_answer += data.decode("utf8")
+                                    sink.write(
+                                        data.decode("utf8"),
+                                        TraceColor.final_output,
+                                        end="",
+                                    )
+                            elif not add_citation:
                                 data = event["chunk"]["bytes"]
+                                # Only the new text is written, whether or not the
+                                # final response is streamed.
                                 agent_answer += data.decode("utf8")
-                                print(
-                                    colored(
-                                        data.decode("utf8"), TraceColor.final_output
-                                    ),
-                                    end="",
-                                )
-                        elif not add_citation:
-                            data = event["chunk"]["bytes"]
-                            if stream_final_response:
-                                agent_answer += data.decode("utf8")
-                                print(
-                                    colored(
-                                        data.decode("utf8"), TraceColor.final_output
-                                    ),
-                                    end="",
-                                )
-                            else:
-                                agent_answer += data.decode("utf8")
-                                print(
-                                    colored(agent_answer, TraceColor.final_output),
-                                    end="",
+                                sink.write(
+                                    data.decode("utf8"), TraceColor.final_output, end=""
                                 )
 
-            except Exception as e:
-                print(
-                    colored("Caught exception while invoking Agent", TraceColor.error)
-                )
-                print(colored(f"input text: {input_text}", TraceColor.error))
-                print(
-                    colored(
+                except BudgetExceededError as e:
+                    if hasattr(event_stream, "close"):
+                        event_stream.close()
+                    sink.write(f"\nStopped: {e}", TraceColor.error)
+                    raise
+                except Exception as e:
+                    sink.write(
+                        "Caught exception while invoking Agent", TraceColor.error
+                    )
+                    sink.write(f"input text: {input_text}", TraceColor.error)
+                    sink.write(
                         f"request ID: {response['ResponseMetadata']['RequestId']}, retries: {response['ResponseMetadata']['RetryAttempts']}\n",
                         TraceColor.error,
                     )
-                )
-                print(colored(f"Error: {e}", TraceColor.error))
-                raise Exception("Unexpected exception: ", e)
+                    sink.write(f"Error: {e}", TraceColor.error)
+                    raise Exception("Unexpected exception: ", e)
 
-        duration = datetime.now(UTC) - time_before_call
+            duration = datetime.now(UTC) - time_before_call
 
-        print(
-            colored(
+            sink.write(
                 f"\nAgent made a total of {total_llm_calls} LLM calls, "
                 + f"using {total_input_tokens+total_output_tokens} tokens "
                 + f"(in: {total_input_tokens}, out: {total_output_tokens})"
                 + f", and took {duration.total_seconds():,.1f} total seconds",
                 TraceColor.stats,
             )
-        )
 
-        return agent_answer
+            if usage_ledger is not None:
+                if usage_ledger.persist:
+                    usage_ledger.save()
+                sink.event("usage", **asdict(usage_ledger.total))
+
+            return agent_answer
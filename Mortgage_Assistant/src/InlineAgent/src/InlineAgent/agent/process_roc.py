@@ -2,9 +2,9 @@ import copy
 import inspect
 import json
 from typing import Any, Callable, Dict, Union
-from termcolor import colored
 
 from InlineAgent.constants import TraceColor
+from InlineAgent.observability.output import get_output_sink
 
 
 class ProcessROC:
@@ -205,11 +205,8 @@ class ProcessROC:
             else:
                 result = tool_to_invoke(**parameters)
 
-            print(
-                colored(
-                    f"Tool output: {result}",
-                    TraceColor.invocation_input,
-                )
+            get_output_sink().write(
+                f"Tool output: {result}", TraceColor.invocation_input
             )
 
             functionResult = {
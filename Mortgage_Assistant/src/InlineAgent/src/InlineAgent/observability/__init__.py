@@ -1,6 +1,44 @@
 from .trace import Trace
 from .agent_instrument import observe
+from .output import (
+    OutputSink,
+    ConsoleSink,
+    LoggingSink,
+    NullSink,
+    get_output_sink,
+    set_output_sink,
+    use_output_sink,
+)
 from .settings_management import ObservabilityConfig
-from .trace_provider import create_tracer_provider
+from .usage import AgentUsage, Budget, BudgetExceededError, UsageLedger
+from .trace_provider import (
+    create_tracer_provider,
+    flush_tracer_provider,
+    flush_traces,
+    register_shutdown_hooks,
+    FileSpanExporter,
+    FallbackSpanExporter,
+)
 
-__all__ = ["Trace", "observe", "ObservabilityConfig", "create_tracer_provider"]
+__all__ = [
+    "Trace",
+    "observe",
+    "OutputSink",
+    "ConsoleSink",
+    "LoggingSink",
+    "NullSink",
+    "get_output_sink",
+    "set_output_sink",
+    "use_output_sink",
+    "ObservabilityConfig",
+    "AgentUsage",
+    "Budget",
+    "BudgetExceededError",
+    "UsageLedger",
+    "create_tracer_provider",
+    "flush_tracer_provider",
+    "flush_traces",
+    "register_shutdown_hooks",
+    "FileSpanExporter",
+    "FallbackSpanExporter",
+]
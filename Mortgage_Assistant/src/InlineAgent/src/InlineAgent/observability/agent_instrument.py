@@ -1,11 +1,9 @@
+from dataclasses import asdict
 from datetime import datetime, timezone
 import functools
 import logging
 import os
 from opentelemetry import trace as otel_trace
-from termcolor import colored
-from rich.console import Console
-from rich.markdown import Markdown
 
 
 from opentelemetry.trace import Status, StatusCode, SpanKind
@@ -14,11 +12,14 @@ from openinference.semconv.trace import (
     OpenInferenceSpanKindValues,
 )
 
+from .output import get_output_sink
 from .utils import add_citation, get_agent_from_caller_chain
 from .semantics import SpanAttributes, SpanName
 from .process import ProcessL2Trace
 from .settings_management import ObservabilityConfig
 from .span_manager import SpanManager
+from .trace_provider import get_tracer
+from .usage import BudgetExceededError
 from .utils import json_safe
 
 
@@ -30,7 +31,7 @@ logging.basicConfig(
 
 config = ObservabilityConfig()
 
-tracer = otel_trace.get_tracer(config.BEDROCK_AGENT_TRACER_NAME)
+tracer = get_tracer(config.BEDROCK_AGENT_TRACER_NAME)
 
 guardrail_span: otel_trace.Span = None
 output_stream_guardrail_intervene: bool = False
@@ -51,6 +52,7 @@ def observe(show_traces: bool = True, save_traces: bool = False):
             # Extract tracing parameters
             user_id = kwargs.pop("user_id", "anonymous")
             tags = kwargs.pop("tags", [])
+            usage_ledger = kwargs.pop("usage_ledger", None)
 
             agent_id = kwargs.get("agentId", "")
             agent_alias_id = kwargs.get("agentAliasId", "")
@@ -63,9 +65,10 @@ def observe(show_traces: bool = True, save_traces: bool = False):
             stream_final_response = kwargs.get(
                 "streamingConfigurations", {"streamFinalResponse": False}
             )
-            
-            stream_final_response= stream_final_response["streamFinalResponse"]
+
+            stream_final_response = stream_final_response["streamFinalResponse"]
             span_manager = SpanManager()
+            sink = get_output_sink()
 
             time_before_call = datetime.now(timezone.utc)
             time_after_call = None
@@ -153,11 +156,8 @@ def observe(show_traces: bool = True, save_traces: bool = False):
                                     )
 
                         if show_traces:
-                            console = Console()
-                            print("\n\n")
-                            console.print(
-                                Markdown("**Files saved in output directory**")
-                            )
+                            sink.write("\n\n")
+                            sink.markdown("**Files saved in output directory**")
 
                     if "returnControl" in event:
                         if config.PRODUCE_BEDROCK_OTEL_TRACES:
@@ -340,6 +340,9 @@ def observe(show_traces: bool = True, save_traces: bool = False):
                         total_output_tokens += int(output_tokens)
                         total_llm_calls += int(llm_calls)
 
+                        if usage_ledger is not None:
+                            usage_ledger.record(event["trace"])
+
                     # Get Final Answer
                     if "chunk" in event:
                         if "attribution" in event["chunk"]:
@@ -354,26 +357,23 @@ def observe(show_traces: bool = True, save_traces: bool = False):
                                 if output_stream_guardrail_intervene is True:
                                     agent_answer = str()
                                     agent_answer += data.decode("utf8")
-                                    print(
-                                        colored(
-                                            "\n\n\n" + data.decode("utf-8"),
-                                            TraceColor.error,
-                                        ),
+                                    sink.write(
+                                        "\n\n\n" + data.decode("utf-8"),
+                                        TraceColor.error,
                                         end="",
                                     )
                                 else:
                                     agent_answer += data.decode("utf8")
-                                    print(
-                                        colored(
-                                            data.decode("utf-8"),
-                                            TraceColor.final_output,
-                                        ),
+                                    sink.write(
+                                        data.decode("utf-8"),
+                                        TraceColor.final_output,
                                         end="",
                                     )
                             else:
                                 agent_answer += data.decode("utf8")
-                                print(
-                                    colored(agent_answer, TraceColor.final_output),
+                                sink.write(
+                                    data.decode("utf-8"),
+                                    TraceColor.final_output,
                                     end="",
                                 )
 
@@ -431,6 +431,11 @@ def observe(show_traces: bool = True, save_traces: bool = False):
 
             except Exception as e:
                 # Handle exceptions
+                if isinstance(e, BudgetExceededError):
+                    # Stop reading the response, the run is over budget
+                    if hasattr(event_stream, "close"):
+                        event_stream.close()
+                    sink.write(f"\nStopped: {e}", TraceColor.error)
 
                 if config.PRODUCE_BEDROCK_OTEL_TRACES:
                     root_agent_span.record_exception(e)
@@ -450,8 +455,13 @@ def observe(show_traces: bool = True, save_traces: bool = False):
 
                     span_manager.end_all_spans(status_code=StatusCode.ERROR)
 
+                    if isinstance(e, BudgetExceededError):
+                        raise
                     raise Exception(e)
 
+                elif isinstance(e, BudgetExceededError):
+                    raise
+
                 else:
                     print(f"An error occurred: {str(e)}")
                     agent_answer = str(e)
@@ -460,16 +470,19 @@ def observe(show_traces: bool = True, save_traces: bool = False):
 
             duration = (time_after_call - time_before_call).total_seconds()
 
-            print(
-                colored(
-                    f"\nAgent made a total of {total_llm_calls} LLM calls, "
-                    + f"using {total_input_tokens+total_output_tokens} tokens "
-                    + f"(in: {total_input_tokens}, out: {total_output_tokens})"
-                    + f", and took {duration} total seconds",
-                    TraceColor.stats,
-                )
+            sink.write(
+                f"\nAgent made a total of {total_llm_calls} LLM calls, "
+                + f"using {total_input_tokens+total_output_tokens} tokens "
+                + f"(in: {total_input_tokens}, out: {total_output_tokens})"
+                + f", and took {duration} total seconds",
+                TraceColor.stats,
             )
 
+            if usage_ledger is not None:
+                if usage_ledger.persist:
+                    usage_ledger.save()
+                sink.event("usage", **asdict(usage_ledger.total))
+
             return agent_answer
 
         return wrapper
@@ -0,0 +1,533 @@
+"""Offline analytics over traces saved with ``@observe(save_traces=True)``.
+
+Trace files are streamed one event at a time, so a directory can be analysed
+without loading every session into memory. Only the steps of the session
+currently being read are kept; everything else is folded into running
+aggregates.
+
+Usage::
+
+    python -m InlineAgent.observability.analytics trace/ --output steps.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .constants import (
+    L2Traces,
+    L3OrchestrationTraces,
+    L4InvocationInputTraces,
+    L4ObservationTraces,
+)
+from .utils import get_agent_from_caller_chain, parse_event_time, unwrap_trace_event
+
+STEP_COLUMNS = [
+    "session_id",
+    "agent_id",
+    "agent_alias_id",
+    "depth",
+    "step",
+    "trace_id",
+    "start_time",
+    "end_time",
+    "step_latency_ms",
+    "model_latency_ms",
+    "input_tokens",
+    "output_tokens",
+    "llm_calls",
+    "tools",
+    "collaborators",
+    "guardrail_action",
+]
+
+
+def iter_trace_file(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """Yield trace events from a saved ``.json`` list or a ``.jsonl`` file."""
+    with open(path, "r") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    yield unwrap_trace_event(json.loads(line))
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if buffer:
+                    if buffer[0] != "[":
+                        raise ValueError(f"{path} is not a JSON list of trace events")
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+            else:
+                if buffer.startswith(","):
+                    buffer = buffer[1:]
+                    continue
+                if buffer.startswith("]"):
+                    return
+                if buffer:
+                    try:
+                        event, end = decoder.raw_decode(buffer)
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                    else:
+                        yield unwrap_trace_event(event)
+                        buffer = buffer[end:]
+                        continue
+            if eof:
+                if started:
+                    raise ValueError(f"{path} ended before the closing bracket")
+                return
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+def iter_trace_directory(path: str) -> Iterator[str]:
+    """Trace files under ``path`` in a stable order."""
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.endswith((".json", ".jsonl")):
+                yield os.path.join(root, name)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile of ``values`` for ``q`` in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class _Step:
+    __slots__ = [name for name in STEP_COLUMNS] + [
+        "model_input_time",
+        "tool_start",
+    ]
+
+    def __init__(self, session_id, agent_id, agent_alias_id, depth, step, trace_id):
+        self.session_id = session_id
+        self.agent_id = agent_id
+        self.agent_alias_id = agent_alias_id
+        self.depth = depth
+        self.step = step
+        self.trace_id = trace_id
+        self.start_time = None
+        self.end_time = None
+        self.step_latency_ms = None
+        self.model_latency_ms = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_calls = 0
+        self.tools = []
+        self.collaborators = []
+        self.guardrail_action = None
+        self.model_input_time = None
+        self.tool_start = {}
+
+    def row(self) -> Dict:
+        row = {name: getattr(self, name) for name in STEP_COLUMNS}
+        row["start_time"] = self.start_time.isoformat() if self.start_time else None
+        row["end_time"] = self.end_time.isoformat() if self.end_time else None
+        row["tools"] = ";".join(self.tools)
+        row["collaborators"] = ";".join(self.collaborators)
+        return row
+
+
+class TraceAnalyzer:
+    """Folds saved trace events into per-step rows and summary statistics.
+
+    Call :meth:`process_event` for each event of a session and
+    :meth:`end_session` once the session is complete. Finished steps are
+    handed to ``on_step`` so they can be written out immediately.
+    """
+
+    def __init__(self, on_step: Callable[[Dict], None] = None):
+        self.on_step = on_step
+        self._steps: Dict = {}
+
+        self.sessions = 0
+        self.events = 0
+        self.agent_latency_ms = defaultdict(list)
+        self.step_latency_ms = defaultdict(list)
+        self.agent_tokens = defaultdict(lambda: [0, 0, 0])
+        self.tool_calls = Counter()
+        self.tool_latency_ms = defaultdict(list)
+        self.collaborator_calls = Counter()
+        self.fan_out: List[int] = []
+        self.guardrail_interventions = Counter()
+
+    def process_event(self, trace_data: Dict):
+        trace = trace_data.get("trace")
+        if not trace:
+            return
+        self.events += 1
+
+        step_name = next(
+            (t.value for t in L2Traces if t.value in trace), next(iter(trace))
+        )
+        body = trace[step_name]
+        trace_id = self._trace_id(body)
+
+        caller_chain = trace_data.get("callerChain") or []
+        try:
+            agent_id, agent_alias_id = get_agent_from_caller_chain(
+                caller_chain=caller_chain, index=-1
+            )
+        except Exception:
+            agent_id, agent_alias_id = "unknown", "unknown"
+
+        key = (agent_id, step_name, trace_id)
+        step = self._steps.get(key)
+        if step is None:
+            step = _Step(
+                session_id=trace_data.get("sessionId"),
+                agent_id=agent_id,
+                agent_alias_id=agent_alias_id,
+                depth=len(caller_chain),
+                step=step_name,
+                trace_id=trace_id,
+            )
+            self._steps[key] = step
+
+        event_time = parse_event_time(trace_data.get("eventTime"))
+        if event_time is not None:
+            if step.start_time is None or event_time < step.start_time:
+                step.start_time = event_time
+            if step.end_time is None or event_time > step.end_time:
+                step.end_time = event_time
+
+        if step_name == L2Traces.guardrailTrace.value:
+            step.guardrail_action = body.get("action")
+            return
+
+        if not isinstance(body, dict):
+            return
+
+        if L3OrchestrationTraces.modelInvocationInput.value in body:
+            step.model_input_time = event_time
+
+        if L3OrchestrationTraces.modelInvocationOutput.value in body:
+            self._model_output(step, body, event_time)
+
+        if L3OrchestrationTraces.invocationInput.value in body:
+            self._invocation_input(step, body, event_time)
+
+        if L3OrchestrationTraces.observation.value in body:
+            self._observation(step, body, event_time)
+
+    def end_session(self):
+        """Fold the buffered steps of the current session into the aggregates."""
+        if not self._steps:
+            return
+        self.sessions += 1
+        collaborators = set()
+
+        for step in self._steps.values():
+            if step.start_time and step.end_time:
+                step.step_latency_ms = (
+                    step.end_time - step.start_time
+                ).total_seconds() * 1000
+                self.step_latency_ms[step.step].append(step.step_latency_ms)
+            if step.model_latency_ms is not None:
+                self.agent_latency_ms[step.agent_id].append(step.model_latency_ms)
+
+            tokens = self.agent_tokens[step.agent_id]
+            tokens[0] += step.input_tokens
+            tokens[1] += step.output_tokens
+            tokens[2] += step.llm_calls
+
+            collaborators.update(step.collaborators)
+            if step.guardrail_action == "INTERVENED":
+                self.guardrail_interventions[step.agent_id] += 1
+
+            if self.on_step is not None:
+                self.on_step(step.row())
+
+        self.fan_out.append(len(collaborators))
+        self._steps = {}
+
+    def process_file(self, path: str):
+        for trace_data in iter_trace_file(path):
+            self.process_event(trace_data)
+        self.end_session()
+
+    def summary(self) -> Dict:
+        def latency(values):
+            return {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+            }
+
+        return {
+            "sessions": self.sessions,
+            "events": self.events,
+            "agents": {
+                agent_id: {
+                    "input_tokens": tokens[0],
+                    "output_tokens": tokens[1],
+                    "llm_calls": tokens[2],
+                    "model_latency_ms": latency(self.agent_latency_ms[agent_id]),
+                    "guardrail_interventions": self.guardrail_interventions[agent_id],
+                }
+                for agent_id, tokens in self.agent_tokens.items()
+            },
+            "steps": {
+                step: latency(values) for step, values in self.step_latency_ms.items()
+            },
+            "tools": {
+                tool: {
+                    "calls": count,
+                    "latency_ms": latency(self.tool_latency_ms[tool]),
+                }
+                for tool, count in self.tool_calls.most_common()
+            },
+            "collaborators": dict(self.collaborator_calls.most_common()),
+            "fan_out": {
+                "max": max(self.fan_out, default=0),
+                "mean": (sum(self.fan_out) / len(self.fan_out) if self.fan_out else 0),
+            },
+            "guardrail_interventions": sum(self.guardrail_interventions.values()),
+        }
+
+    @staticmethod
+    def _trace_id(body) -> str:
+        if not isinstance(body, dict):
+            return ""
+        if "traceId" in body:
+            return body["traceId"]
+        for value in body.values():
+            if isinstance(value, dict) and "traceId" in value:
+                return value["traceId"]
+        return ""
+
+    def _model_output(self, step: _Step, body: Dict, event_time):
+        metadata = body[L3OrchestrationTraces.modelInvocationOutput.value].get(
+            "metadata", {}
+        )
+        usage = metadata.get("usage", {})
+        step.input_tokens += int(usage.get("inputTokens", 0))
+        step.output_tokens += int(usage.get("outputTokens", 0))
+        step.llm_calls += 1
+        if "totalTimeMs" in metadata:
+            step.model_latency_ms = float(metadata["totalTimeMs"])
+        elif step.model_input_time and event_time:
+            step.model_latency_ms = (
+                event_time - step.model_input_time
+            ).total_seconds() * 1000
+
+    def _invocation_input(self, step: _Step, body: Dict, event_time):
+        invocation_input = body[L3OrchestrationTraces.invocationInput.value]
+
+        action_group = invocation_input.get(
+            L4InvocationInputTraces.actionGroupInvocationInput.value
+        )
+        if action_group:
+            tool = "{}::{}".format(
+                action_group.get("actionGroupName", ""),
+                action_group.get("function") or action_group.get("apiPath", ""),
+            )
+            step.tools.append(tool)
+            step.tool_start[tool] = event_time
+            self.tool_calls[tool] += 1
+
+        collaborator = invocation_input.get(
+            L4InvocationInputTraces.agentCollaboratorInvocationInput.value
+        )
+        if collaborator:
+            name = collaborator.get("agentCollaboratorName", "")
+            step.collaborators.append(name)
+            self.collaborator_calls[name] += 1
+
+    def _observation(self, step: _Step, body: Dict, event_time):
+        observation = body[L3OrchestrationTraces.observation.value]
+        if (
+            L4ObservationTraces.actionGroupInvocationOutput.value in observation
+            and step.tools
+        ):
+            tool = step.tools[-1]
+            start = step.tool_start.pop(tool, None)
+            if start and event_time:
+                self.tool_latency_ms[tool].append(
+                    (event_time - start).total_seconds() * 1000
+                )
+
+
+class _CsvWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=STEP_COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, row: Dict):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str, batch_size: int = 10_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                "Writing Parquet requires pyarrow, install it with `pip install pyarrow`"
+            ) from e
+
+        self._pa = pa
+        self._path = path
+        self._pq = pq
+        self._writer = None
+        self._rows: List[Dict] = []
+        self._batch_size = batch_size
+
+    def write(self, row: Dict):
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def analyze(path: str, output: str = None) -> Dict:
+    """Analyse every trace file under ``path``; optionally write step rows."""
+    writer = None
+    if output:
+        writer = (
+            _ParquetWriter(output)
+            if output.endswith(".parquet")
+            else _CsvWriter(output)
+        )
+
+    analyzer = TraceAnalyzer(on_step=writer.write if writer else None)
+    try:
+        for trace_file in iter_trace_directory(path):
+            analyzer.process_file(trace_file)
+    finally:
+        if writer:
+            writer.close()
+
+    return analyzer.summary()
+
+
+def print_summary(summary: Dict):
+    from rich.console import Console
+    from rich.table import Table
+
+    def ms(value):
+        return "-" if value is None else f"{value:,.0f}"
+
+    console = Console()
+    console.print(
+        f"Sessions: {summary['sessions']}  Events: {summary['events']}  "
+        f"Guardrail interventions: {summary['guardrail_interventions']}  "
+        f"Collaborator fan-out: max {summary['fan_out']['max']}, "
+        f"mean {summary['fan_out']['mean']:.1f}"
+    )
+
+    agents = Table(title="Agents")
+    for column in ["Agent", "LLM calls", "In tokens", "Out tokens"]:
+        agents.add_column(column)
+    for column in ["p50 ms", "p90 ms", "p99 ms", "Guardrail"]:
+        agents.add_column(column, justify="right")
+    for agent_id, stats in summary["agents"].items():
+        latency = stats["model_latency_ms"]
+        agents.add_row(
+            agent_id,
+            str(stats["llm_calls"]),
+            str(stats["input_tokens"]),
+            str(stats["output_tokens"]),
+            ms(latency["p50"]),
+            ms(latency["p90"]),
+            ms(latency["p99"]),
+            str(stats["guardrail_interventions"]),
+        )
+    console.print(agents)
+
+    steps = Table(title="Steps")
+    for column in ["Step", "Count", "p50 ms", "p90 ms", "p99 ms"]:
+        steps.add_column(column)
+    for step, latency in summary["steps"].items():
+        steps.add_row(
+            step,
+            str(latency["count"]),
+            ms(latency["p50"]),
+            ms(latency["p90"]),
+            ms(latency["p99"]),
+        )
+    console.print(steps)
+
+    tools = Table(title="Tools")
+    for column in ["Tool", "Calls", "p50 ms", "p90 ms"]:
+        tools.add_column(column)
+    for tool, stats in summary["tools"].items():
+        tools.add_row(
+            tool,
+            str(stats["calls"]),
+            ms(stats["latency_ms"]["p50"]),
+            ms(stats["latency_ms"]["p90"]),
+        )
+    console.print(tools)
+
+    if summary["collaborators"]:
+        collaborators = Table(title="Collaborators")
+        collaborators.add_column("Collaborator")
+        collaborators.add_column("Invocations")
+        for name, count in summary["collaborators"].items():
+            collaborators.add_row(name, str(count))
+        console.print(collaborators)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarise traces saved with @observe(save_traces=True)"
+    )
+    parser.add_argument(
+        "path", nargs="?", default="trace", help="Trace directory or file"
+    )
+    parser.add_argument(
+        "--output", "-o", help="Write per-step rows to a .csv or .parquet file"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = analyze(path=args.path, output=args.output)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
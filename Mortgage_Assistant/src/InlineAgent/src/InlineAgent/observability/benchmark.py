@@ -0,0 +1,202 @@
+"""Benchmarks for event stream processing, driven by recorded responses.
+
+Replays a recording made with `RecordingClient` through an `@observe`
+decorated function and, for ``invoke_inline_agent`` recordings, through
+`InlineAgent.invoke`, with no network access, and reports per-invocation
+latency, the overhead over simply draining the stream, and peak memory.
+Callers can add their own scenarios, e.g. an agent client of their own
+code invoking ``invoke_agent`` recordings, through ``run_benchmarks``.
+
+Usage::
+
+    python -m InlineAgent.observability.benchmark recording.jsonl.gz -n 50
+    python -m InlineAgent.observability.benchmark recording.jsonl.gz --timing
+
+With ``--timing`` the recorded gaps between events are reproduced, so the
+numbers approximate end-to-end latency rather than pure parse overhead.
+Recordings that ask for user confirmation through returnControl are not
+supported, as they would block on input.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from .analytics import percentile
+from .output import ConsoleSink, NullSink, OutputSink, use_output_sink
+from .replay import ReplayClient
+
+
+def _drain(replay: ReplayClient):
+    replay.reset()
+    for recorded in replay.responses:
+        response = getattr(replay, recorded["operation"])(sessionId="benchmark")
+        for _ in response["completion"]:
+            pass
+
+
+def _inline_agent_runner(replay: ReplayClient, sink: OutputSink) -> Callable:
+    from InlineAgent.agent import InlineAgent
+
+    agent = InlineAgent(
+        foundation_model="replay",
+        instruction="Replayed agent used for benchmarking",
+        agent_name="replay-agent",
+        bedrock_agent_runtime_client=replay,
+    )
+    # returnControl requests are answered by stubs
+    agent.tool_map = {name: (lambda **kwargs: "") for name in replay.tool_names()}
+    loop = asyncio.new_event_loop()
+
+    def run():
+        replay.reset()
+        loop.run_until_complete(
+            agent.invoke(
+                input_text="benchmark",
+                session_id="benchmark",
+                output_sink=sink,
+            )
+        )
+
+    return run
+
+
+def _observe_runner(replay: ReplayClient, sink: OutputSink) -> Callable:
+    from .agent_instrument import observe
+
+    operation = replay.responses[0]["operation"]
+
+    @observe(show_traces=not isinstance(sink, NullSink), save_traces=False)
+    def invoke(inputText: str, sessionId: str, **kwargs):
+        return getattr(replay, operation)(
+            inputText=inputText, sessionId=sessionId, **kwargs
+        )
+
+    def run():
+        replay.reset()
+        with use_output_sink(sink):
+            invoke(
+                inputText="benchmark",
+                sessionId="benchmark",
+                agentId="replay",
+                agentAliasId="replay",
+            )
+
+    return run
+
+
+def measure(run: Callable, iterations: int, warmup: int = 1) -> Dict:
+    """Time ``run`` and record its peak traced memory on one extra call."""
+    for _ in range(warmup):
+        run()
+
+    gc.collect()
+    timings: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": percentile(timings, 50),
+        "p95_ms": percentile(timings, 95),
+        "peak_kib": peak / 1024,
+    }
+
+
+def run_benchmarks(
+    path: str,
+    iterations: int = 20,
+    timing: bool = False,
+    speed: float = 1.0,
+    scenarios: Optional[Dict[str, Callable[[ReplayClient], Callable]]] = None,
+) -> Dict[str, Dict]:
+    """Benchmark the built-in scenarios, plus ``scenarios``: factories called
+    with the replay client that return the function to time, each call of
+    which should replay every recorded response once."""
+    replay = ReplayClient(path, timing=timing, speed=speed)
+    if not replay.responses:
+        raise ValueError(f"{path} does not contain any responses")
+
+    results = {"stream": measure(lambda: _drain(replay), iterations)}
+
+    operations = {recorded["operation"] for recorded in replay.responses}
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        runners = {}
+        if operations == {"invoke_inline_agent"}:
+            runners["inline_agent[null]"] = _inline_agent_runner(replay, NullSink())
+            runners["inline_agent[console]"] = _inline_agent_runner(
+                replay, ConsoleSink()
+            )
+        runners["observe[null]"] = _observe_runner(replay, NullSink())
+        runners["observe[console]"] = _observe_runner(replay, ConsoleSink())
+        for name, create_runner in (scenarios or {}).items():
+            runners[name] = create_runner(replay)
+        for name, run in runners.items():
+            results[name] = measure(run, iterations)
+
+    baseline = results["stream"]["mean_ms"]
+    for result in results.values():
+        result["overhead_ms"] = result["mean_ms"] - baseline
+
+    return results
+
+
+def print_results(results: Dict[str, Dict]):
+    from rich.console import Console
+    from rich.markup import escape
+    from rich.table import Table
+
+    table = Table(title="Replay benchmark")
+    table.add_column("Scenario")
+    for column in ["mean ms", "p50 ms", "p95 ms", "overhead ms", "peak KiB"]:
+        table.add_column(column, justify="right")
+
+    for name, result in results.items():
+        table.add_row(
+            escape(name),
+            f"{result['mean_ms']:.2f}",
+            f"{result['p50_ms']:.2f}",
+            f"{result['p95_ms']:.2f}",
+            f"{result['overhead_ms']:.2f}",
+            f"{result['peak_kib']:.1f}",
+        )
+    Console().print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark agent response processing against a recording"
+    )
+    parser.add_argument("recording", help="File written by RecordingClient")
+    parser.add_argument("--iterations", "-n", type=int, default=20)
+    parser.add_argument(
+        "--timing", action="store_true", help="Reproduce recorded event timing"
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print_results(
+        run_benchmarks(
+            path=args.recording,
+            iterations=args.iterations,
+            timing=args.timing,
+            speed=args.speed,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from termcolor import colored
+
+
+class OutputSink(ABC):
+    """Destination for agent answers and trace output.
+
+    `enabled` lets hot paths skip building messages entirely when nothing
+    would consume them.
+    """
+
+    enabled: bool = True
+
+    @abstractmethod
+    def write(self, text: str, color: Optional[str] = None, end: str = "\n") -> None:
+        pass
+
+    @abstractmethod
+    def markdown(self, text: str) -> None:
+        pass
+
+    def event(self, name: str, **fields: Any) -> None:
+        """Structured record of a trace step. Console output ignores it."""
+        pass
+
+
+class ConsoleSink(OutputSink):
+    """Colored terminal output, the default interactive behaviour."""
+
+    def __init__(self):
+        self._console = None
+
+    def write(self, text: str, color: Optional[str] = None, end: str = "\n") -> None:
+        print(colored(text, color) if color else text, end=end)
+
+    def markdown(self, text: str) -> None:
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console()
+
+        from rich.markdown import Markdown
+
+        self._console.print(Markdown(text))
+
+
+class LoggingSink(OutputSink):
+    """Routes output through `logging` instead of the terminal.
+
+    Partial writes (``end=""``) are buffered until a newline so that streamed
+    answer chunks become a single record. Structured events are emitted as
+    JSON in the message and attached to the record as ``trace_event``.
+    """
+
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, level: int = logging.INFO
+    ):
+        self.logger = logger or logging.getLogger("InlineAgent")
+        self.level = level
+        self._buffer = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.logger.isEnabledFor(self.level)
+
+    def write(self, text: str, color: Optional[str] = None, end: str = "\n") -> None:
+        self._buffer.append(text)
+        if "\n" not in end:
+            return
+        self.flush()
+
+    def markdown(self, text: str) -> None:
+        self.write(text)
+
+    def event(self, name: str, **fields: Any) -> None:
+        if self.enabled:
+            self.logger.log(
+                self.level,
+                "%s %s",
+                name,
+                json.dumps(fields, default=str),
+                extra={"trace_event": {"name": name, **fields}},
+            )
+
+    def flush(self) -> None:
+        message = "".join(self._buffer).strip()
+        self._buffer = []
+        if message:
+            self.logger.log(self.level, message)
+
+
+class NullSink(OutputSink):
+    """Discards everything. Used for non-interactive, production invocations."""
+
+    enabled = False
+
+    def write(self, text: str, color: Optional[str] = None, end: str = "\n") -> None:
+        pass
+
+    def markdown(self, text: str) -> None:
+        pass
+
+
+_output_sink: ContextVar[OutputSink] = ContextVar(
+    "inline_agent_output_sink", default=ConsoleSink()
+)
+
+
+def get_output_sink() -> OutputSink:
+    return _output_sink.get()
+
+
+def set_output_sink(sink: OutputSink):
+    """Set the sink for the current context. Returns a token for reset."""
+    return _output_sink.set(sink)
+
+
+@contextmanager
+def use_output_sink(sink: OutputSink):
+    """Temporarily route output to `sink`."""
+    token = _output_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        if isinstance(sink, LoggingSink):
+            sink.flush()
+        _output_sink.reset(token)
@@ -4,7 +4,6 @@ from typing import Any, Dict, Literal
 
 import os
 from opentelemetry.trace import StatusCode
-from opentelemetry import trace as otel_trace
 from openinference.semconv.trace import (
     SpanAttributes as OtelSpanAttributes,
     OpenInferenceSpanKindValues,
@@ -20,6 +19,7 @@ from .utils import (
 from .semantics import SpanAttributes, SpanName
 from .settings_management import ObservabilityConfig
 from .span_manager import SpanManager
+from .trace_provider import get_tracer
 from .constants import (
     L2Traces,
     L3OrchestrationTraces,
@@ -27,13 +27,11 @@ from .constants import (
     L4InvocationInputTraces,
     L4ObservationTraces,
 )
-from termcolor import colored
-from rich.console import Console
-from rich.markdown import Markdown
+from .output import get_output_sink
 
 config = ObservabilityConfig()
 
-tracer = otel_trace.get_tracer(config.BEDROCK_AGENT_TRACER_NAME)
+tracer = get_tracer(config.BEDROCK_AGENT_TRACER_NAME)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -53,6 +51,14 @@ class ProcessL2Trace:
                     print(f"Error creating directory output: {e}")
                     raise
 
+            if config.TRACE_FILE_FORMAT == "jsonl":
+                # One event per line, appended without re-reading the file
+                with open(
+                    os.path.join(directory_path, str(session_id) + ".jsonl"), "a"
+                ) as file:
+                    file.write(json.dumps(trace_data, default=str) + "\n")
+                return
+
             try:
                 with open(
                     os.path.join(directory_path, str(session_id) + ".json"), "r"
@@ -1014,17 +1020,13 @@ class ProcessL5InvocationInputTrace:
                             caller_chain=caller_chain, index=-1
                         )
 
-                        if show_traces:
-                            print(
-                                colored(
-                                    f"Code interpreter:", TraceColor.invocation_input
-                                )
+                        sink = get_output_sink()
+                        if show_traces and sink.enabled:
+                            sink.write(
+                                f"Code interpreter:", TraceColor.invocation_input
                             )
-                            console = Console()
-                            console.print(
-                                Markdown(
-                                    f"**Generated code**\n```python\n{code_interpreter_invocation_input['code']}\n```"
-                                )
+                            sink.markdown(
+                                f"**Generated code**\n```python\n{code_interpreter_invocation_input['code']}\n```"
                             )
 
                         if config.PRODUCE_BEDROCK_OTEL_TRACES:
@@ -0,0 +1,202 @@
+"""Record and replay Bedrock agent event streams.
+
+`RecordingClient` wraps a ``bedrock-agent-runtime`` client and writes every
+event of each ``invoke_agent`` / ``invoke_inline_agent`` response to a gzipped
+JSON lines file, together with its offset from the start of the response.
+`ReplayClient` serves a recording back through the same interface, so
+`InlineAgent.invoke`, `@observe` decorated functions and
+`AgentsForAmazonBedrock.invoke` can be exercised without network access.
+
+File layout, one JSON object per line::
+
+    {"response": 0, "operation": "invoke_inline_agent", "sessionId": "...", ...}
+    {"response": 0, "offset": 0.412, "event": {"trace": {...}}}
+    {"response": 0, "offset": 1.903, "event": {"chunk": {"bytes": {"__bytes__": "..."}}}}
+"""
+
+import base64
+import copy
+import gzip
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+RECORDED_OPERATIONS = ("invoke_agent", "invoke_inline_agent")
+
+
+def _encode(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(obj).decode("ascii")}
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    return str(obj)
+
+
+def _decode(obj: Dict):
+    if "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class RecordingClient:
+    """Proxy around a ``bedrock-agent-runtime`` client that records responses.
+
+    Events are written as the caller consumes the stream, so recording adds
+    no buffering and the recorded offsets match what the caller observed.
+    """
+
+    def __init__(self, client, path: str):
+        self._client = client
+        self._file = _open(path, "w")
+        self._responses = 0
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if name not in RECORDED_OPERATIONS:
+            return attribute
+
+        def record(**kwargs):
+            started = time.perf_counter()
+            response = attribute(**kwargs)
+            index = self._responses
+            self._responses += 1
+            self._write(
+                {
+                    "response": index,
+                    "operation": name,
+                    "sessionId": response.get("sessionId", kwargs.get("sessionId")),
+                    "contentType": response.get("contentType"),
+                    "ResponseMetadata": response.get("ResponseMetadata", {}),
+                }
+            )
+            response = dict(response)
+            response["completion"] = self._tee(
+                response["completion"], index=index, started=started
+            )
+            return response
+
+        return record
+
+    def _tee(self, events, index: int, started: float) -> Iterator[Dict]:
+        for event in events:
+            self._write(
+                {
+                    "response": index,
+                    "offset": round(time.perf_counter() - started, 6),
+                    "event": event,
+                }
+            )
+            yield event
+        self._file.flush()
+
+    def _write(self, line: Dict):
+        self._file.write(json.dumps(line, default=_encode) + "\n")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayClient:
+    """Serves recorded responses back in order through the client interface.
+
+    Args:
+        path: Recording written by `RecordingClient`.
+        timing: Sleep between events to reproduce the recorded pacing.
+        speed: Timing multiplier, e.g. ``2.0`` replays twice as fast.
+        loop: Start again from the first response once all have been served,
+            useful when benchmarking many iterations.
+    """
+
+    def __init__(
+        self, path: str, timing: bool = False, speed: float = 1.0, loop: bool = False
+    ):
+        self.timing = timing
+        self.speed = speed
+        self.loop = loop
+        self.responses: List[Dict] = []
+        self._next = 0
+
+        with _open(path, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line, object_hook=_decode)
+                if "event" in record:
+                    self.responses[record["response"]]["events"].append(
+                        (record["offset"], record["event"])
+                    )
+                else:
+                    record["events"] = []
+                    self.responses.append(record)
+
+    def __getattr__(self, name: str):
+        if name not in RECORDED_OPERATIONS:
+            raise AttributeError(f"{name} is not available on a replayed client")
+
+        def replay(**kwargs):
+            return self._response(operation=name, **kwargs)
+
+        return replay
+
+    def _response(self, operation: str, **kwargs) -> Dict[str, Any]:
+        if self._next >= len(self.responses):
+            if not self.loop or not self.responses:
+                raise RuntimeError("Recording has no more responses to replay")
+            self._next = 0
+        recorded = self.responses[self._next]
+        self._next += 1
+
+        if recorded["operation"] != operation:
+            raise RuntimeError(
+                f"Recording expected {recorded['operation']}, got {operation}"
+            )
+
+        return {
+            "completion": self._events(recorded["events"]),
+            "contentType": recorded.get("contentType"),
+            "sessionId": kwargs.get("sessionId", recorded.get("sessionId")),
+            "ResponseMetadata": copy.deepcopy(recorded.get("ResponseMetadata", {})),
+        }
+
+    def _events(self, events) -> Iterator[Dict]:
+        started = time.perf_counter()
+        for offset, event in events:
+            if self.timing:
+                delay = offset / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            # Events are shared between loops; the parsers only read them
+            yield event
+
+    def reset(self):
+        self._next = 0
+
+    def tool_names(self) -> List[str]:
+        """Functions requested through returnControl in the recording."""
+        names = []
+        for recorded in self.responses:
+            for _, event in recorded["events"]:
+                for invocation in event.get("returnControl", {}).get(
+                    "invocationInputs", []
+                ):
+                    function = invocation.get("functionInvocationInput", {}).get(
+                        "function"
+                    )
+                    if function and function not in names:
+                        names.append(function)
+        return names
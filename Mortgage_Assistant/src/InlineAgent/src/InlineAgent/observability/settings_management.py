@@ -1,6 +1,6 @@
-from pydantic import HttpUrl, Field
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from pydantic import HttpUrl, Field, field_validator
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
+from typing import Annotated, List, Literal, Optional
 
 
 class ObservabilityConfig(BaseSettings):
@@ -18,3 +18,27 @@ class ObservabilityConfig(BaseSettings):
     LANGFUSE_SECRET_KEY: Optional[str] = None
     BEDROCK_AGENT_TRACER_NAME: str = Field(default="bedrock-agent-tracer")
     PRODUCE_BEDROCK_OTEL_TRACES: bool = Field(default=False)
+    TRACE_FILE_FORMAT: Literal["json", "jsonl"] = Field(default="json")
+
+    # Exporters, comma separated when set from the environment
+    OTEL_EXPORTERS: Annotated[
+        List[Literal["otlp_http", "otlp_grpc", "file", "console"]], NoDecode
+    ] = Field(default=["otlp_http"])
+    OTLP_COMPRESSION: Literal["none", "gzip"] = Field(default="gzip")
+    OTLP_EXPORT_TIMEOUT: int = Field(default=300, description="Seconds")
+    OTEL_EXPORT_FILE: str = Field(default="otel_spans.jsonl")
+    OTEL_FILE_FALLBACK: bool = Field(default=True)
+
+    # BatchSpanProcessor tuning
+    OTEL_BSP_MAX_QUEUE_SIZE: int = Field(default=2048)
+    OTEL_BSP_MAX_EXPORT_BATCH_SIZE: int = Field(default=512)
+    OTEL_BSP_SCHEDULE_DELAY_MILLIS: int = Field(default=5000)
+    OTEL_BSP_EXPORT_TIMEOUT_MILLIS: int = Field(default=30000)
+
+    @field_validator("OTEL_EXPORTERS", mode="before")
+    @classmethod
+    def split_exporters(cls, value):
+        if isinstance(value, str):
+            exporters = (exporter.strip() for exporter in value.split(","))
+            return [exporter for exporter in exporters if exporter]
+        return value
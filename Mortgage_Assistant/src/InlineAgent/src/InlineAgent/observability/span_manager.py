@@ -14,12 +14,13 @@ from pydantic import (
 )
 
 from .utils import get_agent_from_caller_chain
+from .trace_provider import get_tracer
 
 
 from pydantic import BaseModel
 from typing import Dict, Any
 
-tracer = trace.get_tracer("bedrock-agent-tracing")
+tracer = get_tracer("bedrock-agent-tracing")
 
 
 class SpanModel(BaseModel):
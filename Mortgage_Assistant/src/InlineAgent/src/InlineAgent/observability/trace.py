@@ -1,13 +1,10 @@
 from enum import Enum
 from typing import Dict, List
 from InlineAgent.constants import Level, TraceColor
-from termcolor import colored
-from rich.console import Console
-from rich.markdown import Markdown
+from .output import get_output_sink
 
 import json
 
-
 AGENT = {}
 STEP = 1
 
@@ -20,6 +17,10 @@ class Trace:
         agentName: str,
         truncateResponse: int = None,
     ):
+        sink = get_output_sink()
+        if not sink.enabled:
+            return Trace.count_usage(trace=trace)
+
         input_tokens = 0
         output_tokens = 0
         llm_calls = 0
@@ -70,8 +71,38 @@ class Trace:
         output_tokens += rout_output_tokens
         llm_calls += rout_llm_calls
 
+        sink.event(
+            "trace",
+            agent_name=agentName,
+            trace_type=next(iter(trace), None),
+            input_tokens=int(input_tokens),
+            output_tokens=int(output_tokens),
+            llm_calls=int(llm_calls),
+        )
+
         return int(input_tokens), int(output_tokens), int(llm_calls)
 
+    @staticmethod
+    def count_usage(trace: Dict):
+        """Token usage of a trace without rendering anything."""
+        for key in (
+            "orchestrationTrace",
+            "routingClassifierTrace",
+            "preProcessingTrace",
+            "postProcessingTrace",
+        ):
+            if key in trace:
+                model_output = trace[key].get("modelInvocationOutput")
+                if model_output is None:
+                    return 0, 0, 0
+                usage = model_output.get("metadata", {}).get("usage", {})
+                return (
+                    int(usage.get("inputTokens", 0)),
+                    int(usage.get("outputTokens", 0)),
+                    1,
+                )
+        return 0, 0, 0
+
     @staticmethod
     def add_citation(citations: List, cite=1) -> str:
 
@@ -118,17 +149,19 @@ class Trace:
             )
 
             agent_answer += text
-            print(colored(text, TraceColor.final_output), end="")
+            get_output_sink().write(text, TraceColor.final_output, end="")
             if citation["retrievedReferences"]:
-                print(colored(f" [{cite}]", TraceColor.error), end="")
+                get_output_sink().write(f" [{cite}]", TraceColor.error, end="")
 
             cite += 1
 
-        print("\n\n")
+        get_output_sink().write("\n\n")
         for output in cite_output:
             if len(output[1]):
-                print(colored(output[0], TraceColor.cite))
-                print(colored(output[1] + "\n", TraceColor.retrieved_references))
+                get_output_sink().write(output[0], TraceColor.cite)
+                get_output_sink().write(
+                    output[1] + "\n", TraceColor.retrieved_references
+                )
 
         return agent_answer, cite
 
@@ -138,48 +171,42 @@ class HighLevelTrace:
     @staticmethod
     def parse_custom_orchestration_trace(trace: Dict):
         if "customOrchestrationTrace" in trace:
-            print(
-                colored(
-                    f"Agent error: {trace['customOrchestrationTrace']['event']['text']}",
-                    TraceColor.custom_orchestraction_trace,
-                )
+            get_output_sink().write(
+                f"Agent error: {trace['customOrchestrationTrace']['event']['text']}",
+                TraceColor.custom_orchestraction_trace,
             )
 
     @staticmethod
     def parse_failure_trace(trace: Dict):
         if "failureTrace" in trace:
-            print(
-                colored(
-                    f"Agent error: {trace['failureTrace']['failureReason']}",
-                    TraceColor.error,
-                )
+            get_output_sink().write(
+                f"Agent error: {trace['failureTrace']['failureReason']}",
+                TraceColor.error,
             )
 
     @staticmethod
     def guardrail_trace(trace: Dict):
         if "guardrailTrace" in trace:
             if trace["guardrailTrace"]["action"] == "INTERVENED":
-                print(
-                    colored(
-                        "<--- Guardrail Intervened --->", TraceColor.guardrail_trace
-                    )
+                get_output_sink().write(
+                    "<--- Guardrail Intervened --->", TraceColor.guardrail_trace
                 )
                 for inputAssessment in trace["guardrailTrace"]["inputAssessments"]:
-                    print(colored("Input Guardrail", TraceColor.guardrail_trace))
-                    print(
-                        colored(
-                            json.dumps(inputAssessment, indent=2, default=str),
-                            TraceColor.guardrail_trace,
-                        )
+                    get_output_sink().write(
+                        "Input Guardrail", TraceColor.guardrail_trace
+                    )
+                    get_output_sink().write(
+                        json.dumps(inputAssessment, indent=2, default=str),
+                        TraceColor.guardrail_trace,
                     )
 
                 for outputAssessment in trace["guardrailTrace"]["outputAssessments"]:
-                    print(colored("Output Guardrail", TraceColor.guardrail_trace))
-                    print(
-                        colored(
-                            json.dumps(outputAssessment, indent=2, default=str),
-                            TraceColor.guardrail_trace,
-                        )
+                    get_output_sink().write(
+                        "Output Guardrail", TraceColor.guardrail_trace
+                    )
+                    get_output_sink().write(
+                        json.dumps(outputAssessment, indent=2, default=str),
+                        TraceColor.guardrail_trace,
                     )
 
     @staticmethod
@@ -213,11 +240,9 @@ class HighLevelTrace:
                 # else:
                 #     # Main agent
                 #     print(colored("Supervisor Agent Invoked", TraceColor.rationale))
-                print(
-                    colored(
-                        f"Thought: {trace['orchestrationTrace']['rationale']['text']}",
-                        TraceColor.rationale,
-                    )
+                get_output_sink().write(
+                    f"Thought: {trace['orchestrationTrace']['rationale']['text']}",
+                    TraceColor.rationale,
                 )
 
             return input_tokens, output_tokens, llm_calls
@@ -242,17 +267,13 @@ class HighLevelTrace:
 
                 llm_calls = 1
 
-                print(
-                    colored(
-                        "Pre-processing trace, agent came up with an initial plan.",
-                        TraceColor.pre_processing,
-                    )
+                get_output_sink().write(
+                    "Pre-processing trace, agent came up with an initial plan.",
+                    TraceColor.pre_processing,
                 )
-                print(
-                    colored(
-                        f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
-                        TraceColor.stats,
-                    )
+                get_output_sink().write(
+                    f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
+                    TraceColor.stats,
                 )
 
                 return input_tokens, output_tokens, llm_calls
@@ -276,16 +297,12 @@ class HighLevelTrace:
                 )
 
                 llm_calls = 1
-                print(
-                    colored(
-                        "Agent post-processing complete.", TraceColor.post_processing
-                    )
+                get_output_sink().write(
+                    "Agent post-processing complete.", TraceColor.post_processing
                 )
-                print(
-                    colored(
-                        f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
-                        TraceColor.stats,
-                    )
+                get_output_sink().write(
+                    f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
+                    TraceColor.stats,
                 )
 
                 return input_tokens, output_tokens, llm_calls
@@ -348,11 +365,9 @@ class RoutingAndOrchestrationTrace:
                     param_str = f"{parameter['name']}[{parameter['value']}] ({parameter['type']})"
                     params_info.append(param_str)
 
-                print(
-                    colored(
-                        f"Tool use: {tool} with these inputs: {' '.join(params_info)}",
-                        TraceColor.invocation_input,
-                    )
+                get_output_sink().write(
+                    f"Tool use: {tool} with these inputs: {' '.join(params_info)}",
+                    TraceColor.invocation_input,
                 )
 
             if "agentCollaboratorInvocationInput" in trace["invocationInput"]:
@@ -378,11 +393,9 @@ class RoutingAndOrchestrationTrace:
                                 text += f"{returnControlInvocationResult['functionResult']['actionGroup']} :: {returnControlInvocationResult['functionResult']['function']} ({returnControlInvocationResult['functionResult']['responseBody']['string']['body']})"
 
                     if text:
-                        print(
-                            colored(
-                                f"Agent collaborator: {trace['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName']} invoked with {text}",
-                                TraceColor.invocation_input,
-                            )
+                        get_output_sink().write(
+                            f"Agent collaborator: {trace['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName']} invoked with {text}",
+                            TraceColor.invocation_input,
                         )
                     if (
                         "text"
@@ -393,53 +406,43 @@ class RoutingAndOrchestrationTrace:
                         text = trace["invocationInput"][
                             "agentCollaboratorInvocationInput"
                         ]["input"]["text"]
-                        print(
-                            colored(
-                                f"Agent collaborator: {trace['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName']} invoked with {text}",
-                                TraceColor.invocation_input,
-                            )
+                        get_output_sink().write(
+                            f"Agent collaborator: {trace['invocationInput']['agentCollaboratorInvocationInput']['agentCollaboratorName']} invoked with {text}",
+                            TraceColor.invocation_input,
                         )
                     else:
                         text = str()
 
             if "codeInterpreterInvocationInput" in trace["invocationInput"]:
                 if "code" in trace["invocationInput"]["codeInterpreterInvocationInput"]:
-                    print(colored(f"Code interpreter:", TraceColor.invocation_input))
-                    console = Console()
-                    console.print(
-                        Markdown(
-                            f"**Generated code**\n```python\n{trace['invocationInput']['codeInterpreterInvocationInput']['code']}\n```"
-                        )
+                    get_output_sink().write(
+                        f"Code interpreter:", TraceColor.invocation_input
+                    )
+                    get_output_sink().markdown(
+                        f"**Generated code**\n```python\n{trace['invocationInput']['codeInterpreterInvocationInput']['code']}\n```"
                     )
 
                 if (
                     "files"
                     in trace["invocationInput"]["codeInterpreterInvocationInput"]
                 ):
-                    print(
-                        colored(
-                            "Code Interpreter invoked with uploaded files",
-                            TraceColor.invocation_input,
-                        )
+                    get_output_sink().write(
+                        "Code Interpreter invoked with uploaded files",
+                        TraceColor.invocation_input,
                     )
 
             if "knowledgeBaseLookupInput" in trace["invocationInput"]:
-                print(
-                    colored(
-                        f"Knowledgebase retrieval: Knowledgebase Id ({trace['invocationInput']['knowledgeBaseLookupInput']['knowledgeBaseId']}) query ({trace['invocationInput']['knowledgeBaseLookupInput']['text']})",
-                        TraceColor.invocation_input,
-                    )
+                get_output_sink().write(
+                    f"Knowledgebase retrieval: Knowledgebase Id ({trace['invocationInput']['knowledgeBaseLookupInput']['knowledgeBaseId']}) query ({trace['invocationInput']['knowledgeBaseLookupInput']['text']})",
+                    TraceColor.invocation_input,
                 )
 
     @staticmethod
     def parse_model_invocation_input(trace):
         if "modelInvocationInput" in trace:
             if trace["modelInvocationInput"]["type"] == "ROUTING_CLASSIFIER":
-                print(
-                    colored(
-                        f"Routing the request to collaborators",
-                        TraceColor.rationale,
-                    )
+                get_output_sink().write(
+                    f"Routing the request to collaborators", TraceColor.rationale
                 )
 
     @staticmethod
@@ -459,11 +462,9 @@ class RoutingAndOrchestrationTrace:
             else:
                 output_tokens = 0
             llm_calls = 1
-            print(
-                colored(
-                    f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
-                    TraceColor.stats,
-                )
+            get_output_sink().write(
+                f"Input Tokens: {input_tokens} Output Tokens: {output_tokens}",
+                TraceColor.stats,
             )
             return input_tokens, output_tokens, llm_calls
         return 0, 0, 0
@@ -474,11 +475,9 @@ class RoutingAndOrchestrationTrace:
         if "observation" in trace:
 
             if "actionGroupInvocationOutput" in trace["observation"]:
-                print(
-                    colored(
-                        f"Tool use output: {trace['observation']['actionGroupInvocationOutput']['text']}",
-                        TraceColor.invocation_output,
-                    )
+                get_output_sink().write(
+                    f"Tool use output: {trace['observation']['actionGroupInvocationOutput']['text']}",
+                    TraceColor.invocation_output,
                 )
 
             if "agentCollaboratorInvocationOutput" in trace["observation"]:
@@ -501,11 +500,9 @@ class RoutingAndOrchestrationTrace:
                             elif "functionInvocationInput" in invocationInput:
                                 text += f"{invocationInput['functionInvocationInput']['actionGroup']} :: {invocationInput['functionInvocationInput']['function']}"
 
-                        print(
-                            colored(
-                                f"Collaborator output: Invoke ({text})",
-                                TraceColor.invocation_input,
-                            )
+                        get_output_sink().write(
+                            f"Collaborator output: Invoke ({text})",
+                            TraceColor.invocation_input,
                         )
                     elif (
                         "text"
@@ -516,11 +513,8 @@ class RoutingAndOrchestrationTrace:
                         text = trace["observation"][
                             "agentCollaboratorInvocationOutput"
                         ]["output"]["text"]
-                        print(
-                            colored(
-                                f"Collaborator output: {text}",
-                                TraceColor.invocation_input,
-                            )
+                        get_output_sink().write(
+                            f"Collaborator output: {text}", TraceColor.invocation_input
                         )
                     else:
                         text = str()
@@ -530,22 +524,18 @@ class RoutingAndOrchestrationTrace:
                     "executionOutput"
                     in trace["observation"]["codeInterpreterInvocationOutput"]
                 ):
-                    print(
-                        colored(
-                            f"Code interpreter output: {trace['observation']['codeInterpreterInvocationOutput']['executionOutput']}",
-                            TraceColor.invocation_output,
-                        )
+                    get_output_sink().write(
+                        f"Code interpreter output: {trace['observation']['codeInterpreterInvocationOutput']['executionOutput']}",
+                        TraceColor.invocation_output,
                     )
 
                 if (
                     "executionError"
                     in trace["observation"]["codeInterpreterInvocationOutput"]
                 ):
-                    print(
-                        colored(
-                            f"Code interpreter output error: {trace['observation']['codeInterpreterInvocationOutput']['executionError']}",
-                            TraceColor.error,
-                        )
+                    get_output_sink().write(
+                        f"Code interpreter output error: {trace['observation']['codeInterpreterInvocationOutput']['executionError']}",
+                        TraceColor.error,
                     )
 
                 if (
@@ -555,19 +545,15 @@ class RoutingAndOrchestrationTrace:
                     if trace["observation"]["codeInterpreterInvocationOutput"][
                         "executionTimeout"
                     ]:
-                        print(
-                            colored(
-                                f"Code interpreter output error: Execution timeout",
-                                TraceColor.error,
-                            )
+                        get_output_sink().write(
+                            f"Code interpreter output error: Execution timeout",
+                            TraceColor.error,
                         )
 
                 if "files" in trace["observation"]["codeInterpreterInvocationOutput"]:
-                    print(
-                        colored(
-                            "Code Interpreter created new files",
-                            TraceColor.invocation_input,
-                        )
+                    get_output_sink().write(
+                        "Code Interpreter created new files",
+                        TraceColor.invocation_input,
                     )
 
             if "finalResponse" in trace["observation"]:
@@ -584,11 +570,9 @@ class RoutingAndOrchestrationTrace:
                         if "content" in retrievedReference:
                             # TODO: ["content"]["type"] does not exist
                             # if retrievedReference["content"]["type"] == "TEXT":
-                            print(
-                                colored(
-                                    retrievedReference["content"]["text"],
-                                    TraceColor.invocation_output,
-                                )
+                            get_output_sink().write(
+                                retrievedReference["content"]["text"],
+                                TraceColor.invocation_output,
                             )
                             # elif retrievedReference["content"]["type"] == "IMAGE":
                             #     print(
@@ -613,17 +597,13 @@ class RoutingAndOrchestrationTrace:
                             #     )
 
                         if "location" in retrievedReference:
-                            print(
-                                colored(
-                                    f"Location: {json.dumps(retrievedReference['location'], indent=2, default=str)}",
-                                    TraceColor.invocation_output,
-                                )
+                            get_output_sink().write(
+                                f"Location: {json.dumps(retrievedReference['location'], indent=2, default=str)}",
+                                TraceColor.invocation_output,
                             )
 
             if "repromptResponse" in trace["observation"]:
-                print(
-                    colored(
-                        f"Reprompting {trace['observation']['repromptResponse']['source']} with query {trace['orchestrationTrace']['observation']['repromptResponse']['text']}",
-                        TraceColor.invocation_output,
-                    )
+                get_output_sink().write(
+                    f"Reprompting {trace['observation']['repromptResponse']['source']} with query {trace['orchestrationTrace']['observation']['repromptResponse']['text']}",
+                    TraceColor.invocation_output,
                 )
@@ -1,19 +1,25 @@
 """Configuration for OpenTelemetry with Langfuse."""
 
 import base64
+import functools
 import logging
+import signal
+import threading
+from typing import Optional, Sequence
 
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.resources import Resource
 from openinference.semconv.resource import ResourceAttributes
+from opentelemetry.exporter.otlp.proto.http import Compression
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import (
     BatchSpanProcessor,
     ConsoleSpanExporter,
     SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
 )
-from opentelemetry.sdk.resources import Resource
 
 from .settings_management import ObservabilityConfig
 
@@ -23,9 +29,134 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Provider created with set_global=False, used by the SDK's own tracers
+_tracer_provider: Optional[TracerProvider] = None
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON document per line."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        try:
+            with self._lock, open(self.file_path, "a") as file:
+                file.write(lines)
+        except OSError as e:
+            logger.error(f"Could not write spans to {self.file_path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+class FallbackSpanExporter(SpanExporter):
+    """Exports to `primary` and hands batches it rejects to `fallback`."""
+
+    def __init__(self, primary: SpanExporter, fallback: SpanExporter):
+        self.primary = primary
+        self.fallback = fallback
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        try:
+            result = self.primary.export(spans)
+        except Exception as e:
+            logger.warning(f"Span export failed: {e}")
+            result = SpanExportResult.FAILURE
+
+        if result is SpanExportResult.SUCCESS:
+            return result
+
+        logger.warning(
+            f"Collector unreachable, writing {len(spans)} spans to fallback exporter"
+        )
+        return self.fallback.export(spans)
+
+    def shutdown(self):
+        self.primary.shutdown()
+        self.fallback.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.primary.force_flush(timeout_millis) and self.fallback.force_flush(
+            timeout_millis
+        )
+
+
+class _ProviderTracer:
+    """Tracer that resolves the provider on use.
+
+    Module level tracers are created at import time, before
+    `create_tracer_provider` runs, so the provider is looked up per span.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def start_span(self, *args, **kwargs):
+        provider = _tracer_provider or trace.get_tracer_provider()
+        return provider.get_tracer(self.name).start_span(*args, **kwargs)
 
-def create_tracer_provider(config: ObservabilityConfig, timeout: int = 300):
-    """Create an OpenTelemetry TracerProvider configured for Langfuse."""
+
+def get_tracer(name: str) -> _ProviderTracer:
+    return _ProviderTracer(name)
+
+
+def _otlp_exporter(
+    config: ObservabilityConfig, exporter: str, headers: dict, timeout: int
+) -> SpanExporter:
+    if exporter == "otlp_grpc":
+        import grpc
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter as GRPCSpanExporter,
+        )
+
+        return GRPCSpanExporter(
+            endpoint=str(config.API_URL),
+            headers={k.lower(): v for k, v in headers.items()},
+            timeout=timeout,
+            compression=(
+                grpc.Compression.Gzip
+                if config.OTLP_COMPRESSION == "gzip"
+                else grpc.Compression.NoCompression
+            ),
+        )
+
+    endpoint = f"{config.API_URL}/v1/traces"
+    logger.info(f"Using OTLP endpoint: {endpoint}")
+    return OTLPSpanExporter(
+        endpoint=endpoint,
+        headers=headers,
+        timeout=timeout,
+        compression=Compression(config.OTLP_COMPRESSION),
+    )
+
+
+def create_tracer_provider(
+    config: ObservabilityConfig, timeout: int = None, set_global: bool = True
+) -> TracerProvider:
+    """Create an OpenTelemetry TracerProvider configured for Langfuse.
+
+    Args:
+        config: Observability settings, including exporters and batching.
+        timeout: Exporter request timeout in seconds, defaults to
+            ``config.OTLP_EXPORT_TIMEOUT``.
+        set_global: Register the provider as the global OpenTelemetry provider.
+            When False it is only used for spans produced by this SDK.
+
+    Returns:
+        TracerProvider: The configured provider.
+    """
+    global _tracer_provider
+
+    if timeout is None:
+        timeout = config.OTLP_EXPORT_TIMEOUT
 
     # Create resource attributes
     resource = Resource.create(
@@ -39,9 +170,17 @@ def create_tracer_provider(config: ObservabilityConfig, timeout: int = 300):
     # Create tracer provider with resource
     tracer_provider = TracerProvider(resource=resource)
 
-    if config.API_URL and config.PRODUCE_BEDROCK_OTEL_TRACES:
-        endpoint = f"{config.API_URL}/v1/traces"
+    def batch_processor(exporter: SpanExporter) -> BatchSpanProcessor:
+        return BatchSpanProcessor(
+            span_exporter=exporter,
+            max_queue_size=config.OTEL_BSP_MAX_QUEUE_SIZE,
+            max_export_batch_size=config.OTEL_BSP_MAX_EXPORT_BATCH_SIZE,
+            schedule_delay_millis=config.OTEL_BSP_SCHEDULE_DELAY_MILLIS,
+            export_timeout_millis=config.OTEL_BSP_EXPORT_TIMEOUT_MILLIS,
+        )
 
+    if config.PRODUCE_BEDROCK_OTEL_TRACES:
+        headers = {}
         # Configure Langfuse exporter if credentials are provided
         if config.LANGFUSE_PUBLIC_KEY and config.LANGFUSE_SECRET_KEY:
 
@@ -49,35 +188,106 @@ def create_tracer_provider(config: ObservabilityConfig, timeout: int = 300):
             langfuse_auth = base64.b64encode(
                 f"{config.LANGFUSE_PUBLIC_KEY}:{config.LANGFUSE_SECRET_KEY}".encode()
             ).decode()
-            # Configure OTLP exporter for Langfuse - match the original implementation
-            logger.info(f"Using Langfuse endpoint: {endpoint}")
-
-            langfuse_exporter = OTLPSpanExporter(
-                endpoint=endpoint,
-                headers={"Authorization": f"Basic {langfuse_auth}"},
-                timeout=timeout,
-            )
-
-            # Add Langfuse exporter to tracer provider
-            # Use default settings for simplicity
+            headers["Authorization"] = f"Basic {langfuse_auth}"
             logger.info(
                 f"Langfuse exporter configured for project: {config.PROJECT_NAME}"
             )
-            tracer_provider.add_span_processor(BatchSpanProcessor(langfuse_exporter))
-        else:
-            span_exporter = OTLPSpanExporter(
-                endpoint=endpoint,
-                timeout=timeout,
-            )
-            tracer_provider.add_span_processor(
-                BatchSpanProcessor(span_exporter=span_exporter)
-            )
+
+        for exporter in config.OTEL_EXPORTERS:
+            if exporter in ("otlp_http", "otlp_grpc"):
+                if not config.API_URL:
+                    logger.warning(f"API_URL is not set, skipping {exporter} exporter")
+                    continue
+                span_exporter = _otlp_exporter(
+                    config=config, exporter=exporter, headers=headers, timeout=timeout
+                )
+                if config.OTEL_FILE_FALLBACK:
+                    span_exporter = FallbackSpanExporter(
+                        primary=span_exporter,
+                        fallback=FileSpanExporter(config.OTEL_EXPORT_FILE),
+                    )
+                tracer_provider.add_span_processor(batch_processor(span_exporter))
+            elif exporter == "file":
+                tracer_provider.add_span_processor(
+                    batch_processor(FileSpanExporter(config.OTEL_EXPORT_FILE))
+                )
+            elif exporter == "console":
+                tracer_provider.add_span_processor(
+                    SimpleSpanProcessor(ConsoleSpanExporter())
+                )
+            else:
+                logger.warning(
+                    f"Unknown exporter {exporter!r} in OTEL_EXPORTERS, skipping"
+                )
 
     else:
-        # tracer_provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
         logger.warning(
-            "Credentials not provided, telemetry will not be created or exported"
+            "PRODUCE_BEDROCK_OTEL_TRACES is disabled, telemetry will not be created or exported"
         )
 
-    # Set as global tracer provider
-    trace.set_tracer_provider(tracer_provider)
+    if set_global:
+        _tracer_provider = None
+        # Set as global tracer provider
+        trace.set_tracer_provider(tracer_provider)
+    else:
+        _tracer_provider = tracer_provider
+
+    return tracer_provider
+
+
+def flush_tracer_provider(
+    tracer_provider: TracerProvider = None, timeout_millis: int = 5000
+) -> bool:
+    """Export all buffered spans, waiting at most `timeout_millis`."""
+    tracer_provider = tracer_provider or _tracer_provider or trace.get_tracer_provider()
+    if not hasattr(tracer_provider, "force_flush"):
+        return True
+    return tracer_provider.force_flush(timeout_millis=timeout_millis)
+
+
+def flush_traces(handler=None, *, timeout_millis: int = 5000):
+    """Decorator that flushes spans after every call, e.g. a Lambda handler.
+
+    Lambda freezes the execution environment once the handler returns, so
+    spans still queued in a BatchSpanProcessor would otherwise be delayed
+    until the next invocation or lost.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                flush_tracer_provider(timeout_millis=timeout_millis)
+
+        return wrapper
+
+    if handler is not None:
+        return decorator(handler)
+    return decorator
+
+
+def register_shutdown_hooks(
+    tracer_provider: TracerProvider = None, timeout_millis: int = 5000
+):
+    """Flush and shut the provider down when the container receives SIGTERM.
+
+    Any previously installed SIGTERM handler is still called afterwards.
+    Must be called from the main thread.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        flush_tracer_provider(tracer_provider, timeout_millis=timeout_millis)
+        provider = tracer_provider or _tracer_provider or trace.get_tracer_provider()
+        if hasattr(provider, "shutdown"):
+            provider.shutdown()
+
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.raise_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
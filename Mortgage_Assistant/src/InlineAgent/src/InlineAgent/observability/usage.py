@@ -0,0 +1,235 @@
+"""Token, cost and latency accounting per session and per agent.
+
+A `UsageLedger` is fed the trace events of an agent response and attributes
+model usage to the agent at the end of each event's caller chain, so
+collaborators of a supervisor are accounted separately. The ledger is saved
+per session, and a `Budget` stops a run once a ceiling is reached::
+
+    ledger = UsageLedger(
+        session_id="session-1",
+        model_prices={"anthropic.claude-3-haiku": (0.00025, 0.00125)},
+        budget=Budget(max_tokens=50_000, max_cost=0.50),
+    )
+    await agent.invoke(input_text="...", session_id="session-1", usage_ledger=ledger)
+"""
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from .constants import L2Traces, L3OrchestrationTraces
+from .trace import Trace
+from .utils import get_agent_from_caller_chain, parse_event_time, unwrap_trace_event
+
+
+class BudgetExceededError(Exception):
+    """Raised by `UsageLedger.record` once a `Budget` ceiling is reached."""
+
+    def __init__(self, message: str, usage: "AgentUsage"):
+        super().__init__(message)
+        self.usage = usage
+
+
+@dataclass
+class AgentUsage:
+    agent_id: str
+    caller: Optional[str] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    llm_calls: int = 0
+    latency_ms: float = 0.0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+@dataclass
+class Budget:
+    """Ceilings for a session, checked after every model invocation."""
+
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    max_llm_calls: Optional[int] = None
+
+    def check(self, usage: AgentUsage) -> Optional[str]:
+        """Reason the budget is exceeded, or None."""
+        if self.max_tokens is not None and usage.total_tokens >= self.max_tokens:
+            return (
+                f"token budget of {self.max_tokens} reached ({usage.total_tokens} used)"
+            )
+        if self.max_cost is not None and usage.cost >= self.max_cost:
+            return (
+                f"cost budget of ${self.max_cost:.4f} reached (${usage.cost:.4f} used)"
+            )
+        if self.max_llm_calls is not None and usage.llm_calls >= self.max_llm_calls:
+            return f"LLM call budget of {self.max_llm_calls} reached"
+        return None
+
+
+@dataclass
+class UsageLedger:
+    """Usage of one session, attributed to the agents in the caller chain.
+
+    Args:
+        session_id: Session the ledger belongs to, also the name of its file.
+        model_prices: USD per 1,000 input and output tokens, by model id. A
+            model matches the first key that is a substring of its id, so
+            inference profile and model ARNs resolve to the base model.
+        budget: Ceilings that stop the run with `BudgetExceededError`.
+        agent_name: Agent to charge when an event has no caller chain, as
+            with inline agents.
+        directory: Where the ledger is saved, ``./usage`` by default.
+        persist: Load the saved ledger of the session and save on `save()`.
+    """
+
+    session_id: str
+    model_prices: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    budget: Optional[Budget] = None
+    agent_name: str = "agent"
+    directory: Optional[str] = None
+    persist: bool = True
+    agents: Dict[str, AgentUsage] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        # traceId -> (start time, model) of model invocations in flight
+        self._pending: Dict[str, Tuple[datetime, Optional[str]]] = {}
+        if self.directory is None:
+            self.directory = os.path.join(os.getcwd(), "usage")
+        if self.persist:
+            self.load()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.session_id}.json")
+
+    @property
+    def total(self) -> AgentUsage:
+        total = AgentUsage(agent_id="total")
+        for usage in self.agents.values():
+            total.input_tokens += usage.input_tokens
+            total.output_tokens += usage.output_tokens
+            total.llm_calls += usage.llm_calls
+            total.latency_ms += usage.latency_ms
+            total.cost += usage.cost
+        return total
+
+    def price(self, model: Optional[str]) -> Tuple[float, float]:
+        if model:
+            if model in self.model_prices:
+                return self.model_prices[model]
+            for key, price in self.model_prices.items():
+                if key in model:
+                    return price
+        return 0.0, 0.0
+
+    def _agent(self, trace_data: Dict) -> Tuple[str, Optional[str]]:
+        caller_chain = trace_data.get("callerChain") or []
+        try:
+            agent_id, _ = get_agent_from_caller_chain(caller_chain, index=-1)
+        except Exception:
+            return self.agent_name, None
+
+        caller = None
+        if len(caller_chain) > 1:
+            try:
+                caller, _ = get_agent_from_caller_chain(caller_chain, index=-2)
+            except Exception:
+                pass
+        return agent_id, caller
+
+    def record(self, trace_data: Dict) -> Tuple[int, int, int]:
+        """Account one trace event and enforce the budget.
+
+        Accepts stream events as well as their ``trace`` member. Returns the
+        input tokens, output tokens and LLM calls of the event.
+        """
+        trace_data = unwrap_trace_event(trace_data)
+        trace = trace_data.get("trace")
+        if not trace:
+            return 0, 0, 0
+
+        step = next((t.value for t in L2Traces if t.value in trace), None)
+        body = trace.get(step) if step else None
+        if not isinstance(body, dict):
+            return 0, 0, 0
+
+        event_time = parse_event_time(trace_data.get("eventTime")) or datetime.now(
+            timezone.utc
+        )
+
+        model_input = body.get(L3OrchestrationTraces.modelInvocationInput.value)
+        if model_input is not None:
+            with self._lock:
+                self._pending[model_input.get("traceId")] = (
+                    event_time,
+                    model_input.get("foundationModel"),
+                )
+
+        model_output = body.get(L3OrchestrationTraces.modelInvocationOutput.value)
+        if model_output is None:
+            return 0, 0, 0
+
+        input_tokens, output_tokens, llm_calls = Trace.count_usage(trace=trace)
+        agent_id, caller = self._agent(trace_data)
+
+        with self._lock:
+            started, model = self._pending.pop(
+                model_output.get("traceId"), (None, None)
+            )
+            input_price, output_price = self.price(model)
+
+            usage = self.agents.get(agent_id)
+            if usage is None:
+                usage = self.agents[agent_id] = AgentUsage(
+                    agent_id=agent_id, caller=caller
+                )
+            usage.input_tokens += input_tokens
+            usage.output_tokens += output_tokens
+            usage.llm_calls += llm_calls
+            usage.cost += (
+                input_tokens * input_price + output_tokens * output_price
+            ) / 1000
+            if started is not None:
+                usage.latency_ms += (event_time - started).total_seconds() * 1000
+
+        if self.budget is not None:
+            total = self.total
+            reason = self.budget.check(total)
+            if reason is not None:
+                if self.persist:
+                    self.save()
+                raise BudgetExceededError(
+                    f"Session {self.session_id}: {reason}", usage=total
+                )
+
+        return input_tokens, output_tokens, llm_calls
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.agents = {
+            agent_id: AgentUsage(**usage)
+            for agent_id, usage in data.get("agents", {}).items()
+        }
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            data = {
+                "session_id": self.session_id,
+                "agents": {
+                    agent_id: asdict(usage) for agent_id, usage in self.agents.items()
+                },
+                "total": asdict(self.total),
+            }
+        with open(self.path, "w") as file:
+            json.dump(data, file, indent=2)
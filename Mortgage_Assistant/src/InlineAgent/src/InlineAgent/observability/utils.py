@@ -1,9 +1,11 @@
 import json
-from typing import List, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 from pydantic import validate_call
 from InlineAgent.constants import TraceColor
-from termcolor import colored
+
+from .output import get_output_sink
 
 
 def json_safe(obj):
@@ -21,6 +23,25 @@ def get_agent_from_caller_chain(caller_chain: list, index: int) -> Tuple[str, st
     return get_agent_id_aliasid(alias_id)
 
 
+def unwrap_trace_event(event: Dict) -> Dict:
+    """Trace data of a raw stream event ({"trace": {...}}), saved trace data is returned as is."""
+    if "eventTime" not in event and "trace" in event and "trace" in event["trace"]:
+        return event["trace"]
+    return event
+
+
+def parse_event_time(value) -> Optional[datetime]:
+    """The eventTime of a trace as a datetime, or None when missing or malformed."""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
 def get_agent_id_aliasid(arn: str):
     trace_id = arn.split("agent-alias/")[1].replace("/", ":")
     agent_id, agent_alias_id = trace_id.split(":")
@@ -30,6 +51,7 @@ def get_agent_id_aliasid(arn: str):
 
 def add_citation(citations: List, cite=1) -> str:
 
+    sink = get_output_sink()
     agent_answer = str()
 
     cite_output = list()
@@ -68,17 +90,17 @@ def add_citation(citations: List, cite=1) -> str:
 
         agent_answer += text
 
-        print(colored(f"\n\n<-- Response with Citation -->", TraceColor.cite))
-        print(colored(text, TraceColor.final_output), end="")
+        sink.write(f"\n\n<-- Response with Citation -->", TraceColor.cite)
+        sink.write(text, TraceColor.final_output, end="")
         if citation["retrievedReferences"]:
-            print(colored(f" [{cite}]", TraceColor.error), end="")
+            sink.write(f" [{cite}]", TraceColor.error, end="")
 
         cite += 1
 
-    print("\n\n")
+    sink.write("\n\n")
     for output in cite_output:
         if len(output[1]):
-            print(colored(output[0], TraceColor.cite))
-            print(colored(output[1] + "\n", TraceColor.retrieved_references))
+            sink.write(output[0], TraceColor.cite)
+            sink.write(output[1] + "\n", TraceColor.retrieved_references)
 
     return agent_answer, cite
@@ -0,0 +1,201 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from InlineAgent.observability.analytics import (
+    TraceAnalyzer,
+    analyze,
+    iter_trace_file,
+    percentile,
+)
+
+SUPERVISOR = "arn:aws:bedrock:us-east-1:123456789012:agent-alias/SUPERVISOR/ALIAS1"
+COLLABORATOR = "arn:aws:bedrock:us-east-1:123456789012:agent-alias/COLLAB/ALIAS2"
+
+
+def event(second, trace, caller_chain=(SUPERVISOR,), session_id="session-1"):
+    return {
+        "sessionId": session_id,
+        "agentVersion": "DRAFT",
+        "eventTime": f"2025-01-01 12:00:{second:06.3f}+00:00",
+        "callerChain": [{"agentAliasArn": arn} for arn in caller_chain],
+        "trace": trace,
+    }
+
+
+def session_events(session_id="session-1"):
+    return [
+        event(
+            0,
+            {
+                "orchestrationTrace": {
+                    "modelInvocationInput": {"traceId": "t-0", "text": "..."}
+                }
+            },
+            session_id=session_id,
+        ),
+        event(
+            1.5,
+            {
+                "orchestrationTrace": {
+                    "modelInvocationOutput": {
+                        "traceId": "t-0",
+                        "metadata": {"usage": {"inputTokens": 100, "outputTokens": 20}},
+                    }
+                }
+            },
+            session_id=session_id,
+        ),
+        event(
+            2,
+            {
+                "orchestrationTrace": {
+                    "invocationInput": {
+                        "traceId": "t-0",
+                        "agentCollaboratorInvocationInput": {
+                            "agentCollaboratorName": "mortgage-agent",
+                            "input": {"text": "balance?"},
+                        },
+                    }
+                }
+            },
+            session_id=session_id,
+        ),
+        event(
+            3,
+            {
+                "orchestrationTrace": {
+                    "invocationInput": {
+                        "traceId": "t-1",
+                        "actionGroupInvocationInput": {
+                            "actionGroupName": "accounts",
+                            "function": "get_balance",
+                        },
+                    }
+                }
+            },
+            caller_chain=(SUPERVISOR, COLLABORATOR),
+            session_id=session_id,
+        ),
+        event(
+            3.25,
+            {
+                "orchestrationTrace": {
+                    "observation": {
+                        "traceId": "t-1",
+                        "actionGroupInvocationOutput": {"text": "100"},
+                    }
+                }
+            },
+            caller_chain=(SUPERVISOR, COLLABORATOR),
+            session_id=session_id,
+        ),
+        event(
+            4,
+            {
+                "guardrailTrace": {
+                    "action": "INTERVENED",
+                    "traceId": "t-2",
+                    "inputAssessments": [],
+                    "outputAssessments": [],
+                }
+            },
+            session_id=session_id,
+        ),
+    ]
+
+
+class TestTraceAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_json(self, name, events):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as file:
+            json.dump(events, file, indent=2, default=str)
+        return path
+
+    def write_jsonl(self, name, events):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as file:
+            for trace_data in events:
+                file.write(json.dumps(trace_data) + "\n")
+        return path
+
+    def test_iter_trace_file_streams_json_list(self):
+        events = session_events()
+        path = self.write_json("session-1.json", events)
+
+        self.assertEqual(list(iter_trace_file(path, chunk_size=7)), events)
+
+    def test_iter_trace_file_reads_jsonl(self):
+        events = session_events()
+        path = self.write_jsonl("session-1.jsonl", events)
+
+        self.assertEqual(list(iter_trace_file(path)), events)
+
+    def test_iter_trace_file_rejects_truncated_json(self):
+        path = os.path.join(self.directory.name, "broken.json")
+        with open(path, "w") as file:
+            file.write(json.dumps(session_events())[:-20])
+
+        with self.assertRaises(ValueError):
+            list(iter_trace_file(path))
+
+    def test_summary(self):
+        self.write_json("session-1.json", session_events("session-1"))
+        self.write_jsonl("session-2.jsonl", session_events("session-2"))
+
+        summary = analyze(self.directory.name)
+
+        self.assertEqual(summary["sessions"], 2)
+        supervisor = summary["agents"]["SUPERVISOR"]
+        self.assertEqual(supervisor["input_tokens"], 200)
+        self.assertEqual(supervisor["output_tokens"], 40)
+        self.assertEqual(supervisor["llm_calls"], 2)
+        self.assertEqual(supervisor["model_latency_ms"]["p50"], 1500)
+        self.assertEqual(supervisor["guardrail_interventions"], 2)
+
+        tool = summary["tools"]["accounts::get_balance"]
+        self.assertEqual(tool["calls"], 2)
+        self.assertEqual(tool["latency_ms"]["p50"], 250)
+
+        self.assertEqual(summary["collaborators"], {"mortgage-agent": 2})
+        self.assertEqual(summary["fan_out"]["max"], 1)
+        self.assertEqual(summary["steps"]["orchestrationTrace"]["p50"], 1125)
+
+    def test_step_rows_written_to_csv(self):
+        self.write_json("session-1.json", session_events())
+        output = os.path.join(self.directory.name, "steps.csv")
+
+        analyze(self.directory.name, output=output)
+
+        with open(output, newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 3)
+        tool_row = next(row for row in rows if row["agent_id"] == "COLLAB")
+        self.assertEqual(tool_row["tools"], "accounts::get_balance")
+        self.assertEqual(tool_row["depth"], "2")
+
+    def test_steps_are_released_per_session(self):
+        rows = []
+        analyzer = TraceAnalyzer(on_step=rows.append)
+        for trace_data in session_events():
+            analyzer.process_event(trace_data)
+        analyzer.end_session()
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(analyzer._steps, {})
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([5], 99), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import logging
+import unittest
+from unittest import mock
+
+from InlineAgent.observability import (
+    ConsoleSink,
+    LoggingSink,
+    NullSink,
+    Trace,
+    get_output_sink,
+    use_output_sink,
+)
+
+orchestration_trace = {
+    "orchestrationTrace": {
+        "modelInvocationOutput": {
+            "metadata": {"usage": {"inputTokens": 120, "outputTokens": 30}},
+            "traceId": "trace-1",
+        }
+    }
+}
+
+rationale_trace = {
+    "orchestrationTrace": {"rationale": {"text": "I should call a tool"}}
+}
+
+
+class TestOutputSinks(unittest.TestCase):
+
+    def test_default_sink_is_console(self):
+        self.assertIsInstance(get_output_sink(), ConsoleSink)
+
+    def test_use_output_sink_restores_previous(self):
+        previous = get_output_sink()
+        with use_output_sink(NullSink()) as sink:
+            self.assertIs(get_output_sink(), sink)
+        self.assertIs(get_output_sink(), previous)
+
+    @mock.patch("builtins.print")
+    def test_null_sink_skips_rendering(self, mock_print):
+        with use_output_sink(NullSink()):
+            usage = Trace.parse_trace(trace=orchestration_trace, agentName="agent")
+            Trace.parse_trace(trace=rationale_trace, agentName="agent")
+
+        self.assertEqual(usage, (120, 30, 1))
+        mock_print.assert_not_called()
+
+    @mock.patch("builtins.print")
+    def test_console_and_null_sink_count_the_same(self, mock_print):
+        with use_output_sink(ConsoleSink()):
+            console_usage = Trace.parse_trace(
+                trace=orchestration_trace, agentName="agent"
+            )
+        with use_output_sink(NullSink()):
+            null_usage = Trace.parse_trace(trace=orchestration_trace, agentName="agent")
+
+        self.assertEqual(console_usage, null_usage)
+        mock_print.assert_called()
+
+    def test_logging_sink_records_trace_events(self):
+        logger = logging.getLogger("InlineAgent.tests.output")
+        with self.assertLogs(logger, level="INFO") as logs:
+            with use_output_sink(LoggingSink(logger=logger)):
+                Trace.parse_trace(trace=rationale_trace, agentName="agent")
+                Trace.parse_trace(trace=orchestration_trace, agentName="agent")
+
+        self.assertIn("Thought: I should call a tool", logs.output[0])
+        events = [
+            record.trace_event
+            for record in logs.records
+            if hasattr(record, "trace_event")
+        ]
+        self.assertEqual(events[-1]["input_tokens"], 120)
+        self.assertEqual(events[-1]["trace_type"], "orchestrationTrace")
+
+    def test_logging_sink_joins_partial_writes(self):
+        logger = logging.getLogger("InlineAgent.tests.output")
+        sink = LoggingSink(logger=logger)
+        with self.assertLogs(logger, level="INFO") as logs:
+            sink.write("Hello", end="")
+            sink.write(" world", end="")
+            sink.write("!")
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].getMessage(), "Hello world!")
+
+    def test_logging_sink_disabled_above_level(self):
+        logger = logging.getLogger("InlineAgent.tests.output.quiet")
+        logger.setLevel(logging.WARNING)
+        self.assertFalse(LoggingSink(logger=logger, level=logging.INFO).enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from InlineAgent.agent import InlineAgent
+from InlineAgent.observability import NullSink
+from InlineAgent.observability.benchmark import run_benchmarks
+from InlineAgent.observability.replay import RecordingClient, ReplayClient
+
+CALLER_CHAIN = [
+    {"agentAliasArn": "arn:aws:bedrock:us-east-1:123456789012:agent-alias/AGENT/ALIAS"}
+]
+
+
+def trace_event(trace):
+    return {
+        "trace": {
+            "agentId": "AGENT",
+            "agentAliasId": "ALIAS",
+            "agentVersion": "DRAFT",
+            "sessionId": "session-1",
+            "eventTime": datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc),
+            "callerChain": CALLER_CHAIN,
+            "trace": trace,
+        }
+    }
+
+
+EVENTS = [
+    trace_event(
+        {
+            "orchestrationTrace": {
+                "modelInvocationInput": {
+                    "traceId": "t-0",
+                    "text": "{}",
+                    "type": "ORCHESTRATION",
+                    "inferenceConfiguration": {"maximumLength": 2048},
+                    "foundationModel": "model",
+                }
+            }
+        }
+    ),
+    trace_event(
+        {
+            "orchestrationTrace": {
+                "modelInvocationOutput": {
+                    "traceId": "t-0",
+                    "rawResponse": {"content": "{}"},
+                    "metadata": {"usage": {"inputTokens": 10, "outputTokens": 5}},
+                }
+            }
+        }
+    ),
+    {"chunk": {"bytes": b"Hello "}},
+    {"chunk": {"bytes": b"world"}},
+]
+
+
+class FakeRuntimeClient:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def invoke_inline_agent(self, **kwargs):
+        return self.invoke_agent(**kwargs)
+
+    def invoke_agent(self, **kwargs):
+        return {
+            "completion": iter(self.responses.pop(0)),
+            "sessionId": kwargs["sessionId"],
+            "contentType": "application/json",
+            "ResponseMetadata": {
+                "RequestId": "request-1",
+                "HTTPStatusCode": 200,
+                "RetryAttempts": 0,
+            },
+        }
+
+    def get_agent_memory(self, **kwargs):
+        return {"memoryContents": []}
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "recording.jsonl.gz")
+
+    def record(self, responses, operation="invoke_inline_agent"):
+        with RecordingClient(FakeRuntimeClient(responses), self.path) as client:
+            for _ in responses:
+                response = getattr(client, operation)(sessionId="session-1")
+                list(response["completion"])
+
+    def test_round_trip(self):
+        self.record([EVENTS])
+
+        replay = ReplayClient(self.path)
+        response = replay.invoke_inline_agent(sessionId="session-2")
+
+        self.assertEqual(list(response["completion"]), EVENTS)
+        self.assertEqual(response["sessionId"], "session-2")
+        self.assertEqual(response["ResponseMetadata"]["RequestId"], "request-1")
+
+    def test_recording_passes_through_other_calls(self):
+        client = RecordingClient(FakeRuntimeClient([]), self.path)
+        self.addCleanup(client.close)
+        self.assertEqual(client.get_agent_memory(), {"memoryContents": []})
+
+    def test_replay_exhausted(self):
+        self.record([EVENTS])
+
+        replay = ReplayClient(self.path)
+        replay.invoke_inline_agent(sessionId="session-1")
+        with self.assertRaises(RuntimeError):
+            replay.invoke_inline_agent(sessionId="session-1")
+
+        replay.reset()
+        replay.invoke_inline_agent(sessionId="session-1")
+
+    def test_replay_operation_mismatch(self):
+        self.record([EVENTS])
+
+        with self.assertRaises(RuntimeError):
+            ReplayClient(self.path).invoke_agent(sessionId="session-1")
+
+    def test_inline_agent_invoke_from_recording(self):
+        self.record([EVENTS])
+
+        agent = InlineAgent(
+            foundation_model="model",
+            instruction="You are a friendly assistant for unit tests.",
+            agent_name="replay-agent",
+            bedrock_agent_runtime_client=ReplayClient(self.path),
+        )
+        answer = asyncio.run(
+            agent.invoke(
+                input_text="hi", session_id="session-1", output_sink=NullSink()
+            )
+        )
+
+        self.assertEqual(answer, "Hello world")
+
+    def test_run_benchmarks(self):
+        self.record([EVENTS])
+
+        results = run_benchmarks(self.path, iterations=2)
+
+        self.assertEqual(
+            set(results),
+            {
+                "stream",
+                "inline_agent[null]",
+                "inline_agent[console]",
+                "observe[null]",
+                "observe[console]",
+            },
+        )
+        for result in results.values():
+            self.assertGreater(result["mean_ms"], 0)
+
+    def test_run_benchmarks_invoke_agent(self):
+        self.record([EVENTS, EVENTS], operation="invoke_agent")
+        answers = []
+
+        def agent_client_runner(replay):
+            def run():
+                replay.reset()
+                for _ in replay.responses:
+                    response = replay.invoke_agent(sessionId="benchmark")
+                    answers.append(
+                        "".join(
+                            event["chunk"]["bytes"].decode()
+                            for event in response["completion"]
+                            if "chunk" in event
+                        )
+                    )
+
+            return run
+
+        results = run_benchmarks(
+            self.path, iterations=2, scenarios={"agent_client": agent_client_runner}
+        )
+
+        self.assertEqual(
+            set(results),
+            {"stream", "observe[null]", "observe[console]", "agent_client"},
+        )
+        # warmup, iterations and the memory run, two recorded responses each
+        self.assertEqual(answers, ["Hello world"] * 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import unittest
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from InlineAgent.observability import trace_provider
+from InlineAgent.observability.settings_management import ObservabilityConfig
+from InlineAgent.observability.trace_provider import (
+    FallbackSpanExporter,
+    FileSpanExporter,
+    create_tracer_provider,
+    flush_traces,
+    get_tracer,
+)
+
+
+class FailingExporter(SpanExporter):
+    def export(self, spans):
+        raise ConnectionError("collector unreachable")
+
+
+def finished_spans(count):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    for i in range(count):
+        provider.get_tracer("test").start_span(f"span-{i}").end()
+    return exporter.get_finished_spans()
+
+
+class TestTraceProvider(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "spans.jsonl")
+        self.addCleanup(setattr, trace_provider, "_tracer_provider", None)
+
+    def test_file_exporter(self):
+        result = FileSpanExporter(self.path).export(finished_spans(2))
+
+        self.assertIs(result, SpanExportResult.SUCCESS)
+        with open(self.path) as file:
+            names = [json.loads(line)["name"] for line in file]
+        self.assertEqual(names, ["span-0", "span-1"])
+
+    def test_fallback_on_primary_failure(self):
+        exporter = FallbackSpanExporter(
+            primary=FailingExporter(), fallback=FileSpanExporter(self.path)
+        )
+
+        with self.assertLogs(trace_provider.logger, "WARNING"):
+            result = exporter.export(finished_spans(1))
+
+        self.assertIs(result, SpanExportResult.SUCCESS)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_config_parses_exporter_list(self):
+        config = ObservabilityConfig(_env_file=None, OTEL_EXPORTERS="otlp_http, file, ")
+        self.assertEqual(config.OTEL_EXPORTERS, ["otlp_http", "file"])
+
+    def test_unknown_exporter_is_reported(self):
+        with self.assertRaises(ValueError):
+            ObservabilityConfig(_env_file=None, OTEL_EXPORTERS="otlp-http")
+
+        config = ObservabilityConfig(_env_file=None, PRODUCE_BEDROCK_OTEL_TRACES=True)
+        config.OTEL_EXPORTERS = ["otlp-http"]
+        with self.assertLogs(trace_provider.logger, "WARNING") as logs:
+            provider = create_tracer_provider(config, set_global=False)
+        self.addCleanup(provider.shutdown)
+
+        self.assertIn("'otlp-http'", logs.output[0])
+
+    def test_non_global_provider_receives_sdk_spans(self):
+        config = ObservabilityConfig(
+            _env_file=None,
+            PRODUCE_BEDROCK_OTEL_TRACES=True,
+            OTEL_EXPORTERS="file",
+            OTEL_EXPORT_FILE=self.path,
+            OTEL_BSP_SCHEDULE_DELAY_MILLIS=60000,
+        )
+        provider = create_tracer_provider(config, set_global=False)
+        self.addCleanup(provider.shutdown)
+        memory = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(memory))
+
+        @flush_traces(timeout_millis=1000)
+        def handler():
+            get_tracer("bedrock-agent-tracer").start_span("invoke").end()
+
+        handler()
+
+        self.assertEqual(
+            [span.name for span in memory.get_finished_spans()], ["invoke"]
+        )
+        # The batch processor was flushed despite the long schedule delay
+        with open(self.path) as file:
+            self.assertEqual(json.loads(file.readline())["name"], "invoke")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from InlineAgent.agent import InlineAgent
+from InlineAgent.observability import (
+    Budget,
+    BudgetExceededError,
+    NullSink,
+    UsageLedger,
+)
+
+SUPERVISOR = "arn:aws:bedrock:us-east-1:123456789012:agent-alias/SUPERVISOR/ALIAS"
+COLLABORATOR = "arn:aws:bedrock:us-east-1:123456789012:agent-alias/COLLAB/ALIAS"
+START = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def model_events(trace_id, caller_chain, input_tokens, output_tokens, seconds=1):
+    chain = [{"agentAliasArn": arn} for arn in caller_chain]
+    return [
+        {
+            "trace": {
+                "sessionId": "session-1",
+                "eventTime": START,
+                "callerChain": chain,
+                "trace": {
+                    "orchestrationTrace": {
+                        "modelInvocationInput": {
+                            "traceId": trace_id,
+                            "foundationModel": "us.anthropic.claude-3-haiku-v1:0",
+                        }
+                    }
+                },
+            }
+        },
+        {
+            "trace": {
+                "sessionId": "session-1",
+                "eventTime": START + timedelta(seconds=seconds),
+                "callerChain": chain,
+                "trace": {
+                    "orchestrationTrace": {
+                        "modelInvocationOutput": {
+                            "traceId": trace_id,
+                            "metadata": {
+                                "usage": {
+                                    "inputTokens": input_tokens,
+                                    "outputTokens": output_tokens,
+                                }
+                            },
+                        }
+                    }
+                },
+            }
+        },
+    ]
+
+
+class FakeRuntimeClient:
+    def __init__(self, events):
+        self.events = events
+
+    def invoke_inline_agent(self, **kwargs):
+        return {
+            "completion": iter(self.events),
+            "ResponseMetadata": {"RequestId": "request-1", "RetryAttempts": 0},
+        }
+
+
+class TestUsageLedger(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def ledger(self, **kwargs):
+        return UsageLedger(session_id="session-1", directory=self.directory, **kwargs)
+
+    def test_attributes_usage_to_collaborators(self):
+        ledger = self.ledger(model_prices={"anthropic.claude-3-haiku": (1.0, 2.0)})
+        events = model_events("t-0", [SUPERVISOR], 100, 10) + model_events(
+            "t-1", [SUPERVISOR, COLLABORATOR], 200, 20, seconds=2
+        )
+        for event in events:
+            ledger.record(event)
+
+        supervisor = ledger.agents["SUPERVISOR"]
+        collaborator = ledger.agents["COLLAB"]
+        self.assertEqual((supervisor.input_tokens, supervisor.output_tokens), (100, 10))
+        self.assertEqual(collaborator.caller, "SUPERVISOR")
+        self.assertEqual(collaborator.llm_calls, 1)
+        self.assertAlmostEqual(collaborator.latency_ms, 2000)
+        self.assertAlmostEqual(collaborator.cost, (200 * 1.0 + 20 * 2.0) / 1000)
+        self.assertEqual(ledger.total.total_tokens, 330)
+
+    def test_persists_per_session(self):
+        ledger = self.ledger()
+        for event in model_events("t-0", [SUPERVISOR], 100, 10):
+            ledger.record(event)
+        ledger.save()
+
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "session-1.json")))
+        self.assertEqual(self.ledger().total.total_tokens, 110)
+        self.assertEqual(
+            UsageLedger(session_id="session-2", directory=self.directory).agents, {}
+        )
+
+    def test_budget_stops_invoke(self):
+        ledger = self.ledger(budget=Budget(max_tokens=150))
+        events = (
+            model_events("t-0", [SUPERVISOR], 100, 10)
+            + model_events("t-1", [SUPERVISOR], 100, 10)
+            + [{"chunk": {"bytes": b"never reached"}}]
+        )
+        agent = InlineAgent(
+            foundation_model="model",
+            instruction="You are a friendly assistant for unit tests.",
+            agent_name="budget-agent",
+            bedrock_agent_runtime_client=FakeRuntimeClient(events),
+        )
+
+        with self.assertRaises(BudgetExceededError) as context:
+            asyncio.run(
+                agent.invoke(
+                    input_text="hi",
+                    session_id="session-1",
+                    output_sink=NullSink(),
+                    usage_ledger=ledger,
+                )
+            )
+
+        self.assertEqual(context.exception.usage.total_tokens, 220)
+        # The ledger is saved when the run is stopped
+        self.assertEqual(self.ledger().total.llm_calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
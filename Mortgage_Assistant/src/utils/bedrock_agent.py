@@ -25,32 +25,53 @@ for specifying collaboration types, routing classifiers, and instructions.
 """
 import boto3
 from botocore.exceptions import ClientError
+import hashlib
 import uuid
 from textwrap import dedent
 from typing import List, Dict, Optional
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from typing import Self, Callable, Union
 from enum import Enum
 import yaml
-from src.utils.bedrock_agent_helper import AgentsForAmazonBedrock
+from src.utils.bedrock_agent_helper import (
+    AgentsForAmazonBedrock,
+    DEFAULT_CI_ACTION_GROUP_NAME,
+    DEFAULT_MAX_ROC_ROUNDS,
+)
+from src.utils.tool_schemas import tool_schema_registry
 import json
 
 print(f"boto3 version: {boto3.__version__}")
 
-# Clients
-s3_client = boto3.client("s3")
-sts_client = boto3.client("sts")
-bedrock_agent_client = boto3.client("bedrock-agent")
-bedrock_agent_runtime_client = boto3.client("bedrock-agent-runtime")
-bedrock_client = boto3.client("bedrock")
+# Clients are created on first use, so importing this module makes no AWS call
 agents_helper = AgentsForAmazonBedrock()
 
 region = agents_helper.get_region()
-account_id = sts_client.get_caller_identity()["Account"]
 
-suffix = f"{region}-{account_id}"
-bucket_name = f"mac-workshop-{suffix}"
+_LAZY_CLIENTS = {
+    "s3_client": "_s3_client",
+    "sts_client": "_sts_client",
+    "bedrock_agent_client": "_bedrock_agent_client",
+    "bedrock_agent_runtime_client": "_bedrock_agent_runtime_client",
+    "bedrock_client": "_bedrock_client",
+}
+
+
+def __getattr__(name: str):
+    """Resolves the module attributes that need AWS clients or calls on first access"""
+    if name in _LAZY_CLIENTS:
+        return getattr(agents_helper, _LAZY_CLIENTS[name])
+    if name == "account_id":
+        return agents_helper._account_id
+    if name == "suffix":
+        return agents_helper._suffix
+    if name == "bucket_name":
+        return f"mac-workshop-{agents_helper._suffix}"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 agent_foundation_models = [
     "us.anthropic.claude-3-haiku-20240307-v1:0",
     "us.anthropic.claude-3-sonnet-20240307-v1:0",
@@ -69,6 +90,7 @@ DEFAULT_SUPERVISOR_MODEL = "us.anthropic.claude-3-5-sonnet-20241022-v2:0"
 # "anthropic.claude-3-5-sonnet-20240620-v1:0"
 
 MAX_DESCR_SIZE = 200  # Due to max size enforced by Agents for description
+MAX_LAMBDA_NAME_SIZE = 64  # Due to max size enforced by Lambda for function names
 
 
 class ParamType(str, Enum):
@@ -156,7 +178,7 @@ class Guardrail:
         self.name = name
 
         # see if Guardrail already exists
-        resp = bedrock_client.list_guardrails()
+        resp = agents_helper._bedrock_client.list_guardrails()
         if verbose:
             print(f"Found {len(resp['guardrails'])} guardrails: {resp['guardrails']}")
             print(f"Looking for guardrail: {self.name}")
@@ -168,7 +190,7 @@ class Guardrail:
                 return
 
         # create new Guardrail
-        resp = bedrock_client.create_guardrail(
+        resp = agents_helper._bedrock_client.create_guardrail(
             name="no_bitcoin_guardrail",
             blockedInputMessaging=blocked_input_response,
             blockedOutputsMessaging=blocked_output_response,
@@ -249,13 +271,31 @@ class Task:
         else:
             self.output_type = None
 
+        # optional, used by SupervisorAgent.invoke_with_tasks(processing_type="parallel"):
+        # the collaborator that performs the task, and the tasks whose outputs it needs
+        self.agent = yaml_content[name].get("agent")
+        self.depends_on = list(yaml_content[name].get("depends_on") or [])
+
     @classmethod
     def create(
-        cls, name: str, description: str, expected_output: str, inputs: Dict = {}
+        cls,
+        name: str,
+        description: str,
+        expected_output: str,
+        inputs: Dict = {},
+        agent: str = None,
+        depends_on: List[str] = None,
     ):
         return cls(
             name,
-            {name: {"description": description, "expected_output": expected_output}},
+            {
+                name: {
+                    "description": description,
+                    "expected_output": expected_output,
+                    "agent": agent,
+                    "depends_on": depends_on,
+                }
+            },
             inputs,
         )
 
@@ -269,6 +309,7 @@ class Task:
 # define an Agent class to simplify creating and using an agent
 class Agent:
     default_force_recreate: bool = False
+    default_reconcile: bool = False
     NO_TOOL_USE_INSTRUCTION = (
         "\nYou have no available tools. Rely only on your own knowledge."
     )
@@ -280,6 +321,11 @@ class Agent:
     def set_force_recreate_default(cls, force_recreate: bool):
         Agent.default_force_recreate = force_recreate
 
+    @classmethod
+    def set_reconcile_default(cls, reconcile: bool):
+        """Update existing agents in place (see reconcile()) instead of only looking them up"""
+        Agent.default_reconcile = reconcile
+
     def __init__(
         self,
         name,
@@ -329,6 +375,13 @@ class Agent:
         else:
             self.llm = DEFAULT_AGENT_MODEL
 
+        # keep the definition so that reconcile() can compare it with the deployed agent
+        self._guardrail = guardrail
+        self._tools = tools
+        self._kb_id = kb_id
+        self._kb_descr = kb_descr
+        self._definition_instructions = self.instructions
+
         if not Agent.default_force_recreate:
             # if the agent already exists, get its agent_id and move on.
             try:
@@ -340,12 +393,18 @@ class Agent:
                     self.agent_id, self.agent_alias_id
                 )
             except Exception as e:
-                print(f"{e}")
-                print(
-                    f"Agent {self.name} does not exist. Must force creation using force_recreate flag."
-                )
+                if not Agent.default_reconcile:
+                    print(f"{e}")
+                    print(
+                        f"Agent {self.name} does not exist. Must force creation using force_recreate flag."
+                    )
                 pass
-            return
+            if not Agent.default_reconcile:
+                return
+            if self.agent_id is not None:
+                self.reconcile(verbose=verbose)
+                return
+            # the agent does not exist yet, create it below
 
         else:
             # first delete existing lambda and bedrock agent if found
@@ -353,86 +412,83 @@ class Agent:
                 f"\nDeleting existing agent and corresponding lambda for: {self.name}..."
             )
             try:
-                agents_helper.delete_lambda(f"{self.name}_ag")
+                agents_helper.delete_lambda(self._lambda_function_name())
+                for _tool in tools or []:
+                    agents_helper.delete_lambda(
+                        self._lambda_function_name(_tool["definition"]["name"])
+                    )
                 agents_helper.delete_agent(self.name, verbose=True)
                 time.sleep(4)
             except:
                 pass
 
-            # now create a new bedrock agent
-            print(f"Creating agent {self.name}...")
-
-            self.instructions = f"Role: {self.role}, \nGoal: {self.goal}, \nInstructions: {self.instructions}"
+        # now create a new bedrock agent
+        print(f"Creating agent {self.name}...")
 
-            # add workaround in instructions, since default prompts can yield hallucinations for tool use calls
-            # if self.tool_code is None and self.tool_defs is None:
-            if tools is None and self.tool_code is None and self.tool_defs is None:
-                self.instructions += Agent.NO_TOOL_USE_INSTRUCTION
+        self.instructions = self._full_instructions()
 
-            (self.agent_id, self.agent_alias_id, self.agent_alias_arn) = (
-                agents_helper.create_agent(
-                    self.name,
-                    dedent(self.instructions[0 : MAX_DESCR_SIZE - 1]),
-                    dedent(self.instructions),
-                    [self.llm],
-                    code_interpretation=self.code_interpreter,
-                    guardrail_id=(
-                        guardrail.guardrail_id if guardrail is not None else None
-                    ),
-                    verbose=verbose,
-                )
+        self.agent_id, self.agent_alias_id, self.agent_alias_arn = (
+            agents_helper.create_agent(
+                self.name,
+                dedent(self.instructions[0 : MAX_DESCR_SIZE - 1]),
+                dedent(self.instructions),
+                [self.llm],
+                code_interpretation=self.code_interpreter,
+                guardrail_id=(
+                    guardrail.guardrail_id if guardrail is not None else None
+                ),
+                verbose=verbose,
             )
+        )
 
-            print(
-                f"Created agent, id: {self.agent_id}, alias id: {self.agent_alias_id}\n"
+        print(f"Created agent, id: {self.agent_id}, alias id: {self.agent_alias_id}\n")
+
+        # Now associate the KB if any
+        # NOTE: this can't happen before the sub-agent association, because we can't prepare a supervisor
+        # w/o sub-agents
+        if kb_id is not None:
+            self.attach_knowledge_base(kb_id, kb_descr)
+
+        # Add tools as Lambda or ROC action groups to support the specified capabilities
+        if tools is None and self.tool_code is not None and self.tool_code != "ROC":
+            print(f"Adding action group with Lambda: {self.tool_code}...")
+            # Also updated to capture the new alias ID and ARN.
+            # (self.agent_alias_id,
+            # self.agent_alias_arn) =
+            agents_helper.add_action_group_with_lambda(
+                self.name,
+                self._lambda_function_name(),
+                self.tool_code,
+                self.tool_defs,
+                f"actions_{self.name}",
+                f"Set of functions for {self.name}",
+                self.additional_function_iam_policy,
+                verbose=verbose,
             )
 
-            # Now associate the KB if any
-            # NOTE: this can't happen before the sub-agent association, because we can't prepare a supervisor
-            # w/o sub-agents
-            if kb_id is not None:
-                self.attach_knowledge_base(kb_id, kb_descr)
-
-            # Add tools as Lambda or ROC action groups to support the specified capabilities
-            if tools is None and self.tool_code is not None and self.tool_code != "ROC":
-                print(f"Adding action group with Lambda: {self.tool_code}...")
-                # Also updated to capture the new alias ID and ARN.
-                # (self.agent_alias_id,
-                # self.agent_alias_arn) =
-                agents_helper.add_action_group_with_lambda(
+        elif tools is None and self.tool_code == "ROC":
+            print(f"Adding action group with Return of Control...")
+            resp = agents_helper.add_action_group_with_roc(
+                self.agent_id,
+                self.tool_defs,
+                f"actions_{self.name}",
+                f"Set of functions for {self.name}",
+            )
+        elif tools is not None:
+            _tool_num = 1
+            for _tool in tools:
+                print(f"Adding tool: {_tool['definition']['name']}...")
+                # print(f"Adding action group for tool: {str(_tool.definition['name'])}...")
+                resp = agents_helper.add_action_group_with_lambda(
                     self.name,
-                    f"{self.name}_ag",
-                    self.tool_code,
-                    self.tool_defs,
-                    f"actions_{self.name}",
+                    self._lambda_function_name(_tool["definition"]["name"]),
+                    _tool["code"],
+                    [_tool["definition"]],
+                    f"actions_{_tool_num}_{self.name}",
                     f"Set of functions for {self.name}",
                     self.additional_function_iam_policy,
-                    verbose=verbose,
-                )
-
-            elif tools is None and self.tool_code == "ROC":
-                print(f"Adding action group with Return of Control...")
-                resp = agents_helper.add_action_group_with_roc(
-                    self.agent_id,
-                    self.tool_defs,
-                    f"actions_{self.name}",
-                    f"Set of functions for {self.name}",
                 )
-            elif tools is not None:
-                _tool_num = 1
-                for _tool in tools:
-                    print(f"Adding tool: {_tool['definition']['name']}...")
-                    # print(f"Adding action group for tool: {str(_tool.definition['name'])}...")
-                    resp = agents_helper.add_action_group_with_lambda(
-                        self.name,
-                        f"{self.name}_ag",
-                        _tool["code"],
-                        [_tool["definition"]],
-                        f"actions_{_tool_num}_{self.name}",
-                        f"Set of functions for {self.name}",
-                        self.additional_function_iam_policy,
-                    )
-                    _tool_num += 1
+                _tool_num += 1
 
         # Add an agent alias so that this agent can be used as a sub agent by a supervisor.
 
@@ -468,8 +524,7 @@ class Agent:
 
     def needs_preparation(self) -> bool:
         """Return True if the agent needs to be prepared"""
-        bedrock_agent = boto3.client("bedrock-agent")
-        response = bedrock_agent.get_agent(agentId=self.agent_id)
+        response = agents_helper._bedrock_agent_client.get_agent(agentId=self.agent_id)
         agent_info = response["agent"]
 
         # Check if never prepared
@@ -494,6 +549,281 @@ class Agent:
         else:
             print("Agent already prepared")
 
+    def _full_instructions(self, has_tools: bool = None) -> str:
+        """Instructions sent to Bedrock, built from the role, goal and instructions of the definition"""
+        if has_tools is None:
+            has_tools = not (
+                self._tools is None
+                and self.tool_code is None
+                and self.tool_defs is None
+            )
+        _instructions = f"Role: {self.role}, \nGoal: {self.goal}, \nInstructions: {self._definition_instructions}"
+
+        # add workaround in instructions, since default prompts can yield hallucinations for tool use calls
+        if not has_tools:
+            _instructions += Agent.NO_TOOL_USE_INSTRUCTION
+        return _instructions
+
+    def _desired_action_groups(self) -> Dict[str, Dict]:
+        """Action groups of the definition, by name, with their code (file, ARN or ROC) and functions"""
+        if self._tools is None and self.tool_code is not None:
+            return {
+                f"actions_{self.name}": {
+                    "code": self.tool_code,
+                    "functions": self.tool_defs,
+                    "tool_name": None,
+                }
+            }
+        _groups = {}
+        for _tool_num, _tool in enumerate(self._tools or [], start=1):
+            _groups[f"actions_{_tool_num}_{self.name}"] = {
+                "code": _tool["code"],
+                "functions": [_tool["definition"]],
+                "tool_name": _tool["definition"]["name"],
+            }
+        return _groups
+
+    def _is_managed_action_group(self, action_group_name: str) -> bool:
+        """True for the action groups this class creates, so tools attached later with attach_tool() are kept"""
+        return action_group_name == DEFAULT_CI_ACTION_GROUP_NAME or (
+            action_group_name.startswith("actions_")
+            and action_group_name.endswith(f"_{self.name}")
+        )
+
+    @staticmethod
+    def _normalize_functions(functions: List[Dict]) -> List[Dict]:
+        """Function definitions in a comparable form, ignoring fields Bedrock adds with defaults"""
+        return sorted(
+            (
+                {
+                    "name": _function["name"],
+                    "description": _function.get("description") or "",
+                    "parameters": {
+                        _name: {
+                            "description": _param.get("description") or "",
+                            "type": _param.get("type"),
+                            "required": bool(_param.get("required", False)),
+                        }
+                        for _name, _param in (_function.get("parameters") or {}).items()
+                    },
+                }
+                for _function in functions or []
+            ),
+            key=lambda _function: _function["name"],
+        )
+
+    def _lambda_function_name(self, tool_name: str = None) -> str:
+        """Name of the Lambda function of a tool, or of the tool_code of the agent when tool_name is None.
+        Names longer than Lambda allows are truncated, with a short hash of the full name to keep them unique.
+        """
+        if tool_name is None:
+            _name = f"{self.name}_ag"
+        else:
+            _name = f"{self.name}_{tool_name}_ag"
+        if len(_name) > MAX_LAMBDA_NAME_SIZE:
+            _digest = hashlib.sha256(_name.encode()).hexdigest()[:8]
+            _name = f"{_name[: MAX_LAMBDA_NAME_SIZE - len(_digest) - 4]}_{_digest}_ag"
+        return _name
+
+    def _lambda_arn(self, code: str, tool_name: str = None) -> str:
+        """ARN of the action group Lambda, deploying the source file if its code changed"""
+        if "arn:" in code:
+            return code
+        return agents_helper.create_lambda(
+            self.name,
+            self._lambda_function_name(tool_name),
+            code,
+            additional_function_iam_policy=self.additional_function_iam_policy,
+        )
+
+    def reconcile(self, verbose: bool = False) -> List[str]:
+        """Update the existing agent in place so that it matches this definition.
+
+        The deployed DRAFT agent, its action groups and its knowledge bases are compared with the
+        definition and only what differs is updated. When anything changed, the agent is prepared once
+        and its alias is pointed to the new version, so callers of the alias see no downtime. Tools
+        attached with attach_tool() are left untouched.
+
+        Returns:
+            List[str]: the changes that were applied, empty if the agent already matched
+        """
+        _current = agents_helper.get_agent_configuration(self.agent_id)
+        _agent = _current["agent"]
+        _changes = []
+
+        # action groups, with Lambda code deployed first so it is only uploaded when it changed
+        _desired_groups = self._desired_action_groups()
+        for _desired in _desired_groups.values():
+            if _desired["code"] != "ROC":
+                _desired["code"] = self._lambda_arn(
+                    _desired["code"], _desired["tool_name"]
+                )
+        # agents deployed before each tool got its own Lambda still invoke the agent-wide function
+        _legacy_lambda_arns = {
+            _group["actionGroupExecutor"]["lambda"]
+            for _name, _group in _current["action_groups"].items()
+            if self._is_managed_action_group(_name)
+            and "lambda" in _group.get("actionGroupExecutor", {})
+            and _group["actionGroupExecutor"]["lambda"].split(":")[6]
+            == self._lambda_function_name()
+        } - {_desired["code"] for _desired in _desired_groups.values()}
+        for _name, _group in _current["action_groups"].items():
+            if _name == DEFAULT_CI_ACTION_GROUP_NAME:
+                if not self.code_interpreter:
+                    agents_helper.delete_agent_action_group(self.agent_id, _group)
+                    _changes.append("removed code interpreter")
+                continue
+            if not self._is_managed_action_group(_name):
+                continue
+            _desired = _desired_groups.get(_name)
+            _is_roc = "customControl" in _group.get("actionGroupExecutor", {})
+            if _desired is None or _is_roc != (_desired["code"] == "ROC"):
+                # removed from the definition, or switched between Lambda and ROC: added back below
+                agents_helper.delete_agent_action_group(self.agent_id, _group)
+                if _desired is None:
+                    _changes.append(f"removed action group {_name}")
+                continue
+            _updates = {}
+            _functions = _group.get("functionSchema", {}).get("functions", [])
+            if self._normalize_functions(_functions) != self._normalize_functions(
+                _desired["functions"]
+            ):
+                _updates["agent_functions"] = _desired["functions"]
+                _changes.append(f"updated functions of action group {_name}")
+            # e.g. a new Lambda ARN in the definition, or a Lambda function that was renamed
+            if not _is_roc and (
+                _group["actionGroupExecutor"].get("lambda") != _desired["code"]
+            ):
+                _updates["action_group_executor"] = {"lambda": _desired["code"]}
+                _changes.append(
+                    f"pointed action group {_name} to Lambda {_desired['code']}"
+                )
+            if _group["actionGroupState"] != "ENABLED":
+                _updates["action_group_state"] = "ENABLED"
+                _changes.append(f"enabled action group {_name}")
+            if _updates:
+                agents_helper.update_agent_action_group(
+                    self.agent_id, _group, **_updates
+                )
+            _desired_groups.pop(_name)
+
+        for _name, _desired in _desired_groups.items():
+            if _desired["code"] == "ROC":
+                agents_helper.add_action_group_with_roc(
+                    self.agent_id,
+                    _desired["functions"],
+                    _name,
+                    f"Set of functions for {self.name}",
+                    prepare_agent=False,
+                )
+            else:
+                agents_helper.add_action_group_with_lambda(
+                    self.name,
+                    self._lambda_function_name(_desired["tool_name"]),
+                    _desired["code"],
+                    _desired["functions"],
+                    _name,
+                    f"Set of functions for {self.name}",
+                    self.additional_function_iam_policy,
+                    verbose=verbose,
+                    prepare_agent=False,
+                )
+            _changes.append(f"added action group {_name}")
+
+        if self.code_interpreter and (
+            DEFAULT_CI_ACTION_GROUP_NAME not in _current["action_groups"]
+        ):
+            agents_helper.add_code_interpreter(self.name, prepare_agent=False)
+            _changes.append("added code interpreter")
+
+        # knowledge bases
+        _desired_kbs = {self._kb_id: self._kb_descr} if self._kb_id is not None else {}
+        for _kb_id, _kb in _current["knowledge_bases"].items():
+            if _kb_id not in _desired_kbs:
+                agents_helper.disassociate_kb_from_agent(self.agent_id, _kb_id)
+                _changes.append(f"disassociated knowledge base {_kb_id}")
+            elif (
+                _kb.get("description") != _desired_kbs[_kb_id]
+                or _kb.get("knowledgeBaseState") != "ENABLED"
+            ):
+                agents_helper.update_kb_association(
+                    self.agent_id, _kb_id, _desired_kbs[_kb_id]
+                )
+                _changes.append(f"updated knowledge base {_kb_id}")
+        for _kb_id, _kb_descr in _desired_kbs.items():
+            if _kb_id not in _current["knowledge_bases"]:
+                agents_helper.associate_kb_with_agent(
+                    self.agent_id, _kb_descr, _kb_id, prepare_agent=False
+                )
+                _changes.append(f"associated knowledge base {_kb_id}")
+
+        # agent details, keeping the instructions of tools attached with attach_tool()
+        _has_unmanaged_groups = any(
+            not self._is_managed_action_group(_name)
+            for _name in _current["action_groups"]
+        )
+        self.instructions = self._full_instructions(
+            has_tools=(True if _has_unmanaged_groups else None)
+        )
+        _instructions = dedent(self.instructions)
+        _description = dedent(self.instructions[0 : MAX_DESCR_SIZE - 1])
+        _guardrail_id = (
+            self._guardrail.guardrail_id if self._guardrail is not None else None
+        )
+        _agent_diff = []
+        if _agent.get("instruction") != _instructions:
+            _agent_diff.append("instructions")
+        if _agent.get("description") != _description:
+            _agent_diff.append("description")
+        if _agent.get("foundationModel") != self.llm:
+            _agent_diff.append("model")
+        if (
+            _agent.get("guardrailConfiguration", {}).get("guardrailIdentifier")
+            != _guardrail_id
+        ):
+            _agent_diff.append("guardrail")
+        if _agent_diff:
+            agents_helper.update_agent(
+                self.name,
+                new_model_id=self.llm,
+                new_instructions=_instructions,
+                guardrail_id=_guardrail_id,
+                new_description=_description,
+                prepare_agent=False,
+            )
+            _changes.append(f"updated {', '.join(_agent_diff)}")
+
+        # prepare once and move the alias to the new version
+        if _changes:
+            agents_helper.wait_agent_status_update(self.agent_id)
+            agents_helper.prepare(self.name)
+        if not self.agent_alias_id:
+            self.agent_alias_id, self.agent_alias_arn = (
+                agents_helper.create_agent_alias(self.agent_id, "with-code-ag")
+            )
+            agents_helper.wait_agent_alias_status_update(
+                self.agent_id, self.agent_alias_id
+            )
+            _changes.append("created alias")
+        elif _changes:
+            self.agent_alias_id, self.agent_alias_arn = (
+                agents_helper.update_agent_alias(self.agent_id, self.agent_alias_id)
+            )
+
+        # the alias now serves the re-pointed action groups, so nothing invokes the legacy function
+        if _legacy_lambda_arns:
+            # its IAM role is shared with the other functions of the agent
+            agents_helper.delete_lambda(
+                self._lambda_function_name(), delete_role_flag=False
+            )
+            _changes.append(f"deleted legacy Lambda {self._lambda_function_name()}")
+
+        if _changes:
+            print(f"Reconciled agent {self.name}: {'; '.join(_changes)}")
+        elif verbose:
+            print(f"Agent {self.name} is up to date")
+        return _changes
+
     @classmethod
     # Return a session state populated with the files from the supplied list of filenames
     def add_file_to_session_state(
@@ -605,6 +935,26 @@ class Agent:
             multi_agent_names=multi_agent_names,
         )
 
+    def invoke_stream(
+        self,
+        input_text: str,
+        session_id: str = str(uuid.uuid1()),
+        session_state: dict = {},
+        enable_trace: bool = False,
+        trace_level: str = "none",
+        multi_agent_names: dict = {},
+    ):
+        """Invoke the agent and yield its answer as it is generated (see AgentsForAmazonBedrock.invoke_stream)"""
+        return agents_helper.invoke_stream(
+            input_text,
+            self.agent_id,
+            session_id=session_id,
+            session_state=session_state,
+            enable_trace=enable_trace,
+            trace_level=trace_level,
+            multi_agent_names=multi_agent_names,
+        )
+
     def invoke_roc(
         self,
         input_text: str,
@@ -630,36 +980,28 @@ class Agent:
         session_id: str = str(uuid.uuid1()),
         enable_trace: bool = False,
         trace_level: str = "none",
+        max_rounds: int = DEFAULT_MAX_ROC_ROUNDS,
+        verbose: bool = False,
     ):
-        roc_call = agents_helper.invoke_roc(
-            input_text, self.agent_id, session_id=session_id, enable_trace=enable_trace
-        )
-        invocation_inputs = roc_call["invocationInputs"]
-        for invocation_input in invocation_inputs:
-            function_to_call = invocation_input["functionInvocationInput"]["function"]
-            tool_args = {}
-            for param in invocation_input["functionInvocationInput"]["parameters"]:
-                tool_args[param["name"]] = param["value"]
-
-            function_call_result = getattr(tools_list, function_to_call)(**tool_args)
-
-            final_answer = self.invoke_roc(
-                "",
-                session_id=session_id,
-                function_call=roc_call,
-                function_call_result=function_call_result,
-                enable_trace=enable_trace,
-            )
-            return final_answer
+        """Invoke the agent with return-of-control until it returns its final answer"""
+        return agents_helper.invoke_roc_loop(
+            input_text,
+            self.agent_id,
+            tools_list,
+            session_id=session_id,
+            max_rounds=max_rounds,
+            enable_trace=enable_trace,
+            verbose=verbose,
+        ).answer
 
     def get_prepared_version(self) -> str:
-        response = bedrock_agent_client.get_agent(agentId=self.agent_id)
+        response = agents_helper._bedrock_agent_client.get_agent(agentId=self.agent_id)
         return response.get("agentVersion")
 
     def has_action_group(self, action_group_name: str) -> bool:
         """Check if an agent already has a specified action group attached"""
         try:
-            response = bedrock_agent_client.list_agent_action_groups(
+            response = agents_helper._bedrock_agent_client.list_agent_action_groups(
                 agentId=self.agent_id, agentVersion="DRAFT"
             )
 
@@ -668,7 +1010,7 @@ class Agent:
                 for group in response["actionGroupSummaries"]
             )
 
-        except bedrock_agent_client.exceptions.ResourceNotFoundException:
+        except agents_helper._bedrock_agent_client.exceptions.ResourceNotFoundException:
             return False
 
     def attach_tool(self, tool: Tool) -> None:
@@ -1101,6 +1443,29 @@ class SupervisorAgent:
             multi_agent_names=multi_agent_names,
         )
 
+    def invoke_stream(
+        self,
+        input_text: str,
+        session_id: str = str(uuid.uuid1()),
+        enable_trace: bool = False,
+        trace_level: str = "core",
+        session_state: dict = {},
+        multi_agent_names: dict = {},
+    ):
+        """Invoke the supervisor and yield its answer as it is generated (see AgentsForAmazonBedrock.invoke_stream)"""
+        if multi_agent_names == {}:
+            multi_agent_names = self.multi_agent_names
+        return agents_helper.invoke_stream(
+            input_text,
+            self.supervisor_agent_id,
+            agent_alias_id=self.supervisor_agent_alias_id,
+            session_id=session_id,
+            enable_trace=enable_trace,
+            session_state=session_state,
+            trace_level=trace_level,
+            multi_agent_names=multi_agent_names,
+        )
+
     def invoke_with_tasks(
         self,
         tasks: list[Task],
@@ -1109,7 +1474,23 @@ class SupervisorAgent:
         enable_trace: bool = False,
         trace_level: str = "none",
         verbose: bool = False,
+        max_workers: int = 8,
     ):
+        """Hand a list of tasks to the supervisor.
+
+        With processing_type "sequential" or "allow_parallel" the tasks are formatted into a single request
+        to the supervisor. With "parallel" they are executed client side, see execute_tasks().
+        """
+        if processing_type == "parallel":
+            return self.execute_tasks(
+                tasks,
+                additional_instructions=additional_instructions,
+                enable_trace=enable_trace,
+                trace_level=trace_level,
+                verbose=verbose,
+                max_workers=max_workers,
+            )
+
         prompt = ""
         if processing_type == "sequential":
             prompt += """
@@ -1161,6 +1542,179 @@ be sure to include the details as input to the task.\n\n"""
         )
         return result
 
+    def _validate_tasks(self, tasks: List[Task]):
+        """Checks that task names are unique, dependencies exist and have no cycle, and agents are collaborators"""
+        _by_name = {}
+        for _task in tasks:
+            if _task.name in _by_name:
+                raise ValueError(f"Duplicate task name: {_task.name}")
+            _by_name[_task.name] = _task
+
+        _collab_names = [_collab.name for _collab in self.collaborator_objects]
+        for _task in tasks:
+            if _task.agent is not None and _task.agent not in _collab_names:
+                raise ValueError(
+                    f"Task {_task.name} is assigned to {_task.agent}, which is not a collaborator of {self.name}"
+                )
+            for _dep in _task.depends_on:
+                if _dep not in _by_name:
+                    raise ValueError(
+                        f"Task {_task.name} depends on unknown task {_dep}"
+                    )
+
+        # visit the tasks in dependency order, anything left over is part of a cycle
+        _remaining = {_task.name: set(_task.depends_on) for _task in tasks}
+        while _remaining:
+            _ready = [_name for _name, _deps in _remaining.items() if not _deps]
+            if not _ready:
+                raise ValueError(
+                    f"Tasks have a circular dependency: {sorted(_remaining)}"
+                )
+            for _name in _ready:
+                del _remaining[_name]
+            for _deps in _remaining.values():
+                _deps.difference_update(_ready)
+
+    def _run_task(
+        self,
+        task: Task,
+        dependency_outputs: Dict[str, str],
+        session_prefix: str,
+        enable_trace: bool,
+        trace_level: str,
+    ) -> str:
+        """Invokes the collaborator assigned to the task (or the supervisor) with the outputs it depends on"""
+        _prompt = f"{task}\n"
+        if dependency_outputs:
+            _prompt += "\nUse the results of the following prior tasks as input:\n"
+            for _name, _output in dependency_outputs.items():
+                _prompt += f"\nResult of task {_name}:\n{_output}\n"
+
+        _session_id = f"{session_prefix}-{task.name}"
+        if task.agent is None:
+            return self.invoke(
+                input_text=_prompt,
+                session_id=_session_id,
+                enable_trace=enable_trace,
+                trace_level=trace_level,
+                multi_agent_names=self.multi_agent_names,
+            )
+
+        _collab = next(
+            _collab
+            for _collab in self.collaborator_objects
+            if _collab.name == task.agent
+        )
+        # use the same alias the supervisor routes to
+        return agents_helper.invoke(
+            _prompt,
+            _collab.agent_id,
+            agent_alias_id=_collab.agent_alias_id or "TSTALIASID",
+            session_id=_session_id,
+            enable_trace=enable_trace,
+            trace_level=trace_level,
+            multi_agent_names=self.multi_agent_names,
+        )
+
+    def execute_tasks(
+        self,
+        tasks: List[Task],
+        additional_instructions: str = "",
+        enable_trace: bool = False,
+        trace_level: str = "none",
+        verbose: bool = False,
+        max_workers: int = 8,
+    ) -> str:
+        """Execute tasks client side, then have the supervisor write the final answer from their results.
+
+        Each task runs as its own invocation of the collaborator named in task.agent (or of the supervisor
+        when no agent is set). A task starts as soon as all the tasks listed in task.depends_on have
+        finished, and their outputs are added to its input. Independent tasks run concurrently, so the
+        total time is close to the longest chain of dependent tasks rather than the sum of all tasks.
+        A single supervisor invocation then combines the task results.
+
+        Args:
+            tasks (List[Task]): tasks to execute, with optional agent and depends_on
+            additional_instructions (str, Optional): added to the final supervisor request
+            enable_trace (bool, Optional): trace every invocation
+            trace_level (str, Optional): trace level of every invocation
+            verbose (bool, Optional): print when each task starts and finishes
+            max_workers (int, Optional): maximum number of concurrent invocations
+
+        Returns:
+            str: the final answer of the supervisor
+        """
+        self._validate_tasks(tasks)
+
+        # same sortable session id scheme as invoke_with_tasks, with one session per task
+        timestamp = int(time.time())
+        session_prefix = self.name + "-" + str(timestamp) + "-" + str(uuid.uuid1())
+        if verbose:
+            print(f"Session id prefix: {session_prefix}")
+
+        _outputs = {}
+        _pending = list(tasks)
+        _running = {}
+        _start = time.time()
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(tasks)))
+        ) as executor:
+            while _pending or _running:
+                # start every task whose dependencies are all done
+                for _task in [
+                    _t for _t in _pending if all(_d in _outputs for _d in _t.depends_on)
+                ]:
+                    _pending.remove(_task)
+                    if verbose:
+                        print(
+                            f"[{time.time() - _start:6.1f}s] Starting task {_task.name} on {_task.agent or self.name}"
+                        )
+                    _future = executor.submit(
+                        self._run_task,
+                        _task,
+                        {_dep: _outputs[_dep] for _dep in _task.depends_on},
+                        session_prefix,
+                        enable_trace,
+                        trace_level,
+                    )
+                    _running[_future] = _task
+
+                _done, _ = wait(_running, return_when=FIRST_COMPLETED)
+                for _future in _done:
+                    _task = _running.pop(_future)
+                    _outputs[_task.name] = _future.result()
+                    if verbose:
+                        print(
+                            f"[{time.time() - _start:6.1f}s] Finished task {_task.name}"
+                        )
+
+        prompt = """
+The following tasks have already been completed by your collaborators. Do not perform them again.
+Use their results to produce the final answer.\n\n"""
+        task_num = 1
+        for t in tasks:
+            prompt += f"Task {task_num}. {t}\nResult:\n{_outputs[t.name]}\n\n"
+            task_num += 1
+
+        prompt += "Before returning the final answer, review whether the results achieve the expected output for each task."
+
+        if additional_instructions != "":
+            prompt += f"\n{additional_instructions}"
+
+        if verbose and enable_trace and trace_level == "core":
+            print(f"Here is the prompt being sent to the supervisor:\n{prompt}\n")
+
+        result = self.invoke(
+            input_text=dedent(prompt),
+            session_id=f"{session_prefix}-final",
+            enable_trace=enable_trace,
+            trace_level=trace_level,
+            multi_agent_names=self.multi_agent_names,
+        )
+        if verbose:
+            print(f"[{time.time() - _start:6.1f}s] Final answer ready")
+        return result
+
 
 import inspect
 from pydantic import create_model
@@ -1168,24 +1722,30 @@ from pydantic import create_model
 
 def LocalTool(name, description):
     def decorator(func):
-        # defining our model inheriting from pydantic.BaseModel and define fields as annotated attributes
-        input_model = create_model(
-            func.__name__ + "_input",
-            **{
-                name: (param.annotation, param.default)
-                for name, param in inspect.signature(func).parameters.items()
-                if param.default is not inspect.Parameter.empty
-            },
-        )
+        def _build_schema():
+            # defining our model inheriting from pydantic.BaseModel and define fields as annotated attributes
+            input_model = create_model(
+                func.__name__ + "_input",
+                **{
+                    name: (param.annotation, param.default)
+                    for name, param in inspect.signature(func).parameters.items()
+                    if param.default is not inspect.Parameter.empty
+                },
+            )
 
-        # bedrock tool schema
-        func.bedrock_schema = {
-            "toolSpec": {
-                "name": name,
-                "description": description,
-                "inputSchema": {"json": input_model.schema()},
+            # bedrock tool schema
+            return {
+                "toolSpec": {
+                    "name": name,
+                    "description": description,
+                    "inputSchema": {"json": input_model.schema()},
+                }
             }
-        }
+
+        # the pydantic model is only built when the function's source changed since it was last cached
+        func.bedrock_schema = tool_schema_registry.get(
+            func, _build_schema, "toolSpec", name, description
+        )
         return func
 
     return decorator
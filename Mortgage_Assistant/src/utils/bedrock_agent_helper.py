@@ -29,22 +29,25 @@ Here is a summary of the most important methods:
 - add_action_group_with_lambda: Creates a new Action Group for an Agent, backed by Lambda.
 """
 
-import boto3
 import json
 import time
 import uuid
-import zipfile
 from dateutil.tz import tzutc
 import os
 import datetime
 from dateutil.relativedelta import relativedelta
 import random
-from io import BytesIO
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator, Callable, Union
 import re
+import heapq
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from boto3.session import Session
 from botocore.config import Config
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 from IPython.display import display, Markdown
@@ -57,11 +60,21 @@ from termcolor import colored
 from rich.console import Console
 from rich.markdown import Markdown
 
+from src.utils.lambda_packaging import build_layer, build_package
+from src.utils.waiters import AGENT_BACKOFF, Backoff, wait_all, wait_until
+
 PYTHON_TIMEOUT = 180
+# HTTP connections kept per client, enough for parallel provisioning and invocation
+DEFAULT_MAX_POOL_CONNECTIONS = 50
 PYTHON_RUNTIME = "python3.12"
+# Largest zip that can be uploaded directly, bigger layers go through S3
+MAX_DIRECT_UPLOAD_SIZE = 50 * 1024 * 1024
 DEFAULT_ALIAS = "TSTALIASID"
+DEFAULT_MAX_ROC_ROUNDS = 10
 DEFAULT_CI_ACTION_GROUP_NAME = "CodeInterpreterAction"
 UNDECIDABLE_CLASSIFICATION = "undecidable"
+DYNAMODB_BATCH_SIZE = 25  # maximum number of items in a BatchWriteItem request
+DYNAMODB_MAX_BATCH_RETRIES = 10
 ROUTER_MODEL = "us.anthropic.claude-3-haiku-20240307-v1:0"
 TRACE_TRUNCATION_LENGTH = 300
 
@@ -151,6 +164,108 @@ DEFAULT_AGENT_IAM_POLICY = {
     ]
 }
 
+class _CitationAssembler:
+    """Assembles a cited answer from streamed chunks.
+
+    Every chunk is processed once: the text of each cited span is followed by the URI of its first
+    retrieved reference, and <sources> markers are removed. Citation spans are offsets in the
+    whole answer, so the offset of the current chunk is tracked and a citation is inserted once
+    the text reaches the end of its span, even if that is in a later chunk. A citation whose span
+    ended in text that was already returned is inserted right after that text. Text
+    that may be the start of a <sources> marker split across chunks is held back until the next
+    chunk.
+    """
+
+    _SOURCES_PATTERN = re.compile(r"(\n\n)?<sources>\s*(\d+|<REDACTED>)?\s*</sources>")
+    _SOURCES_OPEN = "<sources>"
+    _SOURCES_CLOSE = "</sources>"
+
+    def __init__(self):
+        self._offset = 0  # characters of the raw answer received so far
+        self._insertions = []  # heap of (end of the cited span in the raw answer, reference URI)
+        self._pending = ""  # cited text held back because it may end with a partial marker
+        self.num_citations = 0
+
+    def feed(self, text: str, citations: List[Dict] = None) -> str:
+        """Adds the text of a chunk and its citations, and returns the text that is final."""
+        _chunk_start = self._offset
+        for _citation in citations or []:
+            _refs = _citation.get("retrievedReferences", [])
+            if not _refs:
+                continue
+            _span = _citation["generatedResponsePart"]["textResponsePart"]["span"]
+            _end = _span["end"] + 1  # the span end is inclusive
+            _ref_url = _refs[0].get("location", {}).get("s3Location", {}).get("uri", "")
+            heapq.heappush(self._insertions, (_end, self.num_citations, _ref_url))
+            self.num_citations += 1
+        self._offset += len(text)
+
+        _cited = []
+        while self._insertions and self._insertions[0][0] <= _chunk_start:
+            # the cited text is already returned or held back
+            _, _, _ref_url = heapq.heappop(self._insertions)
+            _cited.append(f" [{_ref_url}] ")
+        _cited.append(self._pending)
+        _prev = 0
+        while self._insertions and self._insertions[0][0] <= self._offset:
+            _end, _, _ref_url = heapq.heappop(self._insertions)
+            _cited += [text[_prev:_end - _chunk_start], f" [{_ref_url}] "]
+            _prev = _end - _chunk_start
+        _cited.append(text[_prev:])
+        _text = "".join(_cited)
+
+        # hold back an unterminated marker, or a trailing partial "<sources>", with the blank line before it
+        _hold = _text.rfind(self._SOURCES_OPEN)
+        if _hold == -1 or self._SOURCES_CLOSE in _text[_hold:]:
+            _hold = len(_text)
+            _lt = _text.rfind("<", max(0, len(_text) - len(self._SOURCES_OPEN) + 1))
+            if _lt != -1 and self._SOURCES_OPEN.startswith(_text[_lt:]):
+                _hold = _lt
+        _newlines = 0
+        while _newlines < 2 and _hold > 0 and _text[_hold - 1] == "\n":
+            _hold -= 1
+            _newlines += 1
+        self._pending = _text[_hold:]
+        return self._SOURCES_PATTERN.sub("", _text[:_hold])
+
+    def flush(self) -> str:
+        """Returns the text still held back at the end of the stream."""
+        _text, self._pending = self._pending, ""
+        for _, _, _ref_url in sorted(self._insertions):
+            _text += f" [{_ref_url}] "
+        self._insertions = []
+        return self._SOURCES_PATTERN.sub("", _text)
+
+
+@dataclass
+class RocRound:
+    """One round trip of a return of control (ROC) conversation.
+
+    Args:
+        function_calls (List[str]): functions the agent asked for, empty for the round with the final answer
+        agent_latency (float): seconds spent in invoke_agent
+        tool_latency (float): seconds spent running the local tools
+    """
+    function_calls: List[str]
+    agent_latency: float
+    tool_latency: float = 0.0
+
+    @property
+    def latency(self) -> float:
+        return self.agent_latency + self.tool_latency
+
+
+@dataclass
+class RocResult:
+    """Final answer of a return of control (ROC) conversation, with the rounds it took."""
+    answer: str
+    rounds: List[RocRound] = field(default_factory=list)
+
+    @property
+    def latency(self) -> float:
+        return sum(_round.latency for _round in self.rounds)
+
+
 # # setting logger
 # logging.basicConfig(format='[%(asctime)s] p%(process)s {%(filename)s:%(lineno)d} %(levelname)s - %(message)s', level=logging.INFO)
 # logger = logging.getLogger(__name__)
@@ -159,27 +274,110 @@ class AgentsForAmazonBedrock:
     """Provides an easy to use wrapper for Agents for Amazon Bedrock.
     """
 
-    def __init__(self):
-        """Constructs an instance."""
-        self._boto_session = Session() 
-        self._region = self._boto_session.region_name
-        self._account_id = boto3.client("sts").get_caller_identity()["Account"]
+    def __init__(
+            self,
+            region_name: str = None,
+            profile_name: str = None,
+            boto_session: Session = None,
+            max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS
+    ):
+        """Constructs an instance. No AWS call is made here: clients are created on first use,
+        cached, and shared by all threads using this instance.
 
-        self._bedrock_agent_client = boto3.client("bedrock-agent")
+        Args:
+            region_name (str, Optional): AWS region, defaults to the region of the session
+            profile_name (str, Optional): AWS profile to create the session from
+            boto_session (Session, Optional): existing session to create the clients from
+            max_pool_connections (int, Optional): HTTP connections kept per client, raise it to make
+            more calls in parallel
+        """
+        self._boto_session = boto_session or Session(region_name=region_name, profile_name=profile_name)
+        self._region = region_name or self._boto_session.region_name
+        self._client_config = Config(max_pool_connections=max_pool_connections)
+        self._clients = {}
+        # boto3 sessions are not thread safe, clients are
+        self._clients_lock = threading.Lock()
+        self._cached_account_id = None
 
-        long_invoke_time_config = Config(read_timeout=600)
-        self._bedrock_agent_runtime_client = boto3.client(
-            "bedrock-agent-runtime", config=long_invoke_time_config
-        )
+    def _client(self, service_name: str, resource: bool = False, **config):
+        """Returns the cached client (or resource) for a service, creating it on first use.
 
-        self._sts_client = boto3.client("sts")
-        self._iam_client = boto3.client("iam")
-        self._lambda_client = boto3.client("lambda")
-        self._s3_client = boto3.client("s3", region_name=self._region)
-        self._dynamodb_client = boto3.client('dynamodb', region_name=self._region)
-        self._dynamodb_resource = boto3.resource('dynamodb', region_name=self._region)
+        Args:
+            service_name (str): name of the service, e.g. "bedrock-agent"
+            resource (bool, Optional): whether to return a boto3 resource instead of a client
+            config: botocore Config options of this client, e.g. read_timeout
+        """
+        _key = self._client_key(service_name, resource, **config)
+        _client = self._clients.get(_key)
+        if _client is None:
+            with self._clients_lock:
+                _client = self._clients.get(_key)
+                if _client is None:
+                    _config = self._client_config.merge(Config(**config)) if config else self._client_config
+                    _factory = self._boto_session.resource if resource else self._boto_session.client
+                    _client = _factory(service_name, region_name=self._region, config=_config)
+                    self._clients[_key] = _client
+        return _client
+
+    @property
+    def _bedrock_agent_client(self):
+        return self._client("bedrock-agent")
+
+    @staticmethod
+    def _client_key(service_name: str, resource: bool = False, **config) -> Tuple:
+        return (service_name, resource, tuple(sorted(config.items())))
+
+    @property
+    def _bedrock_agent_runtime_client(self):
+        return self._client("bedrock-agent-runtime", read_timeout=600)
+
+    @_bedrock_agent_runtime_client.setter
+    def _bedrock_agent_runtime_client(self, client):
+        """Replaces the runtime client used by invoke() and invoke_roc(), e.g. with a RecordingClient
+        or a ReplayClient:
+
+            >>> agents_helper._bedrock_agent_runtime_client = ReplayClient("recording.jsonl.gz")
+        """
+        with self._clients_lock:
+            self._clients[self._client_key("bedrock-agent-runtime", read_timeout=600)] = client
+
+    @property
+    def _bedrock_client(self):
+        return self._client("bedrock")
+
+    @property
+    def _sts_client(self):
+        return self._client("sts")
+
+    @property
+    def _iam_client(self):
+        return self._client("iam")
+
+    @property
+    def _lambda_client(self):
+        return self._client("lambda")
+
+    @property
+    def _s3_client(self):
+        return self._client("s3")
+
+    @property
+    def _dynamodb_client(self):
+        return self._client("dynamodb")
+
+    @property
+    def _dynamodb_resource(self):
+        return self._client("dynamodb", resource=True)
 
-        self._suffix = f"{self._region}-{self._account_id}"
+    @property
+    def _account_id(self) -> str:
+        if self._cached_account_id is None:
+            self._cached_account_id = self._sts_client.get_caller_identity()["Account"]
+        return self._cached_account_id
+
+    @property
+    def _suffix(self) -> str:
+        return f"{self._region}-{self._account_id}"
 
     def get_region(self) -> str:
         """Returns the region for this instance."""
@@ -388,13 +586,14 @@ class AgentsForAmazonBedrock:
         else:
             return _target_agent["agentId"]
 
-    def associate_kb_with_agent(self, agent_id, description, kb_id):
+    def associate_kb_with_agent(self, agent_id, description, kb_id, prepare_agent=True):
         """Associates a Knowledge Base with an Agent, and prepares the agent.
 
         Args:
             agent_id (str): Id of the agent
             description (str): Description of the KB
             kb_id (str): Id of the KB
+            prepare_agent (bool, Optional): whether to prepare the agent, False to prepare it once after several changes
         """
         self.wait_agent_status_update(agent_id)
         _resp = self._bedrock_agent_client.associate_agent_knowledge_base(
@@ -404,9 +603,10 @@ class AgentsForAmazonBedrock:
             knowledgeBaseId=kb_id,
             knowledgeBaseState="ENABLED",
         )
-        _resp = self._bedrock_agent_client.prepare_agent(
-            agentId=agent_id
-        )
+        if prepare_agent:
+            _resp = self._bedrock_agent_client.prepare_agent(
+                agentId=agent_id
+            )
 
     def get_agent_arn_by_name(self, agent_name: str) -> str:
         """Gets the Agent ARN for the specified Agent.
@@ -478,9 +678,12 @@ class AgentsForAmazonBedrock:
             source_code_file: str,
             additional_function_iam_policy: Dict = None,
             sub_agent_arns: List[str] = None,
-            dynamo_args: List[str] = None
+            dynamo_args: List[str] = None,
+            requirements_file: str = None,
+            layer_arns: List[str] = None
     ) -> str:
-        """Creates a new Lambda function that implements a set of actions for an Agent Action Group.
+        """Creates a Lambda function that implements a set of actions for an Agent Action Group.
+        If the function already exists, its code is only uploaded when it changed.
 
         Args:
             agent_name (str): Name of the existing Agent that this Lambda will support.
@@ -489,9 +692,12 @@ class AgentsForAmazonBedrock:
             Must be a local file, and use underscores, not hyphens.
             additional_function_iam_policy (Dict, Optional): Additional IAM policy to attach to the Lambda function. Defaults to None.
             sub_agent_arns (List[str], Optional): List of ARNs of the sub-agents that this Lambda is allowed to invoke.
+            requirements_file (str, Optional): pip requirements of the function, deployed as a separate layer
+            that is only rebuilt when the requirements change.
+            layer_arns (List[str], Optional): ARNs of existing layers to attach, e.g. a shared dependency layer.
 
         Returns:
-            str: ARN of the new Lambda function
+            str: ARN of the Lambda function
         """
 
         _agent_id = self.get_agent_id_by_name(agent_name)
@@ -500,12 +706,13 @@ class AgentsForAmazonBedrock:
 
         _base_filename = source_code_file.split(".py")[0]
 
-        # Package up the lambda function code
-        s = BytesIO()
-        z = zipfile.ZipFile(s, "w")
-        z.write(f"{source_code_file}")
-        z.close()
-        zip_content = s.getvalue()
+        # Package up the lambda function code, reusing the cached zip if the source did not change
+        _package = build_package([source_code_file])
+        _layers = list(layer_arns or [])
+        if requirements_file:
+            _layers.append(
+                self.publish_lambda_layer(f"{lambda_function_name}_deps", requirements_file)
+            )
         if sub_agent_arns:
             env_variables = {
                 "Variables": {
@@ -537,21 +744,118 @@ class AgentsForAmazonBedrock:
                 agent_name, sub_agent_arns
             )
 
-        # Create Lambda Function
-        _lambda_function = self._lambda_client.create_function(
-            FunctionName=lambda_function_name,
-            Runtime=PYTHON_RUNTIME,
-            Timeout=PYTHON_TIMEOUT,
-            Role=lambda_role,
-            Code={"ZipFile": zip_content},
-            Handler=f"{_base_filename}.lambda_handler",
-            # TODO: make this an optional keyword arg. only supply it when sub-agent-arns are provided
-            Environment=env_variables
-        )
+        try:
+            _existing = self._lambda_client.get_function(
+                FunctionName=lambda_function_name
+            )["Configuration"]
+        except self._lambda_client.exceptions.ResourceNotFoundException:
+            _existing = None
+
+        if _existing is None:
+            # Create Lambda Function
+            _lambda_function = self._lambda_client.create_function(
+                FunctionName=lambda_function_name,
+                Runtime=PYTHON_RUNTIME,
+                Timeout=PYTHON_TIMEOUT,
+                Role=lambda_role,
+                Code={"ZipFile": _package.zip_content},
+                Handler=f"{_base_filename}.lambda_handler",
+                # TODO: make this an optional keyword arg. only supply it when sub-agent-arns are provided
+                Environment=env_variables,
+                Layers=_layers
+            )
+            self._allow_agent_lambda(_agent_id, lambda_function_name)
+            return _lambda_function["FunctionArn"]
+
+        # Update the existing function, skipping the upload when the deployed code is identical
+        _waiter = self._lambda_client.get_waiter("function_updated")
+        if _existing["CodeSha256"] != _package.code_sha256:
+            print(f"Updating code of Lambda function {lambda_function_name}")
+            self._lambda_client.update_function_code(
+                FunctionName=lambda_function_name,
+                ZipFile=_package.zip_content
+            )
+            _waiter.wait(FunctionName=lambda_function_name)
+
+        _configuration = {
+            "Role": lambda_role,
+            "Handler": f"{_base_filename}.lambda_handler",
+            "Environment": env_variables,
+            "Layers": _layers,
+        }
+        _deployed = {
+            "Role": _existing["Role"],
+            "Handler": _existing["Handler"],
+            "Environment": {"Variables": _existing.get("Environment", {}).get("Variables", {})},
+            "Layers": [_layer["Arn"] for _layer in _existing.get("Layers", [])],
+        }
+        if _configuration != _deployed:
+            self._lambda_client.update_function_configuration(
+                FunctionName=lambda_function_name,
+                **_configuration
+            )
+            _waiter.wait(FunctionName=lambda_function_name)
+
+        try:
+            self._allow_agent_lambda(_agent_id, lambda_function_name)
+        except self._lambda_client.exceptions.ResourceConflictException:
+            # the agent is already allowed to invoke the function
+            pass
+
+        return _existing["FunctionArn"]
 
-        self._allow_agent_lambda(_agent_id, lambda_function_name)
+    def publish_lambda_layer(
+            self,
+            layer_name: str,
+            requirements_file: str,
+            s3_bucket: str = None
+    ) -> str:
+        """Publishes the requirements of a Lambda function as a layer, unless a version built from
+        the same requirements is already published.
+
+        Args:
+            layer_name (str): Name of the layer
+            requirements_file (str): pip requirements file
+            s3_bucket (str, Optional): bucket to upload layers larger than 50 MB through
+
+        Returns:
+            str: ARN of the layer version
+        """
+        _package = build_layer(requirements_file)
+        # the hash of the inputs is kept in the description to find the matching version
+        _description = f"sha256:{_package.content_hash}"
+
+        _kwargs = {}
+        while True:
+            _versions_resp = self._lambda_client.list_layer_versions(
+                LayerName=layer_name, CompatibleRuntime=PYTHON_RUNTIME, **_kwargs
+            )
+            for _version in _versions_resp["LayerVersions"]:
+                if _version.get("Description") == _description:
+                    return _version["LayerVersionArn"]
+            if not _versions_resp.get("NextMarker"):
+                break
+            _kwargs = {"Marker": _versions_resp["NextMarker"]}
+
+        if len(_package.zip_content) <= MAX_DIRECT_UPLOAD_SIZE:
+            _content = {"ZipFile": _package.zip_content}
+        elif s3_bucket is not None:
+            _key = f"lambda-layers/{layer_name}/{_package.content_hash}.zip"
+            self._s3_client.put_object(Bucket=s3_bucket, Key=_key, Body=_package.zip_content)
+            _content = {"S3Bucket": s3_bucket, "S3Key": _key}
+        else:
+            raise ValueError(
+                f"Layer {layer_name} is larger than 50 MB, provide an s3_bucket to upload it through"
+            )
 
-        return _lambda_function["FunctionArn"]
+        print(f"Publishing layer {layer_name} for {requirements_file}")
+        _layer_resp = self._lambda_client.publish_layer_version(
+            LayerName=layer_name,
+            Description=_description,
+            Content=_content,
+            CompatibleRuntimes=[PYTHON_RUNTIME]
+        )
+        return _layer_resp["LayerVersionArn"]
 
     def delete_lambda(
         self, 
@@ -668,6 +972,16 @@ class AgentsForAmazonBedrock:
                         agentAliasId=alias_id,
                         agentId=_agent_id
                     )
+                # the agent can only be deleted once its aliases are gone
+                wait_all(
+                    {
+                        alias['agentAliasId']: (
+                            lambda alias_id=alias['agentAliasId']: self._get_agent_alias_status(_agent_id, alias_id),
+                            lambda alias_status: not alias_status.endswith("ING"),
+                        )
+                        for alias in _agent_aliases['agentAliasSummaries']
+                    }
+                )
             except Exception as e:
                 print(f"Error deleting aliases: {e}")
                 pass
@@ -678,11 +992,11 @@ class AgentsForAmazonBedrock:
 
             if verbose:
                 print(f"Deleting agent: {_agent_id}...")
-            time.sleep(5)
+            self.wait_agent_status_update(_agent_id)
             self._bedrock_agent_client.delete_agent(
                 agentId=_agent_id
                 )
-            time.sleep(5)
+            self.wait_agent_status_update(_agent_id)
             
         # TODO: add delete_lambda_flag parameter to optionall take care of
         # deleting the lambda function associated with the agent.
@@ -871,44 +1185,100 @@ class AgentsForAmazonBedrock:
 
             return _agent_role["Role"]["Arn"]
 
-    def wait_agent_status_update(self, agent_id):
-        response = self._bedrock_agent_client.get_agent(agentId=agent_id)
-        agent_status = response["agent"]["agentStatus"]
-        _waited_at_least_once = False
-        while agent_status.endswith("ING"):
-            print(f"Waiting for agent status to change. Current status {agent_status}")
-            time.sleep(5)
-            _waited_at_least_once = True
-            try:
-                response = self._bedrock_agent_client.get_agent(agentId=agent_id)
-                agent_status = response["agent"]["agentStatus"]
-            except self._bedrock_agent_client.exceptions.ResourceNotFoundException:
-                agent_status = "DELETED"
-        if _waited_at_least_once:
+    def _get_agent_status(self, agent_id: str) -> str:
+        try:
+            response = self._bedrock_agent_client.get_agent(agentId=agent_id)
+            return response["agent"]["agentStatus"]
+        except self._bedrock_agent_client.exceptions.ResourceNotFoundException:
+            return "DELETED"
+
+    def _get_agent_alias_status(self, agent_id: str, agent_alias_id: str) -> str:
+        try:
+            response = self._bedrock_agent_client.get_agent_alias(
+                agentId=agent_id, agentAliasId=agent_alias_id
+            )
+            return response["agentAlias"]["agentAliasStatus"]
+        except self._bedrock_agent_client.exceptions.ResourceNotFoundException:
+            return "DELETED"
+
+    def wait_agent_status_update(self, agent_id, backoff: Backoff = AGENT_BACKOFF):
+        """Waits until the agent is out of any transitional (*ING) state.
+
+        Args:
+            agent_id (str): Id of the agent
+            backoff (Backoff, Optional): polling schedule, polls quickly at first and backs off up to 10 seconds
+
+        Returns:
+            str: the final agent status, DELETED if the agent no longer exists
+        """
+        _seen = []
+
+        def _report(agent_status):
+            if not _seen or _seen[-1] != agent_status:
+                print(f"Waiting for agent status to change. Current status {agent_status}")
+            _seen.append(agent_status)
+
+        agent_status = wait_until(
+            lambda: self._get_agent_status(agent_id),
+            lambda agent_status: not agent_status.endswith("ING"),
+            backoff=backoff,
+            description=f"agent {agent_id}",
+            on_poll=_report,
+        )
+        if _seen:
             print(f"Agent id {agent_id} current status: {agent_status}")
+        return agent_status
 
-    def wait_agent_alias_status_update(self, agent_id, agent_alias_id, verbose=False):
-        response = self._bedrock_agent_client.get_agent_alias(
-            agentId=agent_id, agentAliasId=agent_alias_id
+    def wait_agents_status_update(self, agent_ids: List[str], backoff: Backoff = AGENT_BACKOFF) -> Dict[str, str]:
+        """Waits for several agents at once until none is in a transitional (*ING) state.
+
+        Args:
+            agent_ids (List[str]): Ids of the agents
+            backoff (Backoff, Optional): polling schedule of each agent
+
+        Returns:
+            Dict[str, str]: final status by agent id
+        """
+        return wait_all(
+            {
+                _agent_id: (
+                    lambda _agent_id=_agent_id: self._get_agent_status(_agent_id),
+                    lambda agent_status: not agent_status.endswith("ING"),
+                )
+                for _agent_id in agent_ids
+            },
+            backoff=backoff,
         )
-        agent_alias_status = response["agentAlias"]["agentAliasStatus"]
-        while agent_alias_status.endswith("ING"):
-            if verbose:
-                print(
+
+    def wait_agent_alias_status_update(self, agent_id, agent_alias_id, verbose=False, backoff: Backoff = AGENT_BACKOFF):
+        """Waits until the agent alias is out of any transitional (*ING) state.
+
+        Args:
+            agent_id (str): Id of the agent
+            agent_alias_id (str): Id of the alias
+            verbose (bool, Optional): whether to print the status while waiting
+            backoff (Backoff, Optional): polling schedule
+
+        Returns:
+            str: the final alias status, DELETED if the alias no longer exists
+        """
+        agent_alias_status = wait_until(
+            lambda: self._get_agent_alias_status(agent_id, agent_alias_id),
+            lambda agent_alias_status: not agent_alias_status.endswith("ING"),
+            backoff=backoff,
+            description=f"alias {agent_alias_id} of agent {agent_id}",
+            on_poll=(
+                (lambda agent_alias_status: print(
                     f"Waiting for agent ALIAS status to change. Current status {agent_alias_status}"
-                )
-            time.sleep(5)
-            try:
-                response = self._bedrock_agent_client.get_agent_alias(
-                    agentId=agent_id, agentAliasId=agent_alias_id
-                )
-                agent_alias_status = response["agentAlias"]["agentAliasStatus"]
-            except self._bedrock_agent_client.exceptions.ResourceNotFoundException:
-                agent_status = "DELETED"
+                ))
+                if verbose else None
+            ),
+        )
         if verbose:
             print(
                 f"Agent id {agent_id}, Alias {agent_alias_id} current status: {agent_alias_status}"
             )
+        return agent_alias_status
 
     def associate_sub_agents(self, supervisor_agent_id, sub_agents_list):
         for sub_agent in sub_agents_list:
@@ -971,6 +1341,7 @@ class AgentsForAmazonBedrock:
         code_interpretation: bool=False,
         guardrail_id: str=None,
         kb_id: str=None,
+        agent_role_arn: str=None,
         verbose: bool=False
     ) -> Tuple[str, str, str]:
         """Creates an agent given a name, instructions, model, description, and optionally
@@ -986,6 +1357,7 @@ class AgentsForAmazonBedrock:
             kb_arns (List[str], Optional): ARNs of the Knowledge Base(s) this agent is allowed to use
             agent_collaboration (str, Optional): collaboration type for the agent, defaults to 'SUPERVISOR_ROUTER'
             code_interpretation (bool, Optional): whether to enable code interpretation for the agent, defaults to False
+            agent_role_arn (str, Optional): existing IAM role for the agent, skips creating one
             verbose (bool, Optional): whether to print verbose output, defaults to False
         
         Returns:
@@ -994,8 +1366,11 @@ class AgentsForAmazonBedrock:
         if verbose:
             print(f"Creating agent: {agent_name}...")
 
-        _role_arn = self._create_agent_role(agent_name, model_ids, kb_arns, reuse_default=True,
-                                            verbose=False)
+        if agent_role_arn is not None:
+            _role_arn = agent_role_arn
+        else:
+            _role_arn = self._create_agent_role(agent_name, model_ids, kb_arns, reuse_default=True,
+                                                verbose=False)
         _model_id = model_ids[0]
 
         if verbose:
@@ -1024,6 +1399,7 @@ class AgentsForAmazonBedrock:
                 "guardrailIdentifier": guardrail_id,
                 "guardrailVersion": "DRAFT"}
             
+        _retry_delays = Backoff(min_delay=2.0, max_delay=8.0).delays()
         while not _agent_created and _num_tries <= 2:
             try:
                 if verbose:
@@ -1054,8 +1430,7 @@ class AgentsForAmazonBedrock:
                     )
                 _num_tries += 1
                 if _num_tries <= 2:
-                    time.sleep(4)
-                    pass
+                    time.sleep(next(_retry_delays))
                 else:
                     if verbose:
                         print(f"Giving up on agent creation after 2 tries.")
@@ -1080,7 +1455,7 @@ class AgentsForAmazonBedrock:
         _resp = self._bedrock_agent_client.prepare_agent(
                agentId=_agent_id
             )
-        time.sleep(5) # make sure agent is ready to be invoked as soon as we return
+        self.wait_agent_status_update(_agent_id) # make sure agent is ready to be invoked as soon as we return
         return
     
     def create_agent_alias(self, agent_id: str, alias_name: str) -> Tuple[str, str]:
@@ -1098,12 +1473,13 @@ class AgentsForAmazonBedrock:
         agent_alias_arn = agent_alias["agentAlias"]["agentAliasArn"]
         return agent_alias_id, agent_alias_arn
     
-    def add_code_interpreter(self, agent_name: str) -> None:
+    def add_code_interpreter(self, agent_name: str, prepare_agent: bool = True) -> None:
         """Adds a code interpreter action group to an existing agent, and prepares
         the agent so it is ready to be invoked.
 
         Args:
             agent_name (str): name of the existing agent
+            prepare_agent (bool, Optional): whether to prepare the agent, False to prepare it once after several changes
         """
         _agent_id = self.get_agent_id_by_name(agent_name)
         if _agent_id is None:
@@ -1120,8 +1496,9 @@ class AgentsForAmazonBedrock:
                 )
         # check the response and if successful, prepare the agent
         if _agent_action_group_resp["ResponseMetadata"]["HTTPStatusCode"] == 200:
-            _resp = self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
-            time.sleep(5)  # make sure agent is ready to be invoked as soon as we return
+            if prepare_agent:
+                _resp = self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
+                self.wait_agent_status_update(_agent_id)  # make sure agent is ready to be invoked as soon as we return
         else:
             print(f"Error adding code interpreter to agent: {_agent_action_group_resp}")
         return
@@ -1137,7 +1514,9 @@ class AgentsForAmazonBedrock:
             additional_function_iam_policy: Dict = None,
             sub_agent_arns: List[str] = None,
             dynamo_args: List[str] = None,
-            verbose: bool = False
+            verbose: bool = False,
+            requirements_file: str = None,
+            prepare_agent: bool = True
     ) -> None:
         """Adds an action group to an existing agent, creates a Lambda function to
         implement that action group, and prepares the agent so it is ready to be
@@ -1152,6 +1531,8 @@ class AgentsForAmazonBedrock:
             agent_action_group_description (str): description of the agent action group
             additional_function_iam_policy (Dict, Optional): additional IAM policy to attach to the Lambda function
             sub_agent_arns (List[str], Optional): list of ARNs of sub-agents (if any) to permit the Lambda to invoke
+            requirements_file (str, Optional): pip requirements of the Lambda function, deployed as a layer
+            prepare_agent (bool, Optional): whether to prepare the agent, False to prepare it once after several changes
         """
 
         _agent_id = self.get_agent_id_by_name(agent_name)
@@ -1167,7 +1548,8 @@ class AgentsForAmazonBedrock:
                 source_code_file,
                 additional_function_iam_policy=additional_function_iam_policy,
                 sub_agent_arns=sub_agent_arns,
-                dynamo_args=dynamo_args
+                dynamo_args=dynamo_args,
+                requirements_file=requirements_file
             )
 
         self.wait_agent_status_update(_agent_id)
@@ -1187,8 +1569,9 @@ class AgentsForAmazonBedrock:
         )
         # check the response and if successful, prepare the agent
         if _agent_action_group_resp["ResponseMetadata"]["HTTPStatusCode"] == 200:
-            _resp = self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
-            time.sleep(5)  # make sure agent is ready to be invoked as soon as we return
+            if prepare_agent:
+                _resp = self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
+                self.wait_agent_status_update(_agent_id)  # make sure agent is ready to be invoked as soon as we return
         else:
             print(f"Error adding code interpreter to agent: {_agent_action_group_resp}")
         return
@@ -1199,6 +1582,7 @@ class AgentsForAmazonBedrock:
             agent_functions: List[Dict],
             agent_action_group_name: str,
             agent_action_group_description: str = None,
+            prepare_agent: bool = True,
     ) -> None:
         """Adds a return of control (ROD) action group to an existing agent,
         and prepares the agent so it is ready to be invoked.
@@ -1208,6 +1592,7 @@ class AgentsForAmazonBedrock:
             agent_functions (List[Dict]): list of agent function descriptions to implement in the action group
             agent_action_group_name (str): name of the agent action group
             agent_action_group_description (str, Optional): description of the agent action group
+            prepare_agent (bool, Optional): whether to prepare the agent, False to prepare it once after several changes
         """
 
         _agent_action_group_resp = self._bedrock_agent_client.create_agent_action_group(
@@ -1218,8 +1603,9 @@ class AgentsForAmazonBedrock:
             functionSchema={"functions": agent_functions},
             description=agent_action_group_description,
         )
-        _resp = self._bedrock_agent_client.prepare_agent(agentId=agent_id)
-        time.sleep(5)  # make sure agent is ready to be invoked as soon as we return
+        if prepare_agent:
+            _resp = self._bedrock_agent_client.prepare_agent(agentId=agent_id)
+            self.wait_agent_status_update(agent_id)  # make sure agent is ready to be invoked as soon as we return
         return
 
     def get_function_defs(self, agent_name: str) -> List[dict]:
@@ -1362,7 +1748,7 @@ class AgentsForAmazonBedrock:
         )
         _supervisor_agent_arn = _response["agent"]["agentArn"]
         _supervisor_agent_id = _response["agent"]["agentId"]
-        time.sleep(15)
+        self.wait_agent_status_update(_supervisor_agent_id)
 
         # Associate the KB with the supervisor agent
         if kb_arn is not None:
@@ -1382,79 +1768,6 @@ class AgentsForAmazonBedrock:
 
         return _function_defs, _supervisor_agent_arn
 
-    def _make_fully_cited_answer(
-            self, orig_agent_answer, event, enable_trace=False, trace_level="none"
-    ):
-        _citations = event.get("chunk", {}).get("attribution", {}).get("citations", [])
-        if _citations:
-            if enable_trace:
-                print(
-                    f"got {len(event['chunk']['attribution']['citations'])} citations \n"
-                )
-        else:
-            return orig_agent_answer
-
-        # remove <sources> tags to work around a bug
-        _pattern = r"\n\n<sources>\n\d+\n</sources>\n\n"
-        _cleaned_text = re.sub(_pattern, "", orig_agent_answer)
-        _pattern = "<sources><REDACTED></sources>"
-        _cleaned_text = re.sub(_pattern, "", _cleaned_text)
-        _pattern = "<sources></sources>"
-        _cleaned_text = re.sub(_pattern, "", _cleaned_text)
-
-        _fully_cited_answer = ""
-        _curr_citation_idx = 0
-
-        for _citation in _citations:
-            if enable_trace and trace_level == "all":
-                print(f"full citation: {_citation}")
-
-            _start = _citation["generatedResponsePart"]["textResponsePart"]["span"][
-                         "start"
-                     ] - (
-                             _curr_citation_idx + 1
-                     )  # +1
-            _end = (
-                    _citation["generatedResponsePart"]["textResponsePart"]["span"]["end"]
-                    - (_curr_citation_idx + 2)
-                    + 4
-            )  # +2
-            _refs = _citation.get("retrievedReferences", [])
-            if len(_refs) > 0:
-                _ref_url = (
-                    _refs[0].get("location", {}).get("s3Location", {}).get("uri", "")
-                )
-            else:
-                _ref_url = ""
-                _fully_cited_answer = _cleaned_text
-                break
-
-            _fully_cited_answer += _cleaned_text[_start:_end] + " [" + _ref_url + "] "
-
-            if _curr_citation_idx == 0:
-                _answer_prefix = _cleaned_text[:_start]
-                _fully_cited_answer = _answer_prefix + _fully_cited_answer
-
-            _curr_citation_idx += 1
-
-            if enable_trace and trace_level == "all":
-                print(f"\n\ncitation {_curr_citation_idx}:")
-                print(
-                    f"got {len(_citation['retrievedReferences'])} retrieved references for this citation\n"
-                )
-                print(f"citation span... start: {_start}, end: {_end}")
-                print(
-                    f"citation based on span:====\n{_cleaned_text[_start:_end]}\n===="
-                )
-                print(f"citation url: {_ref_url}\n============")
-
-        if enable_trace and trace_level == "all":
-            print(
-                f"\nfullly cited answer:*************\n{_fully_cited_answer}\n*************"
-            )
-
-        return _fully_cited_answer
-
     def invoke(
             self,
             input_text: str,
@@ -1466,6 +1779,7 @@ class AgentsForAmazonBedrock:
             end_session: bool = False,
             trace_level: str = "core",
             multi_agent_names: dict = {},
+            stream_final_response: bool = False,
     ):
         """Invokes an agent with a given input text, while optional parameters
         also let you leverage an agent session, or target a specific agent alias.
@@ -1479,10 +1793,77 @@ class AgentsForAmazonBedrock:
             enable_trace (bool, optional): Whether to enable trace. Defaults to False.
             end_session (bool, optional): Whether to end the session. Defaults to False.
             trace_level (str, optional): The level of trace. Defaults to "none". Possible values are "none", "all", "core".
+            stream_final_response (bool, optional): Whether the agent streams its final response in several chunks. Defaults to False.
 
         Returns:
             str: The answer from the agent.
         """
+        _agent_answer = ""
+        for _event in self.invoke_stream(
+            input_text,
+            agent_id,
+            agent_alias_id=agent_alias_id,
+            session_id=session_id,
+            session_state=session_state,
+            enable_trace=enable_trace,
+            end_session=end_session,
+            trace_level=trace_level,
+            multi_agent_names=multi_agent_names,
+            stream_final_response=stream_final_response,
+        ):
+            if _event["type"] == "chunk":
+                _agent_answer += _event["text"]
+            elif _event["type"] == "error":
+                return _event["message"]
+            elif _event["type"] == "files":
+                display(Markdown("### Files"))
+                for _this_file in _event["files"]:
+                    print(f"{_this_file['name']} ({_this_file['type']})")
+                    if _this_file['type'] == 'image/png' or _this_file['type'] == 'image/jpeg':
+                        _img = mpimg.imread(_this_file['path'])
+                        plt.imshow(_img)
+                        plt.show()
+
+        if enable_trace and trace_level == "all":
+            print(f"Returning agent answer as: {_agent_answer}")
+
+        return _agent_answer
+
+    def invoke_stream(
+            self,
+            input_text: str,
+            agent_id: str,
+            agent_alias_id: str = "TSTALIASID",
+            session_id: str = str(uuid.uuid1()),
+            session_state: dict = {},
+            enable_trace: bool = False,
+            end_session: bool = False,
+            trace_level: str = "core",
+            multi_agent_names: dict = {},
+            stream_final_response: bool = True,
+    ) -> Iterator[Dict]:
+        """Invokes an agent and yields its answer as it is generated. Citations are resolved
+        incrementally, so the concatenated chunk texts form the fully cited answer.
+
+        Args:
+            input_text (str): The text to be processed by the agent.
+            agent_id (str): The ID of the agent to invoke.
+            agent_alias_id (str, optional): The alias ID of the agent to invoke. Defaults to "TSTALIASID".
+            session_id (str, optional): The ID of the session. Defaults to a new UUID.
+            session_state (dict, optional): The state of the session. Defaults to an empty dict.
+            enable_trace (bool, optional): Whether to enable and print the trace. Defaults to False.
+            end_session (bool, optional): Whether to end the session. Defaults to False.
+            trace_level (str, optional): The level of trace. Possible values are "none", "all", "core", "outline".
+            stream_final_response (bool, optional): Whether the agent streams its final response in several chunks,
+            instead of a single chunk at the end. Defaults to True.
+
+        Yields:
+            Dict: events, by "type":
+                "chunk": {"text"} part of the answer
+                "files": {"files": [{"name", "type", "path"}]} files returned by the agent, saved under output/
+                "trace": {"trace"} a trace event, when enable_trace is set
+                "error": {"message"} the invocation failed
+        """
 
         _time_before_call = datetime.datetime.now()
 
@@ -1494,6 +1875,7 @@ class AgentsForAmazonBedrock:
             sessionState=session_state,
             enableTrace=enable_trace,
             endSession=end_session,
+            streamingConfigurations={"streamFinalResponse": stream_final_response},
         )
 
         if enable_trace:
@@ -1510,7 +1892,8 @@ class AgentsForAmazonBedrock:
             _error_message = f"API Response was not 200: {_agent_resp}"
             if enable_trace and trace_level == "all":
                 print(_error_message)
-            return _error_message
+            yield {"type": "error", "message": _error_message}
+            return
 
         _total_in_tokens = 0
         _total_out_tokens = 0
@@ -1519,7 +1902,7 @@ class AgentsForAmazonBedrock:
         _sub_step = 0
         _time_before_orchestration = datetime.datetime.now()
         
-        _agent_answer = ""
+        _citations = _CitationAssembler()
         _event_stream = _agent_resp['completion']
 
         try:
@@ -1528,10 +1911,9 @@ class AgentsForAmazonBedrock:
                 _sub_agent_alias_id = None 
                 if 'files' in _event:
                     _files_event = _event['files']
-                    display(Markdown("### Files"))
                     _files_list = _files_event['files']
+                    _saved_files = []
                     for _this_file in _files_list:
-                        print(f"{_this_file['name']} ({_this_file['type']})")
                         _file_bytes = _this_file['bytes']
                         # save bytes to file, given the name of file and the bytes 
                         if not os.path.exists('output'):
@@ -1539,16 +1921,24 @@ class AgentsForAmazonBedrock:
                         _file_name = os.path.join('output', _this_file['name'])
                         with open(_file_name, 'wb') as f:
                             f.write(_file_bytes)
-                        if _this_file['type'] == 'image/png' or _this_file['type'] == 'image/jpeg':
-                            _img = mpimg.imread(_file_name)
-                            plt.imshow(_img)
-                            plt.show()
+                        _saved_files.append(
+                            {"name": _this_file['name'], "type": _this_file['type'], "path": _file_name}
+                        )
+                    yield {"type": "files", "files": _saved_files}
                 elif 'chunk' in _event:
                     _data = _event['chunk']['bytes']
-                    _agent_answer = _data.decode('utf8')
-                    _agent_answer = self._make_fully_cited_answer(_agent_answer, _event, enable_trace, trace_level)
+                    _chunk_citations = _event['chunk'].get('attribution', {}).get('citations', [])
+                    if enable_trace and _chunk_citations:
+                        print(f"got {len(_chunk_citations)} citations \n")
+                        if trace_level == "all":
+                            for _citation in _chunk_citations:
+                                print(f"full citation: {_citation}")
+                    _text = _citations.feed(_data.decode('utf8'), _chunk_citations)
+                    if _text:
+                        yield {"type": "chunk", "text": _text}
 
                 if 'trace' in _event and enable_trace:
+                    yield {"type": "trace", "trace": _event['trace']}
                     if trace_level == "all":
                         print('---')
                     else:
@@ -1761,6 +2151,10 @@ class AgentsForAmazonBedrock:
                         #     # plt.imshow(img)
                         #     # plt.show()
 
+            _text = _citations.flush()
+            if _text:
+                yield {"type": "chunk", "text": _text}
+
             if enable_trace:
                 duration = datetime.datetime.now() - _time_before_call
 
@@ -1769,11 +2163,6 @@ class AgentsForAmazonBedrock:
                                   f"using {_total_in_tokens+_total_out_tokens} tokens " +\
                                   f"(in: {_total_in_tokens}, out: {_total_out_tokens})" +\
                                   f", and took {duration.total_seconds():,.1f} total seconds", "yellow"))
-
-                if trace_level == "all":
-                    print(f"Returning agent answer as: {_agent_answer}")
-
-            return _agent_answer
         
         except Exception as e:
             print(f"Caught exception while processing input to invokeAgent:\n")
@@ -1808,34 +2197,46 @@ class AgentsForAmazonBedrock:
         Returns:
             str: The answer from the agent.
         """
+        _session_state = None
         if function_call is not None:
-            _agent_resp = self._bedrock_agent_runtime_client.invoke_agent(
-                inputText=input_text,
-                agentId=agent_id,
-                agentAliasId=agent_alias_id, 
-                sessionId=session_id,
-                sessionState={
-                    'invocationId': function_call["invocationId"],
-                    'returnControlInvocationResults': [{
-                        'functionResult': {
-                            'actionGroup': function_call["invocationInputs"][0]["functionInvocationInput"]["actionGroup"],
-                            'function': function_call["invocationInputs"][0]["functionInvocationInput"]["function"],
-                            'responseBody': {
-                                "TEXT": {
-                                    'body': function_call_result
-                                }}}}]},
-                enableTrace=enable_trace, 
-                endSession= end_session
-            )
-        else:
-            _agent_resp = self._bedrock_agent_runtime_client.invoke_agent(
-                inputText=input_text,
-                agentId=agent_id,
-                agentAliasId=agent_alias_id, 
-                sessionId=session_id,
-                enableTrace=enable_trace, 
-                endSession= end_session
-            )
+            _session_state = {
+                'invocationId': function_call["invocationId"],
+                'returnControlInvocationResults': [{
+                    'functionResult': {
+                        'actionGroup': function_call["invocationInputs"][0]["functionInvocationInput"]["actionGroup"],
+                        'function': function_call["invocationInputs"][0]["functionInvocationInput"]["function"],
+                        'responseBody': {
+                            "TEXT": {
+                                'body': function_call_result
+                            }}}}]}
+        return self._invoke_roc_round(input_text, agent_id, agent_alias_id, session_id,
+                                      _session_state, enable_trace, end_session)
+
+    def _invoke_roc_round(self,
+                          input_text: str,
+                          agent_id: str,
+                          agent_alias_id: str,
+                          session_id: str,
+                          session_state: dict = None,
+                          enable_trace: bool = False,
+                          end_session: bool = False):
+        """Performs one invoke_agent() call of an ROC conversation.
+
+        Returns:
+            str or dict: the final answer, or the returnControl payload when the agent asks for function calls
+        """
+        _kwargs = {}
+        if session_state is not None:
+            _kwargs["sessionState"] = session_state
+        _agent_resp = self._bedrock_agent_runtime_client.invoke_agent(
+            inputText=input_text,
+            agentId=agent_id,
+            agentAliasId=agent_alias_id,
+            sessionId=session_id,
+            enableTrace=enable_trace,
+            endSession=end_session,
+            **_kwargs
+        )
 
         # logger.info(pprint.pprint(agentResponse))
     
@@ -1857,12 +2258,110 @@ class AgentsForAmazonBedrock:
             return _agent_answer
         except Exception as e:
             raise Exception("unexpected event.", e)
-        
+
+    @staticmethod
+    def _run_roc_function(tools: Union[Dict[str, Callable], object], invocation_input: Dict) -> Dict:
+        """Calls the local tool for one function invocation input of a returnControl payload.
+
+        A tool that is missing or raises is reported to the agent as a FAILURE with the error as body,
+        so the agent can recover instead of the conversation being abandoned.
+        """
+        if "functionInvocationInput" not in invocation_input:
+            raise ValueError(f"Only function invocation inputs are supported, got: {list(invocation_input)}")
+        _input = invocation_input["functionInvocationInput"]
+        _function = _input["function"]
+        _args = {_param["name"]: _param["value"] for _param in _input.get("parameters", [])}
+        _result = {
+            "actionGroup": _input["actionGroup"],
+            "function": _function,
+        }
+        try:
+            if isinstance(tools, dict):
+                _tool = tools[_function]
+            else:
+                _tool = getattr(tools, _function)
+            _body = _tool(**_args)
+            _result["responseBody"] = {"TEXT": {"body": _body if isinstance(_body, str) else json.dumps(_body, default=str)}}
+        except Exception as e:
+            _result["responseBody"] = {"TEXT": {"body": f"Error calling {_function}: {e!r}"}}
+            _result["responseState"] = "FAILURE"
+        return {"functionResult": _result}
+
+    def invoke_roc_loop(self,
+                        input_text: str,
+                        agent_id: str,
+                        tools: Union[Dict[str, Callable], object],
+                        agent_alias_id: str=DEFAULT_ALIAS,
+                        session_id: str=None,
+                        max_rounds: int=DEFAULT_MAX_ROC_ROUNDS,
+                        max_workers: int=8,
+                        enable_trace: bool=False,
+                        verbose: bool=False) -> RocResult:
+        """Drives a return of control (ROC) conversation until the agent returns its final answer.
+
+        Every round, all the function calls the agent asks for are run on local tools (concurrently
+        when there are several), and all their results are sent back in a single sessionState.
+
+        Args:
+            input_text (str): The text to be processed by the agent.
+            agent_id (str): The ID of the agent to invoke.
+            tools (Dict or object): local tools by function name, or an object (e.g. a module or class)
+            with the functions as attributes
+            agent_alias_id (str, optional): The alias ID of the agent to invoke. Defaults to DEFAULT_ALIAS.
+            session_id (str, optional): The ID of the session. Defaults to a new UUID.
+            max_rounds (int, optional): maximum number of invoke_agent() calls. Defaults to DEFAULT_MAX_ROC_ROUNDS.
+            max_workers (int, optional): maximum number of tools run in parallel. Defaults to 8.
+            enable_trace (bool, optional): Whether to enable trace. Defaults to False.
+            verbose (bool, optional): print the function calls and latency of every round. Defaults to False.
+
+        Returns:
+            RocResult: the final answer, and the function calls and latency of every round
+        """
+        session_id = session_id or str(uuid.uuid1())
+        _rounds = []
+        _text = input_text
+        _session_state = None
+        with ThreadPoolExecutor(max_workers=max_workers) as _executor:
+            for _round_num in range(1, max_rounds + 1):
+                _start = time.time()
+                _response = self._invoke_roc_round(_text, agent_id, agent_alias_id, session_id,
+                                                   _session_state, enable_trace)
+                _agent_latency = time.time() - _start
+
+                if not isinstance(_response, dict):
+                    _rounds.append(RocRound(function_calls=[], agent_latency=_agent_latency))
+                    if verbose:
+                        print(f"Round {_round_num}: final answer, agent {_agent_latency:.2f}s")
+                    return RocResult(answer=_response, rounds=_rounds)
+
+                _inputs = _response["invocationInputs"]
+                _function_calls = [_input.get("functionInvocationInput", {}).get("function") for _input in _inputs]
+                _start = time.time()
+                _results = list(_executor.map(lambda _input: self._run_roc_function(tools, _input), _inputs))
+                _tool_latency = time.time() - _start
+                _rounds.append(RocRound(function_calls=_function_calls,
+                                        agent_latency=_agent_latency,
+                                        tool_latency=_tool_latency))
+                if verbose:
+                    print(f"Round {_round_num}: {_function_calls}, agent {_agent_latency:.2f}s, tools {_tool_latency:.2f}s")
+
+                # the follow up request carries only the function results
+                _text = ""
+                _session_state = {
+                    'invocationId': _response["invocationId"],
+                    'returnControlInvocationResults': _results
+                }
+
+        raise RuntimeError(f"Agent {agent_id} did not return a final answer after {max_rounds} rounds, "
+                           f"last function calls: {_rounds[-1].function_calls}")
+
     def update_agent(self,
                      agent_name: str,
                      new_model_id: str=None,
                      new_instructions: str=None,
-                     guardrail_id: str=None):
+                     guardrail_id: str=None,
+                     new_description: str=None,
+                     prepare_agent: bool=True):
         """Updates an agent with new details.
 
         Args:
@@ -1870,6 +2369,8 @@ class AgentsForAmazonBedrock:
             new_model_id (str, optional): The new model ID to use. Defaults to None.
             new_instructions (str, optional): The new instructions to use. Defaults to None.
             guardrail_id (str, optional): ID of the new guardrail to use. Defaults to None.
+            new_description (str, optional): The new description to use. Defaults to None.
+            prepare_agent (bool, optional): Whether to prepare the agent, False to prepare it once after several changes. Defaults to True.
 
         Returns:
             dict: UpdateAgent response.
@@ -1890,6 +2391,10 @@ class AgentsForAmazonBedrock:
         if new_instructions is not None:
             _agent_details['instruction'] = new_instructions
 
+        # Update description.
+        if new_description is not None:
+            _agent_details['description'] = new_description
+
         # Update guardrail or if there was none, this will add it.
         if guardrail_id is not None:
             _agent_details['guardrailConfiguration'] = {"guardrailIdentifier": guardrail_id,
@@ -1914,13 +2419,168 @@ class AgentsForAmazonBedrock:
         # Update the agent.
         _update_agent_response = self._bedrock_agent_client.update_agent(**_agent_details)
 
-        time.sleep(3)
+        self.wait_agent_status_update(_agent_id)
         
         #Prepare Agent
-        self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
+        if prepare_agent:
+            self._bedrock_agent_client.prepare_agent(agentId=_agent_id)
 
         return _update_agent_response
 
+    def get_agent_configuration(self, agent_id: str) -> Dict:
+        """Gets the current DRAFT configuration of an agent: its details, action groups
+        and knowledge base associations.
+
+        Args:
+            agent_id (str): Id of the agent
+
+        Returns:
+            Dict: {"agent": {...}, "action_groups": {name: {...}}, "knowledge_bases": {kb_id: {...}}}
+        """
+        _agent = self._bedrock_agent_client.get_agent(agentId=agent_id)["agent"]
+
+        _action_groups = {}
+        _kwargs = {}
+        while True:
+            _list_resp = self._bedrock_agent_client.list_agent_action_groups(
+                agentId=agent_id, agentVersion="DRAFT", maxResults=100, **_kwargs
+            )
+            for _summary in _list_resp["actionGroupSummaries"]:
+                _ag = self._bedrock_agent_client.get_agent_action_group(
+                    agentId=agent_id, agentVersion="DRAFT", actionGroupId=_summary["actionGroupId"]
+                )["agentActionGroup"]
+                _action_groups[_ag["actionGroupName"]] = _ag
+            if not _list_resp.get("nextToken"):
+                break
+            _kwargs = {"nextToken": _list_resp["nextToken"]}
+
+        _knowledge_bases = {}
+        _kwargs = {}
+        while True:
+            _list_resp = self._bedrock_agent_client.list_agent_knowledge_bases(
+                agentId=agent_id, agentVersion="DRAFT", maxResults=100, **_kwargs
+            )
+            for _summary in _list_resp["agentKnowledgeBaseSummaries"]:
+                _knowledge_bases[_summary["knowledgeBaseId"]] = _summary
+            if not _list_resp.get("nextToken"):
+                break
+            _kwargs = {"nextToken": _list_resp["nextToken"]}
+
+        return {"agent": _agent, "action_groups": _action_groups, "knowledge_bases": _knowledge_bases}
+
+    def update_agent_action_group(
+            self,
+            agent_id: str,
+            action_group: Dict,
+            agent_functions: List[Dict] = None,
+            agent_action_group_description: str = None,
+            action_group_executor: Dict = None,
+            action_group_state: str = None,
+    ) -> Dict:
+        """Updates an existing action group of the DRAFT agent in place. The agent is not prepared.
+
+        Args:
+            agent_id (str): Id of the agent
+            action_group (Dict): current action group, as returned by get_agent_configuration()
+            agent_functions (List[Dict], Optional): new function definitions
+            agent_action_group_description (str, Optional): new description
+            action_group_executor (Dict, Optional): new executor, e.g. {"lambda": arn} or {"customControl": "RETURN_CONTROL"}
+            action_group_state (str, Optional): ENABLED or DISABLED
+
+        Returns:
+            dict: UpdateAgentActionGroup response.
+        """
+        _kwargs = {
+            "agentId": agent_id,
+            "agentVersion": "DRAFT",
+            "actionGroupId": action_group["actionGroupId"],
+            "actionGroupName": action_group["actionGroupName"],
+            "actionGroupState": action_group_state or action_group["actionGroupState"],
+        }
+        if action_group.get("parentActionSignature"):
+            _kwargs["parentActionGroupSignature"] = action_group["parentActionSignature"]
+        else:
+            _kwargs["actionGroupExecutor"] = action_group_executor or action_group["actionGroupExecutor"]
+            if agent_functions is not None:
+                _kwargs["functionSchema"] = {"functions": agent_functions}
+            elif "functionSchema" in action_group:
+                _kwargs["functionSchema"] = action_group["functionSchema"]
+            elif "apiSchema" in action_group:
+                _kwargs["apiSchema"] = action_group["apiSchema"]
+        if agent_action_group_description is not None:
+            _kwargs["description"] = agent_action_group_description
+        elif action_group.get("description"):
+            _kwargs["description"] = action_group["description"]
+
+        self.wait_agent_status_update(agent_id)
+        return self._bedrock_agent_client.update_agent_action_group(**_kwargs)
+
+    def delete_agent_action_group(self, agent_id: str, action_group: Dict) -> None:
+        """Disables and deletes an action group of the DRAFT agent. The agent is not prepared.
+
+        Args:
+            agent_id (str): Id of the agent
+            action_group (Dict): current action group, as returned by get_agent_configuration()
+        """
+        if action_group["actionGroupState"] != "DISABLED":
+            self.update_agent_action_group(agent_id, action_group, action_group_state="DISABLED")
+        self.wait_agent_status_update(agent_id)
+        self._bedrock_agent_client.delete_agent_action_group(
+            agentId=agent_id, agentVersion="DRAFT", actionGroupId=action_group["actionGroupId"]
+        )
+
+    def update_kb_association(self, agent_id: str, kb_id: str, description: str) -> None:
+        """Updates the description of a Knowledge Base associated with the DRAFT agent and
+        makes sure it is enabled. The agent is not prepared.
+
+        Args:
+            agent_id (str): Id of the agent
+            kb_id (str): Id of the KB
+            description (str): Description of the KB
+        """
+        self.wait_agent_status_update(agent_id)
+        self._bedrock_agent_client.update_agent_knowledge_base(
+            agentId=agent_id,
+            agentVersion="DRAFT",
+            knowledgeBaseId=kb_id,
+            description=description,
+            knowledgeBaseState="ENABLED",
+        )
+
+    def disassociate_kb_from_agent(self, agent_id: str, kb_id: str) -> None:
+        """Disassociates a Knowledge Base from the DRAFT agent. The agent is not prepared.
+
+        Args:
+            agent_id (str): Id of the agent
+            kb_id (str): Id of the KB
+        """
+        self.wait_agent_status_update(agent_id)
+        self._bedrock_agent_client.disassociate_agent_knowledge_base(
+            agentId=agent_id, agentVersion="DRAFT", knowledgeBaseId=kb_id
+        )
+
+    def update_agent_alias(self, agent_id: str, agent_alias_id: str) -> Tuple[str, str]:
+        """Points an existing alias to a new version of the prepared DRAFT agent. The alias keeps
+        serving the previous version until the new one is ready, so callers see no downtime.
+
+        Args:
+            agent_id (str): Id of the agent
+            agent_alias_id (str): Id of the alias to update
+
+        Returns:
+            Tuple[str, str]: alias id and alias ARN
+        """
+        _alias = self._bedrock_agent_client.get_agent_alias(
+            agentId=agent_id, agentAliasId=agent_alias_id
+        )["agentAlias"]
+        _update_resp = self._bedrock_agent_client.update_agent_alias(
+            agentId=agent_id,
+            agentAliasId=agent_alias_id,
+            agentAliasName=_alias["agentAliasName"],
+        )
+        self.wait_agent_alias_status_update(agent_id, agent_alias_id)
+        return agent_alias_id, _update_resp["agentAlias"]["agentAliasArn"]
+
     def create_dynamodb(self, table_name, pk_item, sk_item):
         try:
             table = self._dynamodb_resource.create_table(
@@ -1955,19 +2615,110 @@ class AgentsForAmazonBedrock:
         except self._dynamodb_client.exceptions.ResourceInUseException:
             print(f'Table {table_name} already exists, skipping table creation step')
 
+    def _batch_write_dynamodb(self, table_name: str, items: List[Dict]) -> int:
+        """Writes items with BatchWriteItem, 25 at a time, retrying unprocessed items with backoff.
+
+        Returns:
+            int: number of items written
+        """
+        _serializer = TypeSerializer()
+        _written = 0
+        for _start in range(0, len(items), DYNAMODB_BATCH_SIZE):
+            _requests = [
+                {"PutRequest": {"Item": {_k: _serializer.serialize(_v) for _k, _v in _item.items()}}}
+                for _item in items[_start:_start + DYNAMODB_BATCH_SIZE]
+            ]
+            _retry_delays = Backoff(min_delay=0.05, max_delay=2.0).delays()
+            for _ in range(DYNAMODB_MAX_BATCH_RETRIES + 1):
+                _resp = self._dynamodb_client.batch_write_item(RequestItems={table_name: _requests})
+                _unprocessed = _resp.get("UnprocessedItems", {}).get(table_name, [])
+                _written += len(_requests) - len(_unprocessed)
+                _requests = _unprocessed
+                if not _requests:
+                    break
+                # throttled, back off before retrying what was not written
+                time.sleep(next(_retry_delays))
+            else:
+                raise RuntimeError(
+                    f"{len(_requests)} items could not be written to table {table_name} "
+                    f"after {DYNAMODB_MAX_BATCH_RETRIES} retries"
+                )
+        return _written
+
     def load_dynamodb(
             self,
             table_name: str,
-            items: List
-    ):
+            items: List,
+            parallel_segments: int = 1
+    ) -> int:
+        """Loads items into a DynamoDB table with batched writes.
+
+        Args:
+            table_name (str): name of the table
+            items (List): items to put, as for Table.put_item. Items with the same key
+            must not appear twice
+            parallel_segments (int, Optional): number of segments of the items written in parallel
+
+        Returns:
+            int: number of items written
+        """
+        items = list(items)
         try:
+            if parallel_segments <= 1 or len(items) <= DYNAMODB_BATCH_SIZE:
+                return self._batch_write_dynamodb(table_name, items)
 
-            table = self._dynamodb_resource.Table(table_name)
-            for item in items:
-                table.put_item(Item=item)
+            # split on batch boundaries so every request stays full
+            _batches = [
+                items[_start:_start + DYNAMODB_BATCH_SIZE]
+                for _start in range(0, len(items), DYNAMODB_BATCH_SIZE)
+            ]
+            _segments = [
+                [_item for _batch in _batches[_i::parallel_segments] for _item in _batch]
+                for _i in range(parallel_segments)
+            ]
+            with ThreadPoolExecutor(max_workers=parallel_segments) as executor:
+                return sum(
+                    executor.map(lambda _segment: self._batch_write_dynamodb(table_name, _segment), _segments)
+                )
         except self._dynamodb_client.exceptions.ResourceInUseException:
             print(f'Error on loading process for table: {table_name}.')
 
+    def query_dynamodb_pages(
+            self,
+            table_name: str,
+            pk_field: str,
+            pk_value: str,
+            sk_field: str = None,
+            sk_value: str = None,
+            **query_kwargs
+    ) -> Iterator[List[Dict]]:
+        """Queries a DynamoDB table and yields the items of every page, following LastEvaluatedKey.
+
+        Args:
+            table_name (str): name of the table
+            pk_field (str): partition key name
+            pk_value (str): partition key value
+            sk_field (str, Optional): sort key name
+            sk_value (str, Optional): prefix of the sort key value
+            query_kwargs: other Table.query arguments, e.g. Limit or ScanIndexForward
+
+        Yields:
+            List[Dict]: items of one page
+        """
+        table = self._dynamodb_resource.Table(table_name)
+        # Create expression
+        if sk_field:
+            key_expression = Key(pk_field).eq(pk_value) & Key(sk_field).begins_with(sk_value)
+        else:
+            key_expression = Key(pk_field).eq(pk_value)
+
+        while True:
+            query_data = table.query(KeyConditionExpression=key_expression, **query_kwargs)
+            yield query_data['Items']
+            if 'LastEvaluatedKey' not in query_data:
+                return
+            query_kwargs['ExclusiveStartKey'] = query_data['LastEvaluatedKey']
+
     def query_dynamodb(
             self,
             table_name: str,
@@ -1977,19 +2728,81 @@ class AgentsForAmazonBedrock:
             sk_value: str = None
     ):
         try:
-
-            table = self._dynamodb_resource.Table(table_name)
-            # Create expression
-            if sk_field:
-                key_expression = Key(pk_field).eq(pk_value) & Key(sk_field).begins_with(sk_value)
-            else:
-                key_expression = Key(pk_field).eq(pk_value)
-
-            query_data = table.query(KeyConditionExpression=key_expression)
-            return query_data['Items']
+            return [
+                item
+                for page in self.query_dynamodb_pages(table_name, pk_field, pk_value, sk_field, sk_value)
+                for item in page
+            ]
         except self._dynamodb_client.exceptions.ResourceInUseException:
             print(f'Error querying table: {table_name}.')
 
+    def scan_dynamodb_pages(
+            self,
+            table_name: str,
+            total_segments: int = 1,
+            **scan_kwargs
+    ) -> Iterator[List[Dict]]:
+        """Scans a DynamoDB table and yields the items of every page, following LastEvaluatedKey.
+        With several segments, the segments are scanned in parallel and pages are yielded as
+        they arrive, in no particular order.
+
+        Args:
+            table_name (str): name of the table
+            total_segments (int, Optional): number of parallel scan segments
+            scan_kwargs: other Table.scan arguments, e.g. FilterExpression
+
+        Yields:
+            List[Dict]: items of one page
+        """
+        table = self._dynamodb_resource.Table(table_name)
+
+        def _scan_segment(segment_kwargs: Dict) -> Iterator[List[Dict]]:
+            while True:
+                scan_data = table.scan(**segment_kwargs)
+                yield scan_data['Items']
+                if 'LastEvaluatedKey' not in scan_data:
+                    return
+                segment_kwargs['ExclusiveStartKey'] = scan_data['LastEvaluatedKey']
+
+        if total_segments <= 1:
+            yield from _scan_segment(dict(scan_kwargs))
+            return
+
+        _pages = queue.Queue(maxsize=total_segments * 2)
+        _stop = threading.Event()
+        _done = object()
+
+        def _worker(segment: int):
+            try:
+                for _page in _scan_segment(dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)):
+                    if _stop.is_set():
+                        return
+                    _pages.put(_page)
+            except Exception as e:
+                _pages.put(e)
+            finally:
+                _pages.put(_done)
+
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            for _segment in range(total_segments):
+                executor.submit(_worker, _segment)
+            _running = total_segments
+            try:
+                while _running:
+                    _page = _pages.get()
+                    if _page is _done:
+                        _running -= 1
+                    elif isinstance(_page, Exception):
+                        raise _page
+                    else:
+                        yield _page
+            finally:
+                # the caller stopped early or a segment failed: let the other segments finish
+                _stop.set()
+                while _running:
+                    if _pages.get() is _done:
+                        _running -= 1
+
     def fill_template(self, customer, day, power, kind):
         line_template = {"customer_id": "null", "day": "", "sumPowerReading": "null", "kind":"null"}
         line_template["customer_id"] = str(customer)
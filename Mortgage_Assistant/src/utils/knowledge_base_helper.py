@@ -30,6 +30,8 @@ import pprint
 from retrying import retry
 import random
 
+from src.utils.waiters import KNOWLEDGE_BASE_BACKOFF, wait_until
+
 valid_embedding_models = [
     "cohere.embed-multilingual-v3", "cohere.embed-english-v3", "amazon.titan-embed-text-v1",
     "amazon.titan-embed-text-v2:0"
@@ -178,7 +180,7 @@ class KnowledgeBasesForAmazonBedrock:
                 collection_arn, index_name, data_bucket_name, embedding_model,
                 kb_name, kb_description, bedrock_kb_execution_role
             )
-            interactive_sleep(60)
+            self.wait_knowledge_base_status_update(knowledge_base['knowledgeBaseId'])
             print("========================================================================================")
             kb_id = knowledge_base['knowledgeBaseId']
             ds_id = data_source["dataSourceId"]
@@ -499,12 +501,13 @@ class KnowledgeBasesForAmazonBedrock:
         print(host)
         # wait for collection creation
         # This can take couple of minutes to finish
-        response = self.aoss_client.batch_get_collection(names=[vector_store_name])
-        # Periodically check collection status
-        while (response['collectionDetails'][0]['status']) == 'CREATING':
-            print('Creating collection...')
-            interactive_sleep(30)
-            response = self.aoss_client.batch_get_collection(names=[vector_store_name])
+        response = wait_until(
+            lambda: self.aoss_client.batch_get_collection(names=[vector_store_name]),
+            lambda response: response['collectionDetails'][0]['status'] != 'CREATING',
+            backoff=KNOWLEDGE_BASE_BACKOFF,
+            description=f"collection {vector_store_name}",
+            on_poll=lambda response: print('Creating collection...'),
+        )
         print('\nCollection successfully created:')
         pp.pprint(response["collectionDetails"])
         # create opensearch serverless access policy and attach it to Bedrock execution role
@@ -560,8 +563,14 @@ class KnowledgeBasesForAmazonBedrock:
             print('\nCreating index:')
             pp.pprint(response)
 
-            # index creation can take up to a minute
-            interactive_sleep(60)
+            # index creation can take up to a minute: indices.exists is true right away, so wait until
+            # the vector mapping is served and the index answers searches
+            wait_until(
+                lambda: self._vector_index_ready(index_name),
+                lambda ready: ready,
+                backoff=KNOWLEDGE_BASE_BACKOFF,
+                description=f"index {index_name}",
+            )
         except RequestError as e:
             # you can delete the index if its already exists
             # oss_client.indices.delete(index=index_name)
@@ -569,6 +578,26 @@ class KnowledgeBasesForAmazonBedrock:
                 f'Error while trying to create the index, with error {e.error}\nyou may unmark the delete above to '
                 f'delete, and recreate the index')
 
+    def _vector_index_ready(self, index_name: str):
+        """
+        Check that a vector index can be used by a knowledge base
+        Args:
+            index_name: name of the vector index
+
+        Returns:
+            True once the index returns its knn_vector mapping and answers a search
+        """
+        try:
+            mapping = self.oss_client.indices.get_mapping(index=index_name)
+            properties = mapping[index_name]["mappings"].get("properties", {})
+            if properties.get("vector", {}).get("type") != "knn_vector":
+                return False
+            self.oss_client.search(index=index_name, body={"size": 0, "query": {"match_all": {}}})
+            return True
+        except Exception as e:
+            print(f'Index {index_name} not ready yet: {e}')
+            return False
+
     @retry(wait_random_min=1000, wait_random_max=2000, stop_max_attempt_number=7)
     def create_knowledge_base(
             self, collection_arn: str, index_name: str, bucket_name: str, embedding_model: str,
@@ -682,6 +711,22 @@ class KnowledgeBasesForAmazonBedrock:
             pp.pprint(ds)
         return kb, ds
 
+    def wait_knowledge_base_status_update(self, kb_id):
+        """
+        Wait until the Knowledge Base is out of any transitional (CREATING, UPDATING, DELETING) state
+        Args:
+            kb_id: knowledge base id
+        Returns:
+            status of the knowledge base
+        """
+        i_status = ['CREATING', 'DELETING', 'UPDATING']
+        return wait_until(
+            lambda: self.bedrock_agent_client.get_knowledge_base(knowledgeBaseId=kb_id)['knowledgeBase']['status'],
+            lambda status: status not in i_status,
+            backoff=KNOWLEDGE_BASE_BACKOFF,
+            description=f"knowledge base {kb_id}",
+        )
+
     def synchronize_data(self, kb_id, ds_id):
         """
         Start an ingestion job to synchronize data from an S3 bucket to the Knowledge Base
@@ -691,9 +736,7 @@ class KnowledgeBasesForAmazonBedrock:
             ds_id: data source id
         """
         # ensure that the kb is available
-        i_status = ['CREATING', 'DELETING', 'UPDATING']
-        while self.bedrock_agent_client.get_knowledge_base(knowledgeBaseId=kb_id)['knowledgeBase']['status'] in i_status:
-            time.sleep(10)
+        self.wait_knowledge_base_status_update(kb_id)
         # Start an ingestion job
         start_job_response = self.bedrock_agent_client.start_ingestion_job(
             knowledgeBaseId=kb_id,
@@ -702,14 +745,16 @@ class KnowledgeBasesForAmazonBedrock:
         job = start_job_response["ingestionJob"]
         pp.pprint(job)
         # Get job
-        while job['status'] != 'COMPLETE' and job['status'] != 'FAILED':
-            get_job_response = self.bedrock_agent_client.get_ingestion_job(
+        job = wait_until(
+            lambda: self.bedrock_agent_client.get_ingestion_job(
                 knowledgeBaseId=kb_id,
                 dataSourceId=ds_id,
                 ingestionJobId=job["ingestionJobId"]
-            )
-            job = get_job_response["ingestionJob"]
-            interactive_sleep(5)
+            )["ingestionJob"],
+            lambda job: job['status'] in ['COMPLETE', 'FAILED', 'STOPPED'],
+            backoff=KNOWLEDGE_BASE_BACKOFF,
+            description=f"ingestion job {job['ingestionJobId']}",
+        )
         pp.pprint(job)
         #interactive_sleep(40)
 
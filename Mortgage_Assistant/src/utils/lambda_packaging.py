@@ -0,0 +1,176 @@
+# Copyright 2024 Amazon.com and its affiliates; all rights reserved.
+# This file is AWS Content and may not be duplicated or distributed without permission
+
+"""
+This module contains content-addressed packaging for the Lambda functions and layers that implement
+action groups.
+
+Packages are zipped deterministically (sorted entries, fixed timestamps and permissions), so the same
+sources always produce the same bytes and the same CodeSha256 as the deployed function. Built zips are kept
+in a local cache keyed by a hash of their inputs, so unchanged code and dependencies are neither rebuilt
+nor uploaded again.
+
+    >>> from src.utils.lambda_packaging import build_package, build_layer
+    >>> package = build_package(["existing_mortgage_function.py"])
+    >>> package.code_sha256  # compare with get_function()["Configuration"]["CodeSha256"]
+    >>> layer = build_layer("requirements.txt")  # dependencies, rebuilt only when requirements change
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bedrock-agent-lambdas")
+DEFAULT_PYTHON_VERSION = "3.12"
+DEFAULT_PLATFORM = "manylinux2014_x86_64"
+# Fixed timestamp of every zip entry, the earliest a zip file can store
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+@dataclass
+class LambdaPackage:
+    """A built zip and the hashes that identify it.
+
+    Args:
+        zip_content (bytes): the zip file
+        content_hash (str): hex SHA-256 of the inputs, used as cache key
+        code_sha256 (str): base64 SHA-256 of the zip, as reported by Lambda in CodeSha256
+    """
+
+    zip_content: bytes
+    content_hash: str
+    code_sha256: str
+
+
+def code_sha256(zip_content: bytes) -> str:
+    """Hash of a zip in the format of the CodeSha256 field of Lambda functions and layers."""
+    return base64.b64encode(hashlib.sha256(zip_content).digest()).decode()
+
+
+def content_hash(files: List[str], extra: str = "") -> str:
+    """Hex SHA-256 of the names and contents of files, plus an extra string such as a runtime."""
+    _hash = hashlib.sha256(extra.encode())
+    for _file in sorted(files):
+        _hash.update(_file.encode() + b"\0")
+        with open(_file, "rb") as f:
+            _hash.update(hashlib.sha256(f.read()).digest())
+    return _hash.hexdigest()
+
+
+def _deterministic_zip(entries: List[tuple]) -> bytes:
+    """Zip (file path, name in the archive) entries so that the same inputs give the same bytes."""
+    _buffer = BytesIO()
+    with zipfile.ZipFile(_buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        for _path, _arcname in sorted(entries, key=lambda entry: entry[1]):
+            _info = zipfile.ZipInfo(_arcname, date_time=ZIP_DATE_TIME)
+            _info.compress_type = zipfile.ZIP_DEFLATED
+            _info.external_attr = 0o644 << 16
+            with open(_path, "rb") as f:
+                z.writestr(_info, f.read())
+    return _buffer.getvalue()
+
+
+def _cached(cache_dir: str, key: str, build) -> LambdaPackage:
+    """Returns the cached zip for key, building and caching it if missing."""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    _path = os.path.join(cache_dir, f"{key}.zip")
+    if os.path.exists(_path):
+        with open(_path, "rb") as f:
+            _zip_content = f.read()
+    else:
+        _zip_content = build()
+        os.makedirs(cache_dir, exist_ok=True)
+        # write then rename, so concurrent builds never read a partial zip
+        _tmp_path = f"{_path}.{os.getpid()}.tmp"
+        with open(_tmp_path, "wb") as f:
+            f.write(_zip_content)
+        os.replace(_tmp_path, _path)
+    return LambdaPackage(zip_content=_zip_content, content_hash=key, code_sha256=code_sha256(_zip_content))
+
+
+def build_package(source_files: List[str], cache_dir: str = None) -> LambdaPackage:
+    """Zips the source files of a Lambda function. Files keep their relative path in the archive,
+    as with zipfile.ZipFile.write.
+
+    Args:
+        source_files (List[str]): paths of the source files, e.g. ["my_function.py"]
+        cache_dir (str, Optional): where built zips are kept, defaults to ~/.cache/bedrock-agent-lambdas
+
+    Returns:
+        LambdaPackage: the zip and its hashes
+    """
+    _entries = [(_file, zipfile.ZipInfo.from_file(_file).filename) for _file in source_files]
+    return _cached(
+        cache_dir,
+        "function-" + content_hash(source_files),
+        lambda: _deterministic_zip(_entries),
+    )
+
+
+def build_layer(
+    requirements_file: str,
+    python_version: str = DEFAULT_PYTHON_VERSION,
+    platform: str = DEFAULT_PLATFORM,
+    cache_dir: str = None,
+) -> LambdaPackage:
+    """Installs the requirements of a Lambda function into a layer zip (under python/). The layer is
+    only rebuilt when the requirements, Python version or platform change.
+
+    Args:
+        requirements_file (str): pip requirements file, pin versions for reproducible layers
+        python_version (str, Optional): Python version of the Lambda runtime
+        platform (str, Optional): platform of the wheels to install
+        cache_dir (str, Optional): where built zips are kept, defaults to ~/.cache/bedrock-agent-lambdas
+
+    Returns:
+        LambdaPackage: the zip and its hashes
+    """
+
+    def _build() -> bytes:
+        _build_dir = tempfile.mkdtemp(prefix="lambda-layer-")
+        try:
+            _target = os.path.join(_build_dir, "python")
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pip",
+                    "install",
+                    "--quiet",
+                    "--requirement",
+                    requirements_file,
+                    "--target",
+                    _target,
+                    "--platform",
+                    platform,
+                    "--python-version",
+                    python_version,
+                    "--implementation",
+                    "cp",
+                    "--only-binary=:all:",
+                ],
+                check=True,
+            )
+            _entries = []
+            for _root, _dirs, _files in os.walk(_target):
+                _dirs[:] = [_dir for _dir in _dirs if _dir != "__pycache__"]
+                for _file in _files:
+                    _path = os.path.join(_root, _file)
+                    _entries.append((_path, os.path.relpath(_path, _build_dir)))
+            return _deterministic_zip(_entries)
+        finally:
+            shutil.rmtree(_build_dir, ignore_errors=True)
+
+    return _cached(
+        cache_dir,
+        "layer-" + content_hash([requirements_file], extra=f"{python_version}/{platform}"),
+        _build,
+    )
@@ -0,0 +1,447 @@
+# Copyright 2024 Amazon.com and its affiliates; all rights reserved.
+# This file is AWS Content and may not be duplicated or distributed without permission
+
+"""
+This module provisions multi-agent topologies for Amazon Bedrock Agents as a dependency graph.
+
+Creating a supervisor and its collaborators one resource at a time leaves most of the wall clock time
+waiting on a single agent. The ProvisioningPlan class runs the steps of a topology as a DAG: a step starts
+as soon as the steps it depends on are done, with a bounded number of steps in flight, and a per-step
+timeline is reported at the end.
+
+plan_multi_agent_system() builds the plan for a supervisor and its collaborators on top of
+AgentsForAmazonBedrock:
+
+    role -> agent -> lambdas, action groups, knowledge bases -> prepare -> alias -> supervisor association
+
+Changes to the DRAFT version of one agent are chained, since Bedrock rejects concurrent updates of an
+agent, while independent agents, Lambda functions and aliases are created concurrently:
+
+    >>> from src.utils.bedrock_agent_helper import AgentsForAmazonBedrock
+    >>> from src.utils.provisioning_planner import plan_multi_agent_system
+    >>> plan = plan_multi_agent_system(
+    ...     AgentsForAmazonBedrock(), collaborators=[...], supervisor={...}, max_workers=6
+    ... )
+    >>> results = plan.run()
+    >>> supervisor_alias_id, supervisor_alias_arn = results["alias:mortgages_assistant"]
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_ALIAS_NAME = "with-code-ag"
+DEFAULT_SUPERVISOR_ALIAS_NAME = "multi-agent"
+
+
+class ProvisioningError(Exception):
+    """Raised when one or more steps of a ProvisioningPlan failed."""
+
+    def __init__(self, message: str, failed_steps: List["ProvisioningStep"]):
+        super().__init__(message)
+        self.failed_steps = failed_steps
+
+
+@dataclass
+class ProvisioningStep:
+    """A node of the provisioning DAG. The action is called with the results of all finished steps."""
+
+    name: str
+    action: Callable[[Dict[str, Any]], Any]
+    depends_on: List[str] = field(default_factory=list)
+    status: str = "PENDING"  # PENDING, RUNNING, DONE, FAILED or SKIPPED
+    result: Any = None
+    error: Optional[BaseException] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class ProvisioningPlan:
+    """Runs provisioning steps concurrently in dependency order."""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, verbose: bool = True):
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.steps: Dict[str, ProvisioningStep] = {}
+        self.results: Dict[str, Any] = {}
+        self._started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_step(
+        self,
+        name: str,
+        action: Callable[[Dict[str, Any]], Any],
+        depends_on: List[Optional[str]] = None,
+    ) -> str:
+        """Adds a step to the plan.
+
+        Args:
+            name (str): unique name of the step, e.g. "agent:mortgages_assistant"
+            action (Callable): called with the results of the finished steps, its return value becomes the
+            result of this step
+            depends_on (List[str], Optional): names of the steps that must be done first, None entries are ignored
+
+        Returns:
+            str: the name of the step, to be used in depends_on of later steps
+        """
+        if name in self.steps:
+            raise ValueError(f"Step {name} is already part of the plan")
+        self.steps[name] = ProvisioningStep(
+            name=name,
+            action=action,
+            depends_on=[_dep for _dep in (depends_on or []) if _dep is not None],
+        )
+        return name
+
+    def validate(self) -> List[str]:
+        """Checks the plan for unknown dependencies and cycles.
+
+        Returns:
+            List[str]: step names in a valid execution order
+        """
+        for _step in self.steps.values():
+            for _dep in _step.depends_on:
+                if _dep not in self.steps:
+                    raise ValueError(f"Step {_step.name} depends on unknown step {_dep}")
+
+        _remaining = {_name: set(_step.depends_on) for _name, _step in self.steps.items()}
+        _order = []
+        while _remaining:
+            _ready = [_name for _name, _deps in _remaining.items() if not _deps]
+            if not _ready:
+                raise ValueError(f"Dependency cycle between steps: {sorted(_remaining)}")
+            for _name in _ready:
+                del _remaining[_name]
+                _order.append(_name)
+            for _deps in _remaining.values():
+                _deps.difference_update(_ready)
+        return _order
+
+    def _log(self, message: str):
+        if self.verbose:
+            with self._lock:
+                print(f"[{time.monotonic() - self._started_at:7.1f}s] {message}")
+
+    def _run_step(self, step: ProvisioningStep) -> Any:
+        step.started_at = time.monotonic()
+        self._log(f"start  {step.name}")
+        try:
+            return step.action(self.results)
+        finally:
+            step.finished_at = time.monotonic()
+
+    def run(self) -> Dict[str, Any]:
+        """Runs all steps, at most max_workers at a time.
+
+        No new steps are started once a step fails. Steps already running are allowed to finish, and the
+        steps depending on the failed ones are marked as SKIPPED.
+
+        Returns:
+            Dict[str, Any]: result of every step, by step name
+        """
+        self.validate()
+        self._started_at = time.monotonic()
+        _failed = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            _running = {}
+            while True:
+                if not _failed:
+                    for _step in self.steps.values():
+                        if _step.status == "PENDING" and all(
+                            self.steps[_dep].status == "DONE" for _dep in _step.depends_on
+                        ):
+                            _step.status = "RUNNING"
+                            _running[executor.submit(self._run_step, _step)] = _step
+                if not _running:
+                    break
+
+                _done, _ = wait(_running, return_when=FIRST_COMPLETED)
+                for _future in _done:
+                    _step = _running.pop(_future)
+                    try:
+                        _step.result = _future.result()
+                    except Exception as e:
+                        _step.status = "FAILED"
+                        _step.error = e
+                        _failed.append(_step)
+                        self._log(f"FAILED {_step.name}: {e}")
+                    else:
+                        self.results[_step.name] = _step.result
+                        _step.status = "DONE"
+                        self._log(f"done   {_step.name} ({_step.duration:.1f}s)")
+
+        for _step in self.steps.values():
+            if _step.status == "PENDING":
+                _step.status = "SKIPPED"
+
+        if self.verbose:
+            self.print_timeline()
+
+        if _failed:
+            raise ProvisioningError(
+                f"{len(_failed)} provisioning step(s) failed: "
+                + ", ".join(f"{_step.name} ({_step.error})" for _step in _failed),
+                failed_steps=_failed,
+            )
+        return self.results
+
+    def timeline(self) -> List[Dict]:
+        """Returns start offset, duration and status of each step, ordered by start time."""
+        _rows = []
+        for _step in self.steps.values():
+            _rows.append(
+                {
+                    "step": _step.name,
+                    "status": _step.status,
+                    "start": (None if _step.started_at is None else _step.started_at - self._started_at),
+                    "duration": _step.duration,
+                }
+            )
+        return sorted(_rows, key=lambda _row: (_row["start"] is None, _row["start"] or 0))
+
+    def print_timeline(self, width: int = 40):
+        """Prints a Gantt style timeline of the plan's steps."""
+        _rows = self.timeline()
+        _total = max(
+            [_row["start"] + _row["duration"] for _row in _rows if _row["duration"] is not None] or [0]
+        )
+        _name_width = max([len(_row["step"]) for _row in _rows] or [0])
+        print(f"\nProvisioning timeline, {_total:.1f}s total:")
+        for _row in _rows:
+            if _row["duration"] is None:
+                _bar = ""
+                _times = ""
+            else:
+                _scale = width / _total if _total else 0
+                _offset = int(_row["start"] * _scale)
+                _bar = " " * _offset + "#" * max(1, int(_row["duration"] * _scale))
+                _times = f"{_row['start']:7.1f}s +{_row['duration']:.1f}s"
+            print(f"  {_row['step']:<{_name_width}}  {_row['status']:<7}  |{_bar:<{width}}| {_times}")
+
+
+def _agent_steps(
+    plan: ProvisioningPlan,
+    agents_helper,
+    spec: Dict,
+    role_step: str,
+    collaboration: str = "DISABLED",
+    final_changes: List[tuple] = (),
+) -> str:
+    """Adds the steps that create, configure, prepare and alias one agent. Returns the alias step."""
+    _name = spec["name"]
+    _bedrock_agent_client = agents_helper._bedrock_agent_client
+
+    def _agent_id(results):
+        return results[f"agent:{_name}"]
+
+    def create_agent(results):
+        _agent_id, _, _ = agents_helper.create_agent(
+            _name,
+            spec.get("description", spec["instructions"][0:199]),
+            spec["instructions"],
+            spec["model_ids"],
+            agent_collaboration=collaboration,
+            routing_classifier_model=spec.get("routing_classifier_model"),
+            guardrail_id=spec.get("guardrail_id"),
+            agent_role_arn=results[role_step],
+        )
+        return _agent_id
+
+    # Every change to the agent's DRAFT version waits for the previous one
+    _last = plan.add_step(f"agent:{_name}", create_agent, [role_step])
+
+    def modify(step_name, action, depends_on=()):
+        nonlocal _last
+
+        def _step(results):
+            agents_helper.wait_agent_status_update(_agent_id(results))
+            return action(results)
+
+        _last = plan.add_step(step_name, _step, [_last, *depends_on])
+
+    if spec.get("code_interpretation"):
+        modify(
+            f"code_interpreter:{_name}",
+            lambda results: _bedrock_agent_client.create_agent_action_group(
+                agentId=_agent_id(results),
+                agentVersion="DRAFT",
+                actionGroupName="CodeInterpreterAction",
+                parentActionGroupSignature="AMAZON.CodeInterpreter",
+                actionGroupState="ENABLED",
+            ),
+        )
+
+    for _action_group in spec.get("action_groups", []):
+        _ag_name = _action_group["name"]
+        _lambda_step = None
+
+        if "source_code_file" in _action_group:
+            _function_name = _action_group["lambda_function_name"]
+
+            def create_lambda(results, _action_group=_action_group, _function_name=_function_name):
+                return agents_helper.create_lambda(
+                    _name,
+                    _function_name,
+                    _action_group["source_code_file"],
+                    additional_function_iam_policy=_action_group.get("additional_function_iam_policy"),
+                    sub_agent_arns=_action_group.get("sub_agent_arns"),
+                    dynamo_args=_action_group.get("dynamo_args"),
+                )
+
+            # Lambdas only need the agent to exist, so they are created alongside other changes
+            _lambda_step = plan.add_step(f"lambda:{_function_name}", create_lambda, [f"agent:{_name}"])
+
+        def create_action_group(results, _action_group=_action_group, _lambda_step=_lambda_step):
+            if _action_group.get("return_control"):
+                _executor = {"customControl": "RETURN_CONTROL"}
+            else:
+                _executor = {"lambda": results[_lambda_step] if _lambda_step else _action_group["lambda_arn"]}
+            return _bedrock_agent_client.create_agent_action_group(
+                agentId=_agent_id(results),
+                agentVersion="DRAFT",
+                actionGroupExecutor=_executor,
+                actionGroupName=_ag_name,
+                functionSchema={"functions": _action_group["functions"]},
+                description=_action_group.get("description", _ag_name),
+            )
+
+        modify(
+            f"action_group:{_name}:{_ag_name}", create_action_group, [_lambda_step] if _lambda_step else []
+        )
+
+    for _kb in spec.get("knowledge_bases", []):
+        modify(
+            f"knowledge_base:{_name}:{_kb['kb_id']}",
+            lambda results, _kb=_kb: _bedrock_agent_client.associate_agent_knowledge_base(
+                agentId=_agent_id(results),
+                agentVersion="DRAFT",
+                description=_kb.get("description", " "),
+                knowledgeBaseId=_kb["kb_id"],
+                knowledgeBaseState="ENABLED",
+            ),
+        )
+
+    # e.g. the supervisor's collaborator association, which has to wait for other agents
+    for _step_name, _action, _depends_on in final_changes:
+        modify(_step_name, _action, _depends_on)
+
+    def prepare(results):
+        agents_helper.wait_agent_status_update(_agent_id(results))
+        _bedrock_agent_client.prepare_agent(agentId=_agent_id(results))
+        agents_helper.wait_agent_status_update(_agent_id(results))
+
+    plan.add_step(f"prepare:{_name}", prepare, [_last])
+
+    def create_alias(results):
+        _alias_id, _alias_arn = agents_helper.create_agent_alias(
+            _agent_id(results), spec.get("alias_name", DEFAULT_ALIAS_NAME)
+        )
+        agents_helper.wait_agent_alias_status_update(_agent_id(results), _alias_id)
+        return _alias_id, _alias_arn
+
+    return plan.add_step(f"alias:{_name}", create_alias, [f"prepare:{_name}"])
+
+
+def plan_multi_agent_system(
+    agents_helper,
+    collaborators: List[Dict],
+    supervisor: Dict = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    verbose: bool = True,
+) -> ProvisioningPlan:
+    """Builds the provisioning plan of a supervisor and its collaborator agents.
+
+    Each agent is described by a dict with the keys name, instructions and model_ids, and optionally
+    description, guardrail_id, code_interpretation, alias_name and:
+
+    - action_groups: list of dicts with name, functions and description, plus either source_code_file and
+      lambda_function_name to create a Lambda, lambda_arn for an existing one, or return_control=True
+    - knowledge_bases: list of dicts with kb_id and description
+
+    The supervisor additionally takes collaboration_type (defaults to SUPERVISOR), routing_classifier_model
+    and collaborators, a list of dicts with name (of a collaborator agent), instructions and optionally
+    association_name and relay_conversation_history.
+
+    Args:
+        agents_helper (AgentsForAmazonBedrock): helper used to call Bedrock, IAM and Lambda
+        collaborators (List[Dict]): specs of the collaborator agents
+        supervisor (Dict, Optional): spec of the supervisor agent
+        max_workers (int, Optional): maximum number of steps that run at the same time
+        verbose (bool, Optional): whether to print progress and the timeline
+
+    Returns:
+        ProvisioningPlan: the plan; results of run() are keyed by step, e.g. "agent:<name>" holds the agent
+        id and "alias:<name>" the (alias id, alias ARN) tuple
+    """
+    plan = ProvisioningPlan(max_workers=max_workers, verbose=verbose)
+
+    # All agents share the default execution role, so it is created once
+    _model_ids = sorted(
+        {
+            _model
+            for _spec in collaborators + ([supervisor] if supervisor else [])
+            for _model in _spec["model_ids"]
+        }
+    )
+    _role_step = plan.add_step(
+        "role:agents",
+        lambda results: agents_helper._create_agent_role(
+            "agents", _model_ids, reuse_default=True, verbose=False
+        ),
+    )
+
+    _collaborator_aliases = {
+        _spec["name"]: _agent_steps(plan, agents_helper, _spec, _role_step) for _spec in collaborators
+    }
+
+    if supervisor is None:
+        return plan
+
+    _name = supervisor["name"]
+    _bedrock_agent_client = agents_helper._bedrock_agent_client
+    _associations = supervisor.get("collaborators", [])
+    for _association in _associations:
+        if _association["name"] not in _collaborator_aliases:
+            raise ValueError(f"{_association['name']} is not one of the collaborators of this plan")
+
+    def associate_collaborators(results):
+        _supervisor_id = results[f"agent:{_name}"]
+        for _association in _associations:
+            agents_helper.wait_agent_status_update(_supervisor_id)
+            _bedrock_agent_client.associate_agent_collaborator(
+                agentId=_supervisor_id,
+                agentVersion="DRAFT",
+                agentDescriptor={"aliasArn": results[_collaborator_aliases[_association["name"]]][1]},
+                collaboratorName=_association.get("association_name", _association["name"]),
+                collaborationInstruction=_association["instructions"],
+                relayConversationHistory=_association.get("relay_conversation_history", "DISABLED"),
+            )
+
+    # The supervisor agent is created alongside its collaborators, only the association waits for them
+    _supervisor_spec = dict(supervisor)
+    _supervisor_spec.setdefault("alias_name", DEFAULT_SUPERVISOR_ALIAS_NAME)
+    _agent_steps(
+        plan,
+        agents_helper,
+        _supervisor_spec,
+        _role_step,
+        collaboration=supervisor.get("collaboration_type", "SUPERVISOR"),
+        final_changes=[
+            (
+                f"collaborators:{_name}",
+                associate_collaborators,
+                [_collaborator_aliases[_a["name"]] for _a in _associations],
+            )
+        ],
+    )
+    return plan
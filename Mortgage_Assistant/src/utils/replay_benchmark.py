@@ -0,0 +1,72 @@
+# Copyright 2024 Amazon.com and its affiliates; all rights reserved.
+# This file is AWS Content and may not be duplicated or distributed without permission
+
+"""
+This module benchmarks AgentsForAmazonBedrock.invoke against a recorded invoke_agent session.
+
+The InlineAgent benchmark replays a recording made with RecordingClient through its own scenarios. This
+script adds the scenarios of the workshop's agents helper, which injects the replay client as its
+bedrock-agent-runtime client, with and without traces. No AWS call is made. Run it from the
+Mortgage_Assistant directory:
+
+    python -m src.utils.replay_benchmark recording.jsonl.gz -n 50
+"""
+
+import argparse
+from typing import Callable
+
+from InlineAgent.observability.benchmark import print_results, run_benchmarks
+from InlineAgent.observability.replay import ReplayClient
+
+from src.utils.bedrock_agent_helper import AgentsForAmazonBedrock
+
+
+def agents_helper_runner(enable_trace: bool) -> Callable[[ReplayClient], Callable[[], None]]:
+    """Scenario factory for run_benchmarks: AgentsForAmazonBedrock.invoke on every recorded response"""
+
+    def create(replay: ReplayClient) -> Callable[[], None]:
+        helper = AgentsForAmazonBedrock(region_name="us-east-1")
+        helper._bedrock_agent_runtime_client = replay
+
+        def run():
+            replay.reset()
+            for _ in replay.responses:
+                helper.invoke(
+                    input_text="benchmark",
+                    agent_id="replay",
+                    agent_alias_id="replay",
+                    session_id="benchmark",
+                    enable_trace=enable_trace,
+                )
+
+        return run
+
+    return create
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark AgentsForAmazonBedrock.invoke against a recording"
+    )
+    parser.add_argument("recording", help="invoke_agent session written by RecordingClient")
+    parser.add_argument("--iterations", "-n", type=int, default=20)
+    parser.add_argument("--timing", action="store_true", help="Reproduce recorded event timing")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print_results(
+        run_benchmarks(
+            path=args.recording,
+            iterations=args.iterations,
+            timing=args.timing,
+            speed=args.speed,
+            scenarios={
+                "agents_helper[no trace]": agents_helper_runner(enable_trace=False),
+                "agents_helper[trace]": agents_helper_runner(enable_trace=True),
+            },
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
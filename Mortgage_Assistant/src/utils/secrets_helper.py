@@ -1,7 +1,66 @@
 import boto3
 import json
+import threading
+import time
 from botocore.exceptions import ClientError
 
+# Seconds a secret is served from the process cache before it is refreshed in the background
+DEFAULT_SECRET_TTL = 300
+# Seconds to wait before trying again when a background refresh failed
+SECRET_RETRY_INTERVAL = 30
+
+
+class _CachedSecret:
+    """
+    A secret value shared by every SecretsHelper of the process.
+    
+    Once loaded, the value is always returned right away. When it is older than its TTL, a
+    single background thread fetches it again and the stale value is served until it is done,
+    so callers never wait on Secrets Manager after the first load.
+    """
+    
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._next_attempt = 0.0
+        self._refreshing = False
+    
+    def get(self, ttl):
+        with self._lock:
+            if self._value is None:
+                # first load, or the secret was missing, callers have to wait
+                self._value = self._fetch()
+                self._loaded_at = time.monotonic()
+                return self._value
+            _now = time.monotonic()
+            if _now - self._loaded_at > ttl and _now >= self._next_attempt and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+            return self._value
+    
+    def _refresh(self):
+        try:
+            _value = self._fetch()
+        except Exception as e:
+            _value = None
+            print(f"Error refreshing secret: {e}")
+        with self._lock:
+            if _value is not None:
+                self._value = _value
+                self._loaded_at = time.monotonic()
+            else:
+                # keep serving the last known value
+                self._next_attempt = time.monotonic() + SECRET_RETRY_INTERVAL
+            self._refreshing = False
+
+
+# (region, secret name) -> _CachedSecret
+_secret_cache = {}
+_secret_cache_lock = threading.Lock()
+
+
 class SecretsHelper:
     """
     A helper class to manage AWS Secrets Manager operations.
@@ -64,6 +123,7 @@ class SecretsHelper:
                 SecretString=json.dumps(secret_data)
             )
             print(f"Successfully added/updated key '{key}' in secret '{secret_name}'")
+            self._invalidate(secret_name)
             
         except ClientError as e:
             error_code = e.response.get('Error', {}).get('Code', '')
@@ -79,6 +139,7 @@ class SecretsHelper:
                     SecretString=json.dumps(new_secret_data)
                 )
                 print(f"Successfully created secret '{secret_name}' with key '{key}'")
+                self._invalidate(secret_name)
             else:
                 # Handle other exceptions
                 print(f"Error: {e}")
@@ -86,16 +147,39 @@ class SecretsHelper:
         
         return True
     
-    def get_secret(self, secret_name):
+    def get_secret(self, secret_name, ttl=DEFAULT_SECRET_TTL):
         """
         Retrieves a secret from AWS Secrets Manager.
         
+        The secret is cached for the whole process. After the first call it is returned without
+        a network call, and it is refreshed in the background once it is older than ttl.
+        
         Args:
             secret_name (str): The name of the secret to retrieve
+            ttl (int, optional): Seconds before the cached secret is refreshed.
+                                 Set to 0 to always fetch it. Defaults to DEFAULT_SECRET_TTL.
             
         Returns:
             dict: The secret data as a dictionary, or None if not found
         """
+        if ttl == 0:
+            return self._fetch_secret(secret_name)
+        
+        with _secret_cache_lock:
+            _cached = _secret_cache.get((self.region_name, secret_name))
+            if _cached is None:
+                _cached = _secret_cache[(self.region_name, secret_name)] = _CachedSecret(
+                    lambda: self._fetch_secret(secret_name)
+                )
+        return _cached.get(ttl)
+    
+    def _invalidate(self, secret_name):
+        """Drops the cached value of a secret that this process changed."""
+        with _secret_cache_lock:
+            _secret_cache.pop((self.region_name, secret_name), None)
+    
+    def _fetch_secret(self, secret_name):
+        """Retrieves a secret from AWS Secrets Manager, bypassing the cache."""
         try:
             get_secret_response = self.client.get_secret_value(SecretId=secret_name)
             
@@ -128,6 +212,7 @@ class SecretsHelper:
                 RecoveryWindowInDays=recovery_window_in_days
             )
             print(f"Secret '{secret_name}' scheduled for deletion in {recovery_window_in_days} days")
+            self._invalidate(secret_name)
             return True
         except ClientError as e:
             print(f"Error deleting secret: {e}")
@@ -0,0 +1,338 @@
+import itertools
+import threading
+import time
+import unittest
+
+from src.utils.provisioning_planner import ProvisioningError, ProvisioningPlan, plan_multi_agent_system
+from src.utils.waiters import Backoff, wait_until
+
+# Seconds each stubbed API call takes, and that an agent stays in a transitional state afterwards
+LATENCY = 0.05
+FAST_BACKOFF = Backoff(min_delay=0.01, max_delay=0.02, jitter=0.0, timeout=5.0)
+
+
+class BedrockAgentStub:
+    """bedrock-agent API that, like Bedrock, rejects changes to an agent still in an *ING state."""
+
+    def __init__(self):
+        self.agents = {}
+        self.calls = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _status(self, agent_id):
+        _agent = self.agents[agent_id]
+        if _agent["busy_until"] is not None and time.monotonic() >= _agent["busy_until"]:
+            _agent["status"], _agent["busy_until"] = _agent["next_status"], None
+        return _agent["status"]
+
+    def _transition(self, agent_id, status, next_status):
+        _agent = self.agents[agent_id]
+        _agent["status"], _agent["next_status"] = status, next_status
+        _agent["busy_until"] = time.monotonic() + LATENCY
+
+    def _modify(self, agent_id, operation, status="UPDATING", next_status="NOT_PREPARED"):
+        time.sleep(LATENCY)
+        with self._lock:
+            if self._status(agent_id).endswith("ING"):
+                raise RuntimeError(f"ConflictException: {operation} while {self.agents[agent_id]['status']}")
+            self._transition(agent_id, status, next_status)
+            self.calls.append((operation, agent_id))
+
+    def create_agent(self, agentName, **kwargs):
+        time.sleep(LATENCY)
+        with self._lock:
+            _agent_id = f"AGENT{next(self._ids)}"
+            self.agents[_agent_id] = {"name": agentName, "collaborators": [], "busy_until": None, **kwargs}
+            self._transition(_agent_id, "CREATING", "NOT_PREPARED")
+        return _agent_id
+
+    def get_agent(self, agentId):
+        with self._lock:
+            return {"agent": {"agentId": agentId, "agentStatus": self._status(agentId)}}
+
+    def create_agent_action_group(self, agentId, **kwargs):
+        self._modify(agentId, f"action_group:{kwargs['actionGroupName']}")
+
+    def associate_agent_knowledge_base(self, agentId, **kwargs):
+        self._modify(agentId, f"knowledge_base:{kwargs['knowledgeBaseId']}")
+
+    def associate_agent_collaborator(self, agentId, agentDescriptor, **kwargs):
+        self._modify(agentId, f"collaborator:{kwargs['collaboratorName']}")
+        self.agents[agentId]["collaborators"].append(agentDescriptor["aliasArn"])
+
+    def prepare_agent(self, agentId):
+        self._modify(agentId, "prepare", "PREPARING", "PREPARED")
+
+    def create_agent_alias(self, agentAliasName, agentId):
+        time.sleep(LATENCY)
+        with self._lock:
+            if self._status(agentId) != "PREPARED":
+                raise RuntimeError(
+                    f"ValidationException: alias of agent in state {self.agents[agentId]['status']}"
+                )
+        return (
+            f"ALIAS{agentId}",
+            f"arn:aws:bedrock:us-east-1:123456789012:agent-alias/{agentId}/ALIAS{agentId}",
+        )
+
+
+class IamStub:
+    def __init__(self):
+        self.roles = []
+
+    def create_role(self, RoleName):
+        time.sleep(LATENCY)
+        self.roles.append(RoleName)
+        return f"arn:aws:iam::123456789012:role/{RoleName}"
+
+
+class LambdaStub:
+    def __init__(self):
+        self.functions = []
+
+    def create_function(self, FunctionName):
+        time.sleep(LATENCY)
+        self.functions.append(FunctionName)
+        return f"arn:aws:lambda:us-east-1:123456789012:function:{FunctionName}"
+
+
+class StubAgentsHelper:
+    """The AgentsForAmazonBedrock methods used by the planner, on top of the stubbed APIs."""
+
+    def __init__(self):
+        self._bedrock_agent_client = BedrockAgentStub()
+        self._iam_client = IamStub()
+        self._lambda_client = LambdaStub()
+
+    def _create_agent_role(self, agent_name, model_ids, reuse_default=False, verbose=False):
+        return self._iam_client.create_role(RoleName=f"AmazonBedrockExecutionRoleForAgents_{agent_name}")
+
+    def create_agent(
+        self,
+        agent_name,
+        agent_description,
+        agent_instructions,
+        model_ids,
+        agent_collaboration="DISABLED",
+        **kwargs,
+    ):
+        _agent_id = self._bedrock_agent_client.create_agent(
+            agentName=agent_name,
+            agentCollaboration=agent_collaboration,
+            agentResourceRoleArn=kwargs["agent_role_arn"],
+        )
+        return _agent_id, None, None
+
+    def create_lambda(self, agent_name, lambda_function_name, source_code_file, **kwargs):
+        return self._lambda_client.create_function(FunctionName=lambda_function_name)
+
+    def wait_agent_status_update(self, agent_id):
+        wait_until(
+            lambda: self._bedrock_agent_client.get_agent(agentId=agent_id)["agent"]["agentStatus"],
+            lambda status: not status.endswith("ING"),
+            backoff=FAST_BACKOFF,
+        )
+
+    def create_agent_alias(self, agent_id, alias_name):
+        return self._bedrock_agent_client.create_agent_alias(agentAliasName=alias_name, agentId=agent_id)
+
+    def wait_agent_alias_status_update(self, agent_id, agent_alias_id):
+        pass
+
+
+FUNCTIONS = [{"name": "get_balance", "description": "Balance of a mortgage", "parameters": {}}]
+
+
+def collaborator_spec(index, knowledge_base=False):
+    return {
+        "name": f"collaborator_{index}",
+        "instructions": "Answer questions about mortgages.",
+        "model_ids": ["model"],
+        "action_groups": [
+            {
+                "name": "actions",
+                "functions": FUNCTIONS,
+                "source_code_file": "actions.py",
+                "lambda_function_name": f"collaborator_{index}_ag",
+            }
+        ],
+        "knowledge_bases": [{"kb_id": "KB1", "description": "Guidelines"}] if knowledge_base else [],
+    }
+
+
+def supervisor_spec(collaborators):
+    return {
+        "name": "supervisor",
+        "instructions": "Route questions to the right collaborator.",
+        "model_ids": ["supervisor-model"],
+        "action_groups": [{"name": "confirm", "functions": FUNCTIONS, "return_control": True}],
+        "collaborators": [{"name": _spec["name"], "instructions": "Ask it."} for _spec in collaborators],
+    }
+
+
+def max_concurrency(steps):
+    """Largest number of steps that were running at the same time."""
+    _events = []
+    for _step in steps:
+        if _step.started_at is not None:
+            _events += [(_step.started_at, 1), (_step.finished_at, -1)]
+    _running = _max = 0
+    for _, _delta in sorted(_events, key=lambda _event: (_event[0], _event[1])):
+        _running += _delta
+        _max = max(_max, _running)
+    return _max
+
+
+class TestProvisioningPlan(unittest.TestCase):
+
+    def test_validate_returns_dependency_order(self):
+        plan = ProvisioningPlan(verbose=False)
+        plan.add_step("c", lambda results: None, ["a", "b"])
+        plan.add_step("a", lambda results: None)
+        plan.add_step("b", lambda results: None, ["a", None])
+
+        self.assertEqual(plan.validate(), ["a", "b", "c"])
+
+    def test_validate_rejects_unknown_steps_and_cycles(self):
+        plan = ProvisioningPlan(verbose=False)
+        plan.add_step("a", lambda results: None, ["missing"])
+        with self.assertRaises(ValueError):
+            plan.validate()
+
+        plan = ProvisioningPlan(verbose=False)
+        plan.add_step("a", lambda results: None, ["b"])
+        plan.add_step("b", lambda results: None, ["a"])
+        with self.assertRaises(ValueError):
+            plan.run()
+
+        with self.assertRaises(ValueError):
+            plan.add_step("a", lambda results: None)
+
+    def test_independent_steps_run_in_parallel_levels(self):
+        plan = ProvisioningPlan(max_workers=2, verbose=False)
+        for _name in ["a", "b", "c", "d"]:
+            plan.add_step(_name, lambda results: time.sleep(LATENCY))
+        plan.add_step("join", lambda results: sorted(results), ["a", "b", "c", "d"])
+
+        started = time.monotonic()
+        results = plan.run()
+
+        self.assertEqual(results["join"], ["a", "b", "c", "d"])
+        self.assertEqual(max_concurrency(plan.steps.values()), 2)
+        # two levels of two steps, instead of four steps one after the other
+        self.assertLess(time.monotonic() - started, 3.5 * LATENCY)
+
+    def test_failure_skips_dependents(self):
+        def fail(results):
+            raise RuntimeError("quota exceeded")
+
+        plan = ProvisioningPlan(max_workers=2, verbose=False)
+        plan.add_step("fails", fail)
+        plan.add_step("slow", lambda results: time.sleep(LATENCY))
+        plan.add_step("dependent", lambda results: None, ["fails"])
+        plan.add_step("after_slow", lambda results: None, ["slow"])
+
+        with self.assertRaises(ProvisioningError) as context:
+            plan.run()
+
+        self.assertEqual([_step.name for _step in context.exception.failed_steps], ["fails"])
+        self.assertEqual(
+            {_name: _step.status for _name, _step in plan.steps.items()},
+            {"fails": "FAILED", "slow": "DONE", "dependent": "SKIPPED", "after_slow": "SKIPPED"},
+        )
+
+
+class TestPlanMultiAgentSystem(unittest.TestCase):
+
+    def setUp(self):
+        self.helper = StubAgentsHelper()
+        self.collaborators = [collaborator_spec(_index, knowledge_base=_index == 0) for _index in range(4)]
+
+    def plan(self, supervisor=True, max_workers=6):
+        return plan_multi_agent_system(
+            self.helper,
+            self.collaborators,
+            supervisor_spec(self.collaborators) if supervisor else None,
+            max_workers=max_workers,
+            verbose=False,
+        )
+
+    def test_steps_run_after_their_dependencies(self):
+        plan = self.plan()
+        results = plan.run()
+
+        for _step in plan.steps.values():
+            self.assertEqual(_step.status, "DONE", _step.name)
+            for _dep in _step.depends_on:
+                self.assertGreaterEqual(
+                    _step.started_at, plan.steps[_dep].finished_at, f"{_step.name} {_dep}"
+                )
+
+        # one shared role, one Lambda per collaborator, and every collaborator associated to the supervisor
+        self.assertEqual(self.helper._iam_client.roles, ["AmazonBedrockExecutionRoleForAgents_agents"])
+        self.assertEqual(
+            sorted(self.helper._lambda_client.functions), [f"collaborator_{_i}_ag" for _i in range(4)]
+        )
+        _supervisor = self.helper._bedrock_agent_client.agents[results["agent:supervisor"]]
+        self.assertEqual(_supervisor["agentCollaboration"], "SUPERVISOR")
+        self.assertEqual(
+            sorted(_supervisor["collaborators"]),
+            sorted(results[f"alias:{_spec['name']}"][1] for _spec in self.collaborators),
+        )
+
+    def test_changes_to_an_agent_are_chained(self):
+        plan = self.plan()
+        plan.run()
+
+        # the stub raises on concurrent changes, so each agent saw its changes one at a time, prepare last
+        _calls = self.helper._bedrock_agent_client.calls
+        for _agent_id in self.helper._bedrock_agent_client.agents:
+            _operations = [_operation for _operation, _id in _calls if _id == _agent_id]
+            self.assertEqual(_operations[-1], "prepare")
+        self.assertLessEqual(
+            plan.steps["collaborators:supervisor"].finished_at, plan.steps["prepare:supervisor"].started_at
+        )
+
+    def test_independent_agents_are_created_concurrently(self):
+        plan = self.plan(max_workers=6)
+        plan.run()
+
+        _agent_steps = [_step for _name, _step in plan.steps.items() if _name.startswith("agent:")]
+        self.assertEqual(len(_agent_steps), 5)
+        self.assertEqual(max_concurrency(_agent_steps), 5)
+        self.assertLessEqual(max_concurrency(plan.steps.values()), 6)
+
+        _supervisor_created = plan.steps["agent:supervisor"].finished_at
+        _last_collaborator_alias = max(
+            plan.steps[f"alias:{_spec['name']}"].finished_at for _spec in self.collaborators
+        )
+        # the supervisor agent does not wait for its collaborators, only the association does
+        self.assertLess(_supervisor_created, _last_collaborator_alias)
+
+    def test_failed_lambda_stops_its_agent(self):
+        def fail(FunctionName):
+            time.sleep(LATENCY)
+            raise RuntimeError("CodeStorageExceededException")
+
+        self.helper._lambda_client.create_function = fail
+
+        plan = self.plan()
+        with self.assertRaises(ProvisioningError) as context:
+            plan.run()
+
+        self.assertTrue(all(_step.name.startswith("lambda:") for _step in context.exception.failed_steps))
+        for _spec in self.collaborators:
+            self.assertEqual(plan.steps[f"action_group:{_spec['name']}:actions"].status, "SKIPPED")
+            self.assertEqual(plan.steps[f"alias:{_spec['name']}"].status, "SKIPPED")
+        self.assertEqual(plan.steps["collaborators:supervisor"].status, "SKIPPED")
+        self.assertNotIn("alias:supervisor", plan.results)
+
+    def test_unknown_collaborator_is_rejected(self):
+        supervisor = supervisor_spec(self.collaborators + [{"name": "missing"}])
+        with self.assertRaises(ValueError):
+            plan_multi_agent_system(self.helper, self.collaborators, supervisor, verbose=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
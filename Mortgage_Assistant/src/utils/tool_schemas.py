@@ -0,0 +1,186 @@
+# Copyright 2024 Amazon.com and its affiliates; all rights reserved.
+# This file is AWS Content and may not be duplicated or distributed without permission
+
+"""
+This module contains a registry that compiles the schema of each tool function once.
+
+Deriving a Bedrock toolSpec or action group function schema from a Python function means building a
+pydantic model or walking its type hints, which dominates start up time when hundreds of tools are
+loaded. The registry keys every schema by a hash of the function's source code and of the types of its
+parameters (plus the name, description and kind of schema), keeps it in memory, and persists it to a
+JSON file so that later processes skip the derivation entirely. Editing a function, or a pydantic model
+or Enum it takes (including nested models and base classes), changes its hash, so stale schemas are
+never returned.
+
+    >>> from src.utils.tool_schemas import tool_schema_registry
+    >>> spec = tool_schema_registry.get(my_function, lambda: build_spec(my_function), "toolSpec", name)
+    >>> tool_schema_registry.save()  # also done when the process exits
+"""
+
+import atexit
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import typing
+from typing import Any, Callable, Dict, Iterator, Optional
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "bedrock-agent-tools", "schemas.json")
+# Bump when the way schemas are derived changes, so persisted schemas are rebuilt
+SCHEMA_VERSION = "1"
+
+
+# Modules whose classes do not change between versions of a tool, so their source is not hashed
+_LIBRARY_MODULES = ("builtins", "typing", "enum", "abc", "pydantic")
+
+
+def _annotation_types(annotation: Any) -> Iterator[type]:
+    """Classes in an annotation, including the arguments of generics such as List[Model] or Optional[Enum]."""
+    if isinstance(annotation, type):
+        yield annotation
+    for _arg in typing.get_args(annotation):
+        yield from _annotation_types(_arg)
+
+
+def _is_library_type(_type: type) -> bool:
+    return _type.__module__.split(".")[0] in _LIBRARY_MODULES
+
+
+def _dependent_types(annotation: Any, seen: Dict[type, None]):
+    """Adds to seen the non-library classes of an annotation, with their bases and, recursively, the types
+    of their fields (e.g. the nested models of a pydantic model)."""
+    for _type in _annotation_types(annotation):
+        if _is_library_type(_type) or _type in seen:
+            continue
+        seen[_type] = None
+        for _base in _type.__mro__[1:]:
+            if not _is_library_type(_base):
+                _dependent_types(_base, seen)
+        try:
+            _fields = typing.get_type_hints(_type, include_extras=True)
+        except Exception:
+            _fields = getattr(_type, "__annotations__", {})
+        for _field in _fields.values():
+            _dependent_types(_field, seen)
+
+
+@functools.lru_cache(maxsize=None)
+def _type_source(_type: type) -> str:
+    """Source of a class, read once per process. Hashing it instead of e.g. a pydantic model's JSON schema
+    keeps cache hits free of schema generation."""
+    try:
+        return inspect.getsource(_type)
+    except (OSError, TypeError):
+        return repr(_type)
+
+
+def source_hash(func: Callable, *key_parts: Any) -> Optional[str]:
+    """Hex SHA-256 of the source of func, of the non-builtin types in its annotations and of the key
+    parts, or None when the source is not available (e.g. functions defined in an interactive shell)."""
+    try:
+        _source = inspect.getsource(func)
+    except (OSError, TypeError):
+        return None
+    try:
+        _annotations = typing.get_type_hints(func, include_extras=True)
+    except Exception:
+        _annotations = getattr(func, "__annotations__", {})
+    _hash = hashlib.sha256(SCHEMA_VERSION.encode())
+    _hash.update(f"{func.__module__}.{func.__qualname__}\0".encode())
+    _hash.update(_source.encode())
+    _types = {}
+    for _annotation in _annotations.values():
+        _dependent_types(_annotation, _types)
+    for _type in _types:
+        _hash.update(f"\0{_type.__module__}.{_type.__qualname__}\0{_type_source(_type)}".encode())
+    for _part in key_parts:
+        _hash.update(b"\0" + str(_part).encode())
+    return _hash.hexdigest()
+
+
+class ToolSchemaRegistry:
+    """Schemas of tool functions, cached in memory and in a JSON file.
+
+    Args:
+        cache_file (str, Optional): where schemas are persisted, None keeps them in memory only
+    """
+
+    def __init__(self, cache_file: Optional[str] = DEFAULT_CACHE_FILE):
+        self.cache_file = cache_file
+        self._schemas: Dict[str, Any] = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_file is None:
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                self._schemas.update(json.load(f))
+        except (OSError, ValueError):
+            # a missing or corrupted cache is rebuilt
+            pass
+
+    def get(self, func: Callable, build: Callable[[], Any], *key_parts: Any) -> Any:
+        """Returns the schema of func, calling build() only when it is not cached yet.
+
+        Args:
+            func (Callable): the tool function, whose source is hashed
+            build (Callable): derives the schema, must return JSON serializable data
+            key_parts: anything else the schema depends on, such as the tool name and description
+
+        Returns:
+            Any: the schema
+        """
+        _key = source_hash(func, *key_parts)
+        if _key is None:
+            return build()
+        with self._lock:
+            self._load()
+            if _key in self._schemas:
+                return self._schemas[_key]
+        _schema = build()
+        with self._lock:
+            self._schemas[_key] = _schema
+            self._dirty = True
+        return _schema
+
+    def save(self):
+        """Writes the schemas built by this process to the cache file."""
+        if self.cache_file is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            _schemas = dict(self._schemas)
+            self._dirty = False
+        # write then rename, so concurrent processes never read a partial file
+        _tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(_tmp_path, "w") as f:
+                json.dump(_schemas, f)
+            os.replace(_tmp_path, self.cache_file)
+        except OSError:
+            # e.g. a read-only home directory, the schemas are rebuilt by the next process
+            if os.path.exists(_tmp_path):
+                os.remove(_tmp_path)
+
+    def clear(self):
+        """Forgets all schemas, in memory and on disk."""
+        with self._lock:
+            self._schemas = {}
+            self._loaded = True
+            self._dirty = False
+        if self.cache_file is not None and os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+
+
+tool_schema_registry = ToolSchemaRegistry()
+atexit.register(tool_schema_registry.save)
@@ -0,0 +1,189 @@
+# Copyright 2024 Amazon.com and its affiliates; all rights reserved.
+# This file is AWS Content and may not be duplicated or distributed without permission
+
+"""
+This module contains waiters shared by the Agents and Knowledge Bases helpers.
+
+Bedrock resources move through transitional states (CREATING, UPDATING, PREPARING, ...) that take anywhere
+from a second to several minutes. Instead of sleeping for the worst case, a waiter polls the resource with an
+exponential backoff: the first polls come quickly so fast transitions are picked up right away, the delay
+grows for slow ones, jitter keeps concurrent waiters from polling in lockstep, and an overall deadline turns
+a stuck resource into an error.
+
+    >>> from src.utils.waiters import Backoff, wait_until
+    >>> agent = wait_until(
+    ...     lambda: client.get_agent(agentId=agent_id)["agent"],
+    ...     lambda agent: not agent["agentStatus"].endswith("ING"),
+    ...     description=f"agent {agent_id}",
+    ... )
+
+wait_all() and the async variants wait on many resources at once.
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class WaiterTimeoutError(TimeoutError):
+    """Raised when a resource did not reach the expected state before the deadline."""
+
+    def __init__(self, message: str, last_value: Any = None):
+        super().__init__(message)
+        self.last_value = last_value
+
+
+@dataclass
+class Backoff:
+    """Delays between polls.
+
+    Args:
+        initial_delay (float): seconds to wait before the first poll, for resources that are known to stay
+        in a transitional state for a while after the call that started the transition
+        min_delay (float): delay after the first poll
+        max_delay (float): upper bound of the delay between two polls
+        multiplier (float): growth of the delay after each poll
+        jitter (float): fraction of each delay that is randomized
+        timeout (float): overall deadline in seconds, None waits forever
+    """
+
+    initial_delay: float = 0.0
+    min_delay: float = 1.0
+    max_delay: float = 15.0
+    multiplier: float = 1.5
+    jitter: float = 0.2
+    timeout: Optional[float] = 900.0
+
+    def delays(self) -> Iterator[float]:
+        """Yields the delay before each poll after the first one."""
+        _delay = self.min_delay
+        while True:
+            yield _delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            _delay = min(_delay * self.multiplier, self.max_delay)
+
+
+# Agent and alias status changes usually complete within seconds
+AGENT_BACKOFF = Backoff(min_delay=1.0, max_delay=10.0, timeout=900.0)
+# Collections, indexes and ingestion jobs take minutes
+KNOWLEDGE_BASE_BACKOFF = Backoff(min_delay=2.0, max_delay=30.0, timeout=3600.0)
+
+
+def wait_until(
+    poll: Callable[[], Any],
+    is_done: Callable[[Any], bool],
+    backoff: Backoff = None,
+    description: str = "resource",
+    on_poll: Callable[[Any], None] = None,
+) -> Any:
+    """Polls until is_done(poll()) is true.
+
+    Args:
+        poll (Callable): returns the current state of the resource
+        is_done (Callable): tells whether a state is final
+        backoff (Backoff, Optional): polling schedule, defaults to AGENT_BACKOFF
+        description (str, Optional): name of the resource for the timeout error
+        on_poll (Callable, Optional): called with every state that is not final, e.g. to report progress
+
+    Returns:
+        Any: the final state
+    """
+    backoff = backoff or AGENT_BACKOFF
+    _deadline = None if backoff.timeout is None else time.monotonic() + backoff.timeout
+    _delays = backoff.delays()
+
+    if backoff.initial_delay:
+        time.sleep(backoff.initial_delay)
+    while True:
+        _value = poll()
+        if is_done(_value):
+            return _value
+        if on_poll is not None:
+            on_poll(_value)
+
+        _delay = next(_delays)
+        if _deadline is not None:
+            _remaining = _deadline - time.monotonic()
+            if _remaining <= 0:
+                raise WaiterTimeoutError(
+                    f"Timed out after {backoff.timeout:g}s waiting for {description}, last state: {_value}",
+                    last_value=_value,
+                )
+            _delay = min(_delay, _remaining)
+        time.sleep(_delay)
+
+
+def wait_all(
+    waits: Dict[str, Tuple[Callable[[], Any], Callable[[Any], bool]]],
+    backoff: Backoff = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Dict[str, Any]:
+    """Waits on several resources at once, each with its own poll and is_done functions.
+
+    Threads are used so this also works inside a notebook, where an event loop is already running.
+
+    Args:
+        waits (Dict): (poll, is_done) by resource name
+        backoff (Backoff, Optional): polling schedule of every resource
+        max_workers (int, Optional): maximum number of resources polled in parallel
+
+    Returns:
+        Dict[str, Any]: final state of every resource, by name
+    """
+    if not waits:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(waits))) as executor:
+        _futures = {
+            _name: executor.submit(wait_until, _poll, _is_done, backoff, _name)
+            for _name, (_poll, _is_done) in waits.items()
+        }
+        return {_name: _future.result() for _name, _future in _futures.items()}
+
+
+async def async_wait_until(
+    poll: Callable[[], Any],
+    is_done: Callable[[Any], bool],
+    backoff: Backoff = None,
+    description: str = "resource",
+    on_poll: Callable[[Any], None] = None,
+) -> Any:
+    """Async variant of wait_until. Blocking poll functions, such as boto3 calls, run in a thread."""
+    backoff = backoff or AGENT_BACKOFF
+    _deadline = None if backoff.timeout is None else time.monotonic() + backoff.timeout
+    _delays = backoff.delays()
+
+    if backoff.initial_delay:
+        await asyncio.sleep(backoff.initial_delay)
+    while True:
+        _value = await asyncio.to_thread(poll)
+        if is_done(_value):
+            return _value
+        if on_poll is not None:
+            on_poll(_value)
+
+        _delay = next(_delays)
+        if _deadline is not None:
+            _remaining = _deadline - time.monotonic()
+            if _remaining <= 0:
+                raise WaiterTimeoutError(
+                    f"Timed out after {backoff.timeout:g}s waiting for {description}, last state: {_value}",
+                    last_value=_value,
+                )
+            _delay = min(_delay, _remaining)
+        await asyncio.sleep(_delay)
+
+
+async def async_wait_all(
+    waits: Dict[str, Tuple[Callable[[], Any], Callable[[Any], bool]]],
+    backoff: Backoff = None,
+) -> Dict[str, Any]:
+    """Async variant of wait_all."""
+    _names = list(waits)
+    _results = await asyncio.gather(
+        *(async_wait_until(*waits[_name], backoff=backoff, description=_name) for _name in _names)
+    )
+    return dict(zip(_names, _results))
@@ -1,10 +1,24 @@
 import streamlit as st
 import os
 import uuid
-import time
 import json
 import re
-from bedrock_utils import load_agent_config, invoke_bedrock_agent, list_bedrock_agents
+import logging
+import queue
+import threading
+import time
+from bedrock_utils import GATEWAY_URL, load_agent_config, invoke_bedrock_agent, list_bedrock_agents
+
+# Set LOG_LEVEL=DEBUG to log the agent requests, events and combined traces
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+# Messages kept in the session, older ones are dropped (and appended to a file in
+# HISTORY_SPILL_DIR, if set) so that memory and rerun time stay flat in long conversations
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "50"))
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR")
+
+# Agents or aliases answering side by side in comparison mode
+MAX_COMPARED_AGENTS = 4
 
 # Page configuration
 st.set_page_config(
@@ -24,10 +38,72 @@ if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 if "initialized" not in st.session_state:
     st.session_state.initialized = False
+if "archived_messages" not in st.session_state:
+    st.session_state.archived_messages = 0
+if "compared_agents" not in st.session_state:
+    st.session_state.compared_agents = []
+
+def history_spill_path():
+    return os.path.join(HISTORY_SPILL_DIR, f"{st.session_state.session_id}.jsonl")
+
+# Add a message to the chat history, moving the oldest ones out beyond MAX_HISTORY_MESSAGES
+def add_message(message):
+    st.session_state.messages.append(message)
+    overflow = len(st.session_state.messages) - MAX_HISTORY_MESSAGES
+    if overflow <= 0:
+        return
+    
+    spilled = st.session_state.messages[:overflow]
+    del st.session_state.messages[:overflow]
+    st.session_state.archived_messages += overflow
+    if HISTORY_SPILL_DIR:
+        try:
+            os.makedirs(HISTORY_SPILL_DIR, exist_ok=True)
+            with open(history_spill_path(), "a") as f:
+                for spilled_message in spilled:
+                    f.write(json.dumps(spilled_message) + "\n")
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Could not save chat history: {str(e)}")
 
 # Load agent configurations
 available_agents = load_agent_config()
 
+# Agents and aliases that can be compared: the configured ones, then every alias of the agents
+# in the account, so that e.g. an old and a new version of the same agent can be compared.
+# The chat gateway only serves the configured agents
+def comparison_targets():
+    targets = [
+        {"key": f"{a['id']}:{a['alias_id']}", "label": a["name"], "id": a["id"], "alias_id": a["alias_id"]}
+        for a in available_agents
+    ]
+    if GATEWAY_URL:
+        return targets
+    known_keys = {target["key"] for target in targets}
+    for agent in list_bedrock_agents():
+        for alias in agent.get("aliases", []):
+            key = f"{agent['id']}:{alias['id']}"
+            if key not in known_keys:
+                known_keys.add(key)
+                targets.append({
+                    "key": key,
+                    "label": f"{agent['name']} ({alias['name']})",
+                    "id": agent["id"],
+                    "alias_id": alias["id"]
+                })
+    return targets
+
+# One line of latency and token statistics of a compared answer
+def format_stats(stats):
+    parts = []
+    if stats.get("first_chunk") is not None:
+        parts.append(f"First chunk {stats['first_chunk']:.1f}s")
+    parts.append(f"Total {stats['total']:.1f}s")
+    if stats.get("input_tokens") is not None:
+        parts.append(f"Tokens {stats['input_tokens']:,} in / {stats['output_tokens']:,} out")
+    else:
+        parts.append("Tokens n/a")
+    return " · ".join(parts)
+
 # Sidebar for configuration
 st.sidebar.title("Bedrock Agent Configuration")
 
@@ -44,18 +120,38 @@ st.sidebar.write("")
 #         st.sidebar.warning("No Bedrock agents found in your account. Using values from Secrets Manager.")
 # except Exception as e:
 #     st.sidebar.error(f"Error checking for agents: {str(e)}")
-# Agent selection based on mode
-selected_agent = st.sidebar.selectbox(
-    "Agent Mode",
-    options=[agent["id"] for agent in available_agents],
-    format_func=lambda x: next((a["name"] for a in available_agents if a["id"] == x), x),
-    index=0 if not st.session_state.selected_agents else [a["id"] for a in available_agents].index(st.session_state.selected_agents[0])
+st.session_state.agent_mode = st.sidebar.radio(
+    "Mode",
+    options=["single", "compare"],
+    format_func=lambda x: "Chat with one agent" if x == "single" else "Compare agents side by side",
+    index=0 if st.session_state.agent_mode == "single" else 1
 )
-st.session_state.selected_agents = [selected_agent]
+
+# Agent selection based on mode
+if st.session_state.agent_mode == "single":
+    selected_agent = st.sidebar.selectbox(
+        "Agent Mode",
+        options=[agent["id"] for agent in available_agents],
+        format_func=lambda x: next((a["name"] for a in available_agents if a["id"] == x), x),
+        index=0 if not st.session_state.selected_agents else [a["id"] for a in available_agents].index(st.session_state.selected_agents[0])
+    )
+    st.session_state.selected_agents = [selected_agent]
+else:
+    targets = comparison_targets()
+    target_keys = [target["key"] for target in targets]
+    compared_keys = st.sidebar.multiselect(
+        "Agents to compare",
+        options=target_keys,
+        default=[t["key"] for t in st.session_state.compared_agents if t["key"] in target_keys] or target_keys[:2],
+        format_func=lambda x: next((t["label"] for t in targets if t["key"] == x), x),
+        max_selections=MAX_COMPARED_AGENTS
+    )
+    st.session_state.compared_agents = [t for t in targets if t["key"] in compared_keys]
 
 # Reset conversation button
 if st.sidebar.button("Reset Conversation"):
     st.session_state.messages = []
+    st.session_state.archived_messages = 0
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.initialized = False
     st.rerun()
@@ -65,7 +161,12 @@ st.title("Bedrock Agent Chat Interface")
 
 # Display mode information
 
-if st.session_state.selected_agents:
+if st.session_state.agent_mode == "compare":
+    if len(st.session_state.compared_agents) >= 2:
+        st.info(f"Comparing: {', '.join(t['label'] for t in st.session_state.compared_agents)}")
+    else:
+        st.warning("Please select at least two agents to compare.")
+elif st.session_state.selected_agents:
     agent_name = next((a["name"] for a in available_agents if a["id"] == st.session_state.selected_agents[0]), 
                         st.session_state.selected_agents[0])
     st.info(f"Connected to: {agent_name}")
@@ -87,7 +188,7 @@ if not st.session_state.initialized and not st.session_state.messages:
     """
     
     # First add to session state so it's not displayed twice
-    st.session_state.messages.append({"role": "assistant", "content": welcome_message})
+    add_message({"role": "assistant", "content": welcome_message})
     st.session_state.initialized = True
     
     # Force a rerun to display the welcome message properly
@@ -109,21 +210,12 @@ def extract_agent_thoughts(model_input):
                 
                 # Process collaborators first
                 if "collaborators" in trace_data:
-                    for collab_name, collab_traces in trace_data["collaborators"].items():
+                    for collab_name, rationales in trace_data["collaborators"].items():
                         thoughts_output.append(f"**Collaborator: {collab_name}**")
                         
-                        # Extract rationales from each step, but skip the first one
-                        for i, trace in enumerate(collab_traces):
-                            # Skip the first rationale (index 0)
-                            if i == 0:
-                                continue
-                                
-                            if "orchestrationTrace" in trace and "rationale" in trace["orchestrationTrace"]:
-                                rationale = trace["orchestrationTrace"]["rationale"]
-                                if isinstance(rationale, dict) and "text" in rationale:
-                                    thoughts_output.append(f"```\n{rationale['text']}\n```")
-                                elif isinstance(rationale, str) and len(rationale) > 50:
-                                    thoughts_output.append(f"```\n{rationale}\n```")
+                        # The rationale of each step of the collaborator
+                        for rationale in rationales:
+                            thoughts_output.append(f"```\n{rationale}\n```")
                 
                 # Finally, add the main agent's rationale
                 if "rationale" in orchestration:
@@ -138,39 +230,116 @@ def extract_agent_thoughts(model_input):
     
     return thoughts_output
 
-# Display chat messages
+# Send the prompt to all the compared agents at once and stream each answer into its own column
+def compare_agents(targets, prompt):
+    columns = st.columns(len(targets))
+    answer_placeholders = []
+    stats_placeholders = []
+    for column, target in zip(columns, targets):
+        with column:
+            st.markdown(f"**{target['label']}**")
+            answer_placeholders.append(st.empty())
+            stats_placeholders.append(st.empty())
+    
+    # The agent streams are read in threads, only this script thread updates the page:
+    # the threads never call st.*, failures come back as done events with an error
+    events = queue.Queue()
+    
+    def consume(index, target, session_id):
+        try:
+            for event in invoke_bedrock_agent(
+                agent_id=target["id"],
+                agent_alias_id=target["alias_id"],
+                prompt=prompt,
+                session_id=session_id,
+                enable_trace=True
+            ):
+                events.put((index, event))
+        except Exception as e:
+            error_msg = f"Error invoking agent: {str(e)}"
+            events.put((index, {"type": "done", "completion": error_msg, "error": error_msg}))
+        finally:
+            events.put((index, None))
+    
+    start = time.perf_counter()
+    for index, target in enumerate(targets):
+        # Each agent keeps its own conversation
+        session_id = f"{st.session_state.session_id}-{target['id']}-{target['alias_id']}"
+        thread = threading.Thread(target=consume, args=(index, target, session_id), daemon=True)
+        thread.start()
+    
+    texts = [""] * len(targets)
+    responses = [{} for _ in targets]
+    stats = [{"first_chunk": None} for _ in targets]
+    for placeholder in answer_placeholders:
+        placeholder.markdown("Thinking...")
+    
+    running = len(targets)
+    while running:
+        index, event = events.get()
+        if event is None:
+            running -= 1
+            stats[index]["total"] = time.perf_counter() - start
+            usage = responses[index].get("usage")
+            stats[index]["input_tokens"] = usage["inputTokens"] if usage else None
+            stats[index]["output_tokens"] = usage["outputTokens"] if usage else None
+            texts[index] = responses[index].get("completion", texts[index] or "No response from agent")
+            if "error" in responses[index]:
+                answer_placeholders[index].error(responses[index]["error"])
+            else:
+                answer_placeholders[index].markdown(texts[index])
+            stats_placeholders[index].caption(format_stats(stats[index]))
+        elif event["type"] == "wait":
+            answer_placeholders[index].info(f"Waiting about {event['seconds']:.0f} seconds for our turn...")
+        elif event["type"] == "chunk":
+            if stats[index]["first_chunk"] is None:
+                stats[index]["first_chunk"] = time.perf_counter() - start
+            texts[index] += event["text"]
+            answer_placeholders[index].markdown(texts[index] + "▌")
+        elif event["type"] == "done":
+            responses[index] = event
+    
+    comparison = []
+    for column, target, text, response, agent_stats in zip(columns, targets, texts, responses, stats):
+        thoughts = extract_agent_thoughts({"trace": response["trace"]}) if "trace" in response else []
+        if thoughts:
+            with column:
+                with st.expander("Agent Thought Process", expanded=False):
+                    for thought in thoughts:
+                        st.markdown(thought)
+        comparison.append({"name": target["label"], "content": text, "thoughts": thoughts, "stats": agent_stats})
+    return comparison
+
+# Display chat messages from their stored form, thoughts were extracted when the response arrived
+if st.session_state.archived_messages:
+    archived_note = f"{st.session_state.archived_messages} earlier messages are not shown"
+    if HISTORY_SPILL_DIR:
+        archived_note += f", they are saved in {history_spill_path()}"
+    st.caption(archived_note)
+
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
-        if isinstance(message["content"], dict):
-            # For responses with trace information
-            if "completion" in message["content"]:
-                # Check if there's trace data with agent thoughts to display first
-                if "trace" in message["content"]:
-                    trace_data = message["content"]["trace"]
-                    
-                    # Try to extract agent thoughts directly from the trace data
-                    thoughts = extract_agent_thoughts({"trace": trace_data})
-                    if thoughts:
+        if "comparison" in message:
+            for column, answer in zip(st.columns(len(message["comparison"])), message["comparison"]):
+                with column:
+                    st.markdown(f"**{answer['name']}**")
+                    st.markdown(answer["content"])
+                    st.caption(format_stats(answer["stats"]))
+                    if answer.get("thoughts"):
                         with st.expander("Agent Thought Process", expanded=False):
-                            for thought in thoughts:
+                            for thought in answer["thoughts"]:
                                 st.markdown(thought)
-                
-                # Display the actual completion text
-                st.markdown(message["content"]["completion"])
-                
-            else:
-                # For multiple agent responses (legacy format)
-                for agent, response in message["content"].items():
-                    st.markdown(f"**{agent}**:")
-                    st.markdown(response)
-        else:
-            # For user messages and single agent responses
-            st.markdown(message["content"])
+            continue
+        st.markdown(message["content"])
+        if message.get("thoughts"):
+            with st.expander("Agent Thought Process", expanded=False):
+                for thought in message["thoughts"]:
+                    st.markdown(thought)
 
 # Chat input
 if prompt := st.chat_input("What would you like to ask?"):
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message({"role": "user", "content": prompt})
     
     # Display user message
     with st.chat_message("user"):
@@ -178,55 +347,64 @@ if prompt := st.chat_input("What would you like to ask?"):
     
     # Get response based on mode
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            agent_id = st.session_state.selected_agents[0]
-            agent_config = next((a for a in available_agents if a["id"] == agent_id), None)
+        agent_id = st.session_state.selected_agents[0] if st.session_state.selected_agents else None
+        agent_config = next((a for a in available_agents if a["id"] == agent_id), None)
+        
+        if st.session_state.agent_mode == "compare":
+            if len(st.session_state.compared_agents) >= 2:
+                comparison = compare_agents(st.session_state.compared_agents, prompt)
+                add_message({"role": "assistant", "comparison": comparison})
+            else:
+                st.error("Select at least two agents to compare.")
+        elif agent_config:
+            events = invoke_bedrock_agent(
+                agent_id=agent_config["id"],
+                agent_alias_id=agent_config["alias_id"],
+                prompt=prompt,
+                session_id=st.session_state.session_id,
+                enable_trace=True
+            )
             
-            if agent_config:
-                response = invoke_bedrock_agent(
-                    agent_id=agent_config["id"],
-                    agent_alias_id=agent_config["alias_id"],
-                    prompt=prompt,
-                    session_id=st.session_state.session_id,
-                    enable_trace=True
-                )
-                
-                # Display response with typing effect
-                message_placeholder = st.empty()
-                full_response = ""
-                
-                # Get the completion text
-                completion_text = response.get("completion", "No response from agent")
-                
-                # Check if there's trace data with agent thoughts to display first
-                agent_thoughts_displayed = False
-                if isinstance(response, dict) and "trace" in response:
-                    trace_data = response["trace"]
-                    
-                    # Try to extract agent thoughts directly from the trace data
-                    thoughts = extract_agent_thoughts({"trace": trace_data})
-                    if thoughts:
-                        with st.expander("Agent Thought Process", expanded=True):
-                            for thought in thoughts:
-                                st.markdown(thought)
-                        agent_thoughts_displayed = True
-                
-                # Simulate typing for the main response
-                for chunk in completion_text.split():
-                    full_response += chunk + " "
+            # Render the response as the agent generates it
+            message_placeholder = st.empty()
+            full_response = ""
+            response = {}
+            
+            # Show the spinner until the first part of the response arrives
+            with st.spinner("Thinking..."):
+                event = next(events, None)
+            
+            while event is not None:
+                if event["type"] == "wait":
+                    message_placeholder.info(
+                        f"Many questions are being asked right now, yours will be sent in about {event['seconds']:.0f} seconds."
+                    )
+                elif event["type"] == "chunk":
+                    full_response += event["text"]
                     message_placeholder.markdown(full_response + "▌")
-                    time.sleep(0.05)  # Adjust typing speed here
-                
-                # Display final response
-                message_placeholder.markdown(completion_text)
-                
-                # Add to session state after displaying
-                stored_response = {
-                    "completion": completion_text
-                }
-                if isinstance(response, dict) and "trace" in response:
-                    stored_response["trace"] = response["trace"]
-                
-                st.session_state.messages.append({"role": "assistant", "content": stored_response})
-            else:
-                st.error("Selected agent configuration not found.")
+                elif event["type"] == "done":
+                    response = event
+                    if "error" in event:
+                        st.error(event["error"])
+                event = next(events, None)
+            
+            # Get the completion text
+            completion_text = response.get("completion", full_response or "No response from agent")
+            
+            # Display final response
+            message_placeholder.markdown(completion_text)
+            
+            # Show the agent thoughts once the response is complete
+            thoughts = []
+            if "trace" in response:
+                # Try to extract agent thoughts directly from the trace data
+                thoughts = extract_agent_thoughts({"trace": response["trace"]})
+                if thoughts:
+                    with st.expander("Agent Thought Process", expanded=False):
+                        for thought in thoughts:
+                            st.markdown(thought)
+            
+            # Add to session state after displaying, only the extracted thoughts are kept
+            add_message({"role": "assistant", "content": completion_text, "thoughts": thoughts})
+        else:
+            st.error("Selected agent configuration not found.")
@@ -1,15 +1,152 @@
 import boto3
 import os
 import json
-import streamlit as st
+import requests
 from dotenv import load_dotenv
 import base64
 import time
-import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
+# Requests, events and combined traces are logged at DEBUG level
+logger = logging.getLogger(__name__)
+
+# Seconds the agent configuration is served from memory before it is refreshed in the background
+SECRET_CACHE_TTL = int(os.getenv("SECRET_CACHE_TTL", "300"))
+# Seconds to wait before trying again when loading or refreshing a cached value failed
+SECRET_RETRY_INTERVAL = 30
+# URL of the chat gateway (see gateway.py), agents are invoked directly when not set
+GATEWAY_URL = os.getenv("GATEWAY_URL")
+# Shared secret sent to the chat gateway in the GATEWAY_TOKEN_HEADER header, required by the gateway when set
+GATEWAY_TOKEN = os.getenv("GATEWAY_TOKEN")
+GATEWAY_TOKEN_HEADER = "X-Gateway-Token"
+# Seconds the list of agents in the account is served from memory before it is refreshed in the background
+AGENT_DIRECTORY_TTL = int(os.getenv("AGENT_DIRECTORY_TTL", "300"))
+# Agents whose aliases are listed in parallel
+AGENT_DIRECTORY_WORKERS = 8
+# Agent requests per second allowed for the whole process, adapted to throttling between the bounds
+AGENT_REQUESTS_PER_SECOND = float(os.getenv("AGENT_REQUESTS_PER_SECOND", "2"))
+AGENT_MIN_REQUESTS_PER_SECOND = float(os.getenv("AGENT_MIN_REQUESTS_PER_SECOND", "0.1"))
+AGENT_REQUEST_BURST = int(os.getenv("AGENT_REQUEST_BURST", "5"))
+# Waits longer than this are announced to the user
+ANNOUNCED_WAIT_SECONDS = 1
+# Rationales kept per collaborator, so memory does not grow with the length of a trace
+MAX_RATIONALES_PER_COLLABORATOR = 20
+
+
+class CachedValue:
+    """
+    A value loaded once per process and refreshed in the background.
+    
+    Streamlit re-executes the app on every interaction, so anything loaded from AWS in the
+    script would otherwise be fetched again on every click. The first call loads the value;
+    after that it is always returned from memory. Once it is older than the TTL, one background
+    thread reloads it while the previous value keeps being served. A load that fails (returns
+    None) is not cached: the default is served instead until the next attempt, at most every
+    SECRET_RETRY_INTERVAL seconds, so a failing service is not called again on every rerun.
+    """
+    
+    def __init__(self, load, ttl, default=None):
+        self._load = load
+        self._ttl = ttl
+        self._default = default
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._next_attempt = 0.0
+        self._refreshing = False
+    
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._value is None:
+                if now < self._next_attempt:
+                    return self._default
+                try:
+                    self._value = self._load()
+                except Exception as e:
+                    logger.warning(f"Error loading cached value: {str(e)}")
+                if self._value is None:
+                    self._next_attempt = time.monotonic() + SECRET_RETRY_INTERVAL
+                    return self._default
+                self._loaded_at = time.monotonic()
+                return self._value
+            if now - self._loaded_at > self._ttl and now >= self._next_attempt and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+            return self._value
+    
+    def _refresh(self):
+        try:
+            value = self._load()
+        except Exception as e:
+            value = None
+            logger.warning(f"Error refreshing cached value: {str(e)}")
+        with self._lock:
+            if value is not None:
+                self._value = value
+                self._loaded_at = time.monotonic()
+            else:
+                # Keep serving the last known value
+                self._next_attempt = time.monotonic() + SECRET_RETRY_INTERVAL
+            self._refreshing = False
+
+class AdaptiveRateLimiter:
+    """
+    A token bucket shared by all the sessions of the process.
+    
+    Every request reserves a token. When the bucket is empty the reservation goes negative,
+    so requests are admitted in arrival order, each one a 1 / rate interval after the
+    previous one, and the wait of each request is known when it is queued. The rate adapts
+    to the service: it is halved on every throttling response and grows back a little
+    with every successful request, up to the configured rate.
+    """
+    
+    def __init__(self, rate, burst, min_rate):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+    
+    def reserve(self):
+        """Reserve a token and return the seconds to wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+    
+    def on_success(self):
+        with self._lock:
+            # Additive increase, recovering the full rate after about 10 requests per request/s
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+    
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            # Multiplicative decrease, and no burst until the service has recovered
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            logger.warning(f"Agent requests throttled, limiting to {self.rate:.2f} requests per second")
+
+# Shared by every session for all bedrock-agent-runtime calls
+agent_rate_limiter = AdaptiveRateLimiter(
+    rate=AGENT_REQUESTS_PER_SECOND,
+    burst=AGENT_REQUEST_BURST,
+    min_rate=AGENT_MIN_REQUESTS_PER_SECOND
+)
+
 def get_bedrock_client(service_name="bedrock-runtime"):
     """
     Initialize and return a Bedrock client.
@@ -28,13 +165,25 @@ def get_bedrock_client(service_name="bedrock-runtime"):
         client = session.client(service_name=service_name)
         return client
     except Exception as e:
-        st.error(f"Error initializing {service_name} client: {str(e)}")
+        logger.error(f"Error initializing {service_name} client: {str(e)}")
         return None
 
 def get_secret():
     """
     Retrieve agent configuration from AWS Secrets Manager.
     
+    The secret is cached for the whole process and refreshed in the background every
+    SECRET_CACHE_TTL seconds, so reruns of the app do not call Secrets Manager.
+    
+    Returns:
+        dict: The secret containing agent configurations
+    """
+    return _secret_cache.get()
+
+def _fetch_secret():
+    """
+    Retrieve agent configuration from AWS Secrets Manager, bypassing the cache.
+    
     Returns:
         dict: The secret containing agent configurations
     """
@@ -66,9 +215,11 @@ def get_secret():
             return secret_data
             
     except Exception as e:
-        print(f"Error retrieving secret: {str(e)}")
+        logger.error(f"Error retrieving secret: {str(e)}")
         return None
 
+_secret_cache = CachedValue(_fetch_secret, ttl=SECRET_CACHE_TTL)
+
 def load_agent_config():
     """
     Load agent configuration from AWS Secrets Manager.
@@ -109,7 +260,7 @@ def load_agent_config():
         if agents:
             return agents
         else:
-            print("Secret retrieved but couldn't extract agent configurations")
+            logger.warning("Secret retrieved but couldn't extract agent configurations")
     
     # If no agents found in Secrets Manager, use demo values
     agents = [
@@ -124,38 +275,138 @@ def list_bedrock_agents():
     """
     List all available Bedrock agents in the account.
     
+    The list is cached for the whole process and refreshed in the background every
+    AGENT_DIRECTORY_TTL seconds.
+    
     Returns:
         list: List of agent information
     """
+    return _agent_directory.get()
+
+def _list_agent_aliases(client, agent_id):
+    aliases = []
+    try:
+        for page in client.get_paginator('list_agent_aliases').paginate(agentId=agent_id):
+            aliases.extend(
+                {'id': alias['agentAliasId'], 'name': alias['agentAliasName']}
+                for alias in page.get('agentAliasSummaries', [])
+            )
+    except Exception as e:
+        # e.g. the agent was deleted since it was listed, keep the other agents
+        logger.warning(f"Error listing aliases of agent {agent_id}: {str(e)}")
+    return aliases
+
+def _fetch_bedrock_agents():
+    """
+    List all Bedrock agents in the account with their aliases, bypassing the cache.
+    
+    Returns:
+        list: List of agent information, or None if they could not be listed
+    """
     try:
         client = boto3.client('bedrock-agent', region_name=os.getenv("AWS_REGION", "us-east-1"))
-        response = client.list_agents()
         
-        agents = []
-        for agent in response.get('agents', []):
-            # Get aliases for this agent
-            alias_response = client.list_agent_aliases(
-                agentId=agent['agentId']
-            )
-            
-            agent_info = {
+        summaries = []
+        for page in client.get_paginator('list_agents').paginate():
+            summaries.extend(page.get('agentSummaries', []))
+        
+        # Get the aliases of all agents at once instead of one agent after the other
+        with ThreadPoolExecutor(max_workers=AGENT_DIRECTORY_WORKERS) as executor:
+            aliases = list(executor.map(
+                lambda agent: _list_agent_aliases(client, agent['agentId']),
+                summaries
+            ))
+        
+        return [
+            {
                 'id': agent['agentId'],
                 'name': agent['agentName'],
-                'aliases': [{'id': alias['agentAliasId'], 'name': alias['agentAliasName']} 
-                           for alias in alias_response.get('agentAliases', [])]
+                'aliases': agent_aliases
             }
-            agents.append(agent_info)
-            
-        return agents
+            for agent, agent_aliases in zip(summaries, aliases)
+        ]
     except Exception as e:
         # Don't show error in UI since this is optional functionality
         # Just log to console for debugging
-        print(f"Error listing agents: {str(e)}")
-        return []
+        logger.warning(f"Error listing agents: {str(e)}")
+        return None
 
-def invoke_bedrock_agent(agent_id, agent_alias_id, prompt, session_id=None, enable_trace=True):
+_agent_directory = CachedValue(_fetch_bedrock_agents, ttl=AGENT_DIRECTORY_TTL, default=[])
+
+def summarize(obj, current_depth=0, max_depth=3):
+    """
+    Truncate a response or event for logging: nesting is limited to max_depth and lists
+    to their first 5 items.
     """
-    Invoke a Bedrock agent with the given prompt.
+    if current_depth >= max_depth:
+        if isinstance(obj, dict):
+            return {k: "..." for k in obj.keys()}
+        elif isinstance(obj, list):
+            return ["..."] if obj else []
+        else:
+            return obj
+    
+    if isinstance(obj, dict):
+        return {k: summarize(v, current_depth + 1, max_depth) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [summarize(item, current_depth + 1, max_depth) for item in obj[:5]]
+    else:
+        return obj
+
+class TraceAggregator:
+    """
+    Combines the trace events of an agent response in a single pass, as they arrive.
+    
+    For each trace type (orchestrationTrace, routingClassifierTrace, ...) the parts of all
+    events are merged into one dict, so later parts override earlier ones. For each
+    collaborator, only the text of its rationales is kept, up to
+    MAX_RATIONALES_PER_COLLABORATOR, so memory stays bounded however long the trace is.
+    The tokens of all model invocations, including those of collaborators, are summed.
+    """
+    
+    def __init__(self, max_rationales=MAX_RATIONALES_PER_COLLABORATOR):
+        self.max_rationales = max_rationales
+        self.combined = {}
+        # collaborator name -> texts of its rationales, in order
+        self.rationales = {}
+        self.usage = {"inputTokens": 0, "outputTokens": 0, "modelInvocations": 0}
+    
+    def add(self, trace_data):
+        """Merge one trace event (the "trace" member of a stream event)."""
+        inner_trace = trace_data.get("trace")
+        if isinstance(inner_trace, dict):
+            for key, value in inner_trace.items():
+                if isinstance(self.combined.get(key), dict) and isinstance(value, dict):
+                    # Merge dictionaries for the same trace type
+                    self.combined[key].update(value)
+                elif key not in self.combined:
+                    self.combined[key] = dict(value) if isinstance(value, dict) else value
+                
+                model_output = value.get("modelInvocationOutput") if isinstance(value, dict) else None
+                if isinstance(model_output, dict):
+                    usage = model_output.get("metadata", {}).get("usage", {})
+                    self.usage["inputTokens"] += usage.get("inputTokens", 0)
+                    self.usage["outputTokens"] += usage.get("outputTokens", 0)
+                    self.usage["modelInvocations"] += 1
+        
+        collab_name = trace_data.get("collaboratorName")
+        if collab_name:
+            rationales = self.rationales.setdefault(collab_name, [])
+            rationale = (inner_trace or {}).get("orchestrationTrace", {}).get("rationale")
+            if isinstance(rationale, dict):
+                rationale = rationale.get("text")
+            if rationale and len(rationales) < self.max_rationales:
+                rationales.append(rationale)
+    
+    def result(self):
+        """The combined trace, with the rationales of each collaborator under "collaborators"."""
+        if not self.rationales:
+            return dict(self.combined)
+        return {**self.combined, "collaborators": dict(self.rationales)}
+
+def invoke_bedrock_agent(agent_id, agent_alias_id, prompt, session_id=None, enable_trace=True, stream_final_response=True):
+    """
+    Invoke a Bedrock agent with the given prompt, yielding the response as it is generated.
     
     Args:
         agent_id (str): The ID of the Bedrock agent
@@ -163,107 +414,111 @@ def invoke_bedrock_agent(agent_id, agent_alias_id, prompt, session_id=None, enab
         prompt (str): The user prompt to send to the agent
         session_id (str, optional): Session ID for conversation context
         enable_trace (bool, optional): Whether to enable trace information
+        stream_final_response (bool, optional): Whether the agent streams its final response in
+                                                small chunks instead of a single one
     
-    Returns:
-        dict: Contains the agent's response and trace information if enabled
+    When GATEWAY_URL is set, the gateway invokes the agent and this only relays its events.
+    
+    Yields:
+        dict: the events of stream_agent_response
+    """
+    if GATEWAY_URL:
+        yield from _invoke_via_gateway(agent_id, agent_alias_id, prompt, session_id, enable_trace)
+        return
+    
+    client = get_bedrock_client("bedrock-agent-runtime")
+    if not client:
+        yield {
+            "type": "done",
+            "completion": "Error: Could not initialize Bedrock client",
+            "error": "Could not initialize Bedrock client. Please check your AWS configuration."
+        }
+        return
+    
+    if not session_id:
+        session_id = f"streamlit-session-{hash(prompt)}"
+    
+    invoke_params = {
+        "agentId": agent_id,
+        "agentAliasId": agent_alias_id,
+        "sessionId": session_id,
+        "inputText": prompt,
+        "streamingConfigurations": {"streamFinalResponse": stream_final_response}
+    }
+    
+    # Enable trace information if requested
+    if enable_trace:
+        invoke_params["enableTrace"] = True
+    
+    yield from stream_agent_response(client, invoke_params)
+
+def stream_agent_response(client, invoke_params, rate_limiter=agent_rate_limiter, max_retries=3):
+    """
+    Invoke an agent and yield its response as it is generated. Used by the app and by the gateway.
+    
+    Args:
+        client: bedrock-agent-runtime client
+        invoke_params (dict): parameters of invoke_agent
+        rate_limiter (AdaptiveRateLimiter, optional): admission control of the requests
+        max_retries (int, optional): retries of a throttled request, as long as nothing was yielded
+    
+    Requests go through the rate limiter. Throttled requests are retried through it as well,
+    so sessions do not retry all at once.
+    
+    Nothing is written to the page from here, so the events can be read from any thread:
+    failures are reported in the "error" of the done event, for the caller to show.
+    
+    Yields:
+        dict: {"type": "wait", "seconds": ...} when the request is queued by the rate limiter
+              for more than ANNOUNCED_WAIT_SECONDS,
+              {"type": "chunk", "text": ...} for each part of the response as it arrives, then
+              {"type": "done", "completion": ..., "trace": ..., "usage": ...} with the full
+              response, the combined trace information and the token usage (if enabled and found),
+              or {"type": "done", "completion": ..., "error": ...} when the invocation failed
     """
-    max_retries = 3
     retry_count = 0
-    base_delay = 2  # Base delay in seconds
+    # Once part of the response has been shown, a retry would repeat it
+    chunks_yielded = False
     
     try:
-        client = get_bedrock_client("bedrock-agent-runtime")
-        if not client:
-            return {"completion": "Error: Could not initialize Bedrock client"}
-        
-        if not session_id:
-            session_id = f"streamlit-session-{hash(prompt)}"
-        
         while retry_count <= max_retries:
             try:
-                with st.spinner("Waiting for agent response..."):
-                    # Enable trace information if requested
-                    invoke_params = {
-                        "agentId": agent_id,
-                        "agentAliasId": agent_alias_id,
-                        "sessionId": session_id,
-                        "inputText": prompt
-                    }
-                    
-                    if enable_trace:
-                        invoke_params["enableTrace"] = True
-                    
-                    # Log the parameters being sent
-                    print(f"DEBUG - Invoking agent with params: {json.dumps(invoke_params, default=str)}")
-                    
-                    response = client.invoke_agent(**invoke_params)
-                    
-                    # Log the entire raw response structure (with limited depth for readability)
-                    print("DEBUG - Beginning of full response dump")
-                    print("=" * 80)
-                    
-                    # Create a custom JSON encoder to handle non-serializable objects
-                    class CustomEncoder(json.JSONEncoder):
-                        def default(self, obj):
-                            try:
-                                return super().default(obj)
-                            except TypeError:
-                                return str(obj)
-                    
-                    # Function to recursively process the response with depth limit
-                    def process_response(obj, current_depth=0, max_depth=3):
-                        if current_depth >= max_depth:
-                            if isinstance(obj, dict):
-                                return {k: "..." for k in obj.keys()}
-                            elif isinstance(obj, list):
-                                return ["..."] if obj else []
-                            else:
-                                return obj
-                        
-                        if isinstance(obj, dict):
-                            return {k: process_response(v, current_depth + 1, max_depth) for k, v in obj.items()}
-                        elif isinstance(obj, list):
-                            return [process_response(item, current_depth + 1, max_depth) for item in obj[:5]]  # Limit to first 5 items
-                        else:
-                            return obj
-                    
-                    # Process and print the response
-                    processed_response = process_response(response)
-                    print(json.dumps(processed_response, indent=2, cls=CustomEncoder))
-                    print("=" * 80)
-                    print("DEBUG - End of full response dump")
-                    
-                    # Log the raw response keys
-                    print(f"DEBUG - Response keys: {list(response.keys())}")
-                    
-                    # Extract the completion from the response
-                    completion = ""
+                # Wait for our turn, telling the user when it takes a while
+                wait = rate_limiter.reserve()
+                if wait > ANNOUNCED_WAIT_SECONDS:
+                    yield {"type": "wait", "seconds": wait}
+                if wait > 0:
+                    time.sleep(wait)
+                
+                logger.debug(f"Invoking agent with params: {json.dumps(invoke_params, default=str)}")
+                
+                response = client.invoke_agent(**invoke_params)
+                
+                # Extract the completion from the response
+                completion = ""
+                trace = TraceAggregator()
+                
+                # The response contains an EventStream in the 'completion' field
+                # Each event is handled once as it arrives and is not kept
+                for event in response.get("completion", []):
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Event: {json.dumps(summarize(event), indent=2, default=str)}")
                     
-                    # The response contains an EventStream in the 'completion' field
-                    # We need to iterate through it to get all chunks
-                    completion_events = []
-                    for event in response.get("completion", []):
-                        completion_events.append(event)  # Store for later analysis
-                        print(f"DEBUG - Event keys: {list(event.keys() if isinstance(event, dict) else [])}")
-                        
-                        # Check if this event contains a chunk
-                        if "chunk" in event:
-                            chunk = event["chunk"]
-                            if "bytes" in chunk:
-                                completion += chunk["bytes"].decode("utf-8")
-                        
-                        # Check if this event contains trace information
-                        if "trace" in event:
-                            print(f"DEBUG - Found trace in event")
-                            trace_data = event["trace"]
-                            print(f"DEBUG - Trace keys: {list(trace_data.keys() if isinstance(trace_data, dict) else [])}")
+                    # Check if this event contains a chunk
+                    if "chunk" in event:
+                        chunk = event["chunk"]
+                        if "bytes" in chunk:
+                            text = chunk["bytes"].decode("utf-8")
+                            completion += text
+                            chunks_yielded = True
+                            yield {"type": "chunk", "text": text}
                     
-                    # Log all completion events for analysis
-                    print(f"DEBUG - Found {len(completion_events)} completion events")
-                    for i, event in enumerate(completion_events):
-                        print(f"DEBUG - Completion event {i} keys: {list(event.keys() if isinstance(event, dict) else [])}")
-                        processed_event = process_response(event)
-                        print(f"DEBUG - Completion event {i} content: {json.dumps(processed_event, indent=2, cls=CustomEncoder)}")
+                    # Check if this event contains trace information
+                    if "trace" in event:
+                        trace.add(event["trace"])
+                
+                # Throttling is reported inside the stream, so only a complete stream is a success
+                rate_limiter.on_success()
                 
                 if not completion:
                     # Try alternative response format
@@ -271,102 +526,80 @@ def invoke_bedrock_agent(agent_id, agent_alias_id, prompt, session_id=None, enab
                 
                 # Prepare the result with completion
                 result = {
+                    "type": "done",
                     "completion": completion
                 }
                 
-                # Extract and combine trace information from all events
-                combined_trace = {}
-                
-                # Process all trace events to build a comprehensive trace structure
-                for event in completion_events:
-                    if "trace" in event:
-                        trace_data = event["trace"]
-                        
-                        # Extract the inner trace if it exists
-                        if "trace" in trace_data:
-                            inner_trace = trace_data["trace"]
-                            
-                            # Process different trace types
-                            for key, value in inner_trace.items():
-                                # Initialize the key in combined_trace if it doesn't exist
-                                if key not in combined_trace:
-                                    combined_trace[key] = value
-                                elif isinstance(combined_trace[key], dict) and isinstance(value, dict):
-                                    # Merge dictionaries for the same trace type
-                                    combined_trace[key].update(value)
-                        
-                        # Process collaborator information
-                        if "collaboratorName" in trace_data:
-                            if "collaborators" not in combined_trace:
-                                combined_trace["collaborators"] = {}
-                            
-                            collab_name = trace_data["collaboratorName"]
-                            if collab_name not in combined_trace["collaborators"]:
-                                combined_trace["collaborators"][collab_name] = []
-                            
-                            # Add this trace to the collaborator's traces
-                            if "trace" in trace_data:
-                                combined_trace["collaborators"][collab_name].append(trace_data["trace"])
-                
-                # Add orchestration trace if available
-                for event in completion_events:
-                    if "trace" in event and "trace" in event["trace"]:
-                        inner_trace = event["trace"]["trace"]
-                        if "orchestrationTrace" in inner_trace:
-                            if "orchestrationTrace" not in combined_trace:
-                                combined_trace["orchestrationTrace"] = inner_trace["orchestrationTrace"]
-                            elif isinstance(combined_trace["orchestrationTrace"], dict) and isinstance(inner_trace["orchestrationTrace"], dict):
-                                combined_trace["orchestrationTrace"].update(inner_trace["orchestrationTrace"])
-                
-                # Add routing classifier trace if available
-                for event in completion_events:
-                    if "trace" in event and "trace" in event["trace"]:
-                        inner_trace = event["trace"]["trace"]
-                        if "routingClassifierTrace" in inner_trace:
-                            if "routingClassifierTrace" not in combined_trace:
-                                combined_trace["routingClassifierTrace"] = inner_trace["routingClassifierTrace"]
-                            elif isinstance(combined_trace["routingClassifierTrace"], dict) and isinstance(inner_trace["routingClassifierTrace"], dict):
-                                combined_trace["routingClassifierTrace"].update(inner_trace["routingClassifierTrace"])
-                
                 # Add the combined trace to the result if we found any trace data
+                combined_trace = trace.result()
                 if combined_trace:
                     result["trace"] = combined_trace
-                    print(f"DEBUG - Added combined trace to result with keys: {list(combined_trace.keys())}")
-                    
-                    # Log specific trace components for debugging
-                    if "orchestrationTrace" in combined_trace:
-                        print(f"DEBUG - OrchestrationTrace keys: {list(combined_trace['orchestrationTrace'].keys())}")
-                    if "routingClassifierTrace" in combined_trace:
-                        print(f"DEBUG - RoutingClassifierTrace keys: {list(combined_trace['routingClassifierTrace'].keys())}")
-                    if "collaborators" in combined_trace:
-                        print(f"DEBUG - Found traces for collaborators: {list(combined_trace['collaborators'].keys())}")
+                    result["usage"] = trace.usage
+                    logger.debug(f"Combined trace: {json.dumps(summarize(combined_trace), indent=2, default=str)}")
                 else:
-                    print(f"DEBUG - No trace data found in response")
+                    logger.debug("No trace data found in response")
                 
-                return result
+                yield result
+                return
                 
             except Exception as e:
-                if "throttlingException" in str(e) and retry_count < max_retries:
+                if "throttlingException" in str(e):
+                    rate_limiter.on_throttle()
+                if "throttlingException" in str(e) and retry_count < max_retries and not chunks_yielded:
+                    # Queue again behind the other sessions, at the reduced rate
                     retry_count += 1
-                    # Calculate delay with exponential backoff and jitter
-                    delay = (base_delay * (2 ** retry_count)) + (random.randint(0, 1000) / 1000)
-                    # Silently wait without showing status
-                    time.sleep(delay)
                 else:
                     # If it's not a throttling exception or we've exhausted retries
-                    print(f"DEBUG - Exception during agent invocation: {str(e)}")
+                    logger.error(f"Exception during agent invocation: {str(e)}")
                     raise e
         
-        return {"completion": "Error: Maximum retries exceeded due to rate limiting"}
+        yield {
+            "type": "done",
+            "completion": "Error: Maximum retries exceeded due to rate limiting",
+            "error": "Rate limit exceeded. Please try again in a few moments."
+        }
         
     except Exception as e:
         error_msg = f"Error invoking agent: {str(e)}"
         
         if "throttlingException" in str(e):
-            st.error("Rate limit exceeded. Please try again in a few moments.")
+            alert = "Rate limit exceeded. Please try again in a few moments."
         elif "ResourceNotFoundException" in str(e):
-            st.error("Could not connect to agent. Please check your configuration.")
+            alert = "Could not connect to agent. Please check your configuration."
         else:
-            st.error(error_msg)
+            alert = error_msg
         
-        return {"completion": error_msg}
+        yield {"type": "done", "completion": error_msg, "error": alert}
+
+def _invoke_via_gateway(agent_id, agent_alias_id, prompt, session_id=None, enable_trace=True):
+    """
+    Relay the events of an agent invocation made by the chat gateway.
+    
+    Yields:
+        dict: the same events as invoke_bedrock_agent
+    """
+    if not session_id:
+        session_id = f"streamlit-session-{hash(prompt)}"
+    
+    try:
+        with requests.post(
+            f"{GATEWAY_URL.rstrip('/')}/invoke",
+            json={
+                "agent_id": agent_id,
+                "agent_alias_id": agent_alias_id,
+                "prompt": prompt,
+                "session_id": session_id,
+                "enable_trace": enable_trace
+            },
+            headers={GATEWAY_TOKEN_HEADER: GATEWAY_TOKEN} if GATEWAY_TOKEN else None,
+            stream=True,
+            timeout=(5, 600)
+        ) as response:
+            response.raise_for_status()
+            # Server-Sent Events, one JSON event per "data:" line
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    yield json.loads(line[len("data:"):])
+    except Exception as e:
+        error_msg = f"Error invoking agent through the gateway: {str(e)}"
+        yield {"type": "done", "completion": error_msg, "error": error_msg}
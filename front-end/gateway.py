@@ -0,0 +1,238 @@
+"""
+Asynchronous chat gateway in front of Bedrock agents.
+
+The Streamlit app invokes agents in its script thread, so every browser session keeps a
+Streamlit worker busy for the whole agent run. The gateway owns a pooled bedrock-agent-runtime
+client instead. It runs each invocation as an asyncio task and streams the events to the
+clients as Server-Sent Events. Identical requests that are still in flight (same agent,
+alias, session and prompt, e.g. a double submit) share one invocation.
+
+Run it next to the app and point the app at it:
+
+    uvicorn gateway:app --host 127.0.0.1 --port 8080
+    GATEWAY_URL=http://localhost:8080 streamlit run app.py
+
+The gateway invokes agents with its own AWS credentials, so it only serves the agents of
+load_agent_config(). When GATEWAY_TOKEN is set, /invoke also requires it in the
+X-Gateway-Token header; set it on both sides before listening on another interface.
+
+Endpoints:
+    POST /invoke   {"agent_id", "agent_alias_id", "prompt", "session_id", "enable_trace"}
+                   streams the events of invoke_bedrock_agent ("wait", "chunk", "done")
+    GET  /health   number of invocations in flight and of deduplicated requests
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from bedrock_utils import (
+    GATEWAY_TOKEN,
+    GATEWAY_TOKEN_HEADER,
+    agent_rate_limiter,
+    load_agent_config,
+    stream_agent_response,
+)
+
+logger = logging.getLogger(__name__)
+
+# Agent invocations running at the same time, each one streams its response on a pooled connection
+GATEWAY_MAX_CONCURRENT_INVOCATIONS = int(os.getenv("GATEWAY_MAX_CONCURRENT_INVOCATIONS", "64"))
+# Retries of a throttled invocation, as long as nothing was streamed yet
+GATEWAY_MAX_RETRIES = 3
+
+
+class Invocation:
+    """
+    One agent invocation and the events it produced so far.
+
+    Every subscriber gets all the events from the start, so a request that joins an
+    invocation already in flight misses nothing.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.finished = True
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        """Yield every event of the invocation, waiting for new ones until it finishes."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.finished)
+                new_events = self.events[index:]
+                finished = self.finished
+            for event in new_events:
+                yield event
+            index += len(new_events)
+            if finished and index == len(self.events):
+                return
+
+
+class AgentGateway:
+    """
+    Runs agent invocations as asyncio tasks on a shared client.
+
+    Invocations go through stream_agent_response, like in the app. boto3 streams are blocking,
+    so the response is read on a thread pool sized like the connection pool, one event at a time.
+    Admission goes through the same adaptive rate limiter as the app.
+
+    Args:
+        client: bedrock-agent-runtime client, created with a connection pool of
+                max_concurrency connections when not given
+        max_concurrency (int): invocations running at the same time
+        rate_limiter (AdaptiveRateLimiter): shared admission control
+    """
+
+    def __init__(self, client=None, max_concurrency=GATEWAY_MAX_CONCURRENT_INVOCATIONS, rate_limiter=agent_rate_limiter):
+        if client is None:
+            client = boto3.Session(region_name=os.getenv("AWS_REGION", "us-east-1")).client(
+                "bedrock-agent-runtime",
+                config=Config(max_pool_connections=max_concurrency, read_timeout=600)
+            )
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent-stream")
+        self._semaphore = None
+        self._inflight = {}
+        self.deduplicated = 0
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+    def invoke(self, agent_id, agent_alias_id, prompt, session_id, enable_trace=True):
+        """
+        Start an invocation, or join the identical one already in flight.
+
+        Returns:
+            Invocation: subscribe to it to receive the events
+        """
+        key = (agent_id, agent_alias_id, session_id, prompt, enable_trace)
+        invocation = self._inflight.get(key)
+        if invocation is not None:
+            self.deduplicated += 1
+            return invocation
+
+        invocation = self._inflight[key] = Invocation()
+        params = {
+            "agentId": agent_id,
+            "agentAliasId": agent_alias_id,
+            "sessionId": session_id,
+            "inputText": prompt,
+            "enableTrace": enable_trace,
+            "streamingConfigurations": {"streamFinalResponse": True}
+        }
+        asyncio.get_running_loop().create_task(self._run(key, invocation, params))
+        return invocation
+
+    async def _in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _run(self, key, invocation, params):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async with self._semaphore:
+                # the same stream processing as the app, one blocking step at a time on the executor
+                events = stream_agent_response(self.client, params, self.rate_limiter, GATEWAY_MAX_RETRIES)
+                while True:
+                    event = await self._in_thread(next, events, None)
+                    if event is None:
+                        break
+                    await invocation.publish(event)
+        except Exception as e:
+            logger.error(f"Exception during agent invocation: {str(e)}")
+            error_msg = f"Error invoking agent: {str(e)}"
+            await invocation.publish({"type": "done", "completion": error_msg, "error": error_msg})
+        finally:
+            self._inflight.pop(key, None)
+            await invocation.finish()
+
+
+def create_app(gateway=None, token=GATEWAY_TOKEN, allowed_agents=None):
+    """
+    Create the ASGI application.
+
+    Args:
+        gateway (AgentGateway, optional): created on startup when not given
+        token (str, optional): shared secret required in the X-Gateway-Token header of /invoke
+        allowed_agents (set, optional): (agent id, alias id) pairs that may be invoked, the
+                                        agents of load_agent_config() when not given
+    """
+    state = {"gateway": gateway}
+
+    def is_allowed(agent_id, agent_alias_id):
+        if allowed_agents is not None:
+            return (agent_id, agent_alias_id) in allowed_agents
+        return any(
+            agent["id"] == agent_id and agent["alias_id"] == agent_alias_id for agent in load_agent_config()
+        )
+
+    def get_gateway():
+        if state["gateway"] is None:
+            state["gateway"] = AgentGateway()
+        return state["gateway"]
+
+    async def invoke(request: Request):
+        if token and not hmac.compare_digest(request.headers.get(GATEWAY_TOKEN_HEADER, ""), token):
+            return JSONResponse({"error": "Invalid or missing gateway token"}, status_code=401)
+
+        body = await request.json()
+        missing = [field for field in ("agent_id", "agent_alias_id", "prompt", "session_id") if not body.get(field)]
+        if missing:
+            return JSONResponse({"error": f"Missing fields: {', '.join(missing)}"}, status_code=400)
+        if not is_allowed(body["agent_id"], body["agent_alias_id"]):
+            return JSONResponse({"error": "Agent is not configured on this gateway"}, status_code=403)
+
+        invocation = get_gateway().invoke(
+            agent_id=body["agent_id"],
+            agent_alias_id=body["agent_alias_id"],
+            prompt=body["prompt"],
+            session_id=body["session_id"],
+            enable_trace=body.get("enable_trace", True)
+        )
+
+        async def event_stream():
+            async for event in invocation.subscribe():
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    async def health(request: Request):
+        gateway = get_gateway()
+        return JSONResponse({"status": "ok", "inflight": gateway.inflight, "deduplicated": gateway.deduplicated})
+
+    return Starlette(routes=[
+        Route("/invoke", invoke, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+
+
+app = create_app()
@@ -0,0 +1,136 @@
+"""
+Local load test of the chat gateway against a stub agent runtime.
+
+The stub answers every invocation with a fixed number of chunks after a simulated model
+latency, so the test measures the gateway itself: how many concurrent chat sessions one
+process serves, time to first chunk, and deduplication of identical in-flight requests.
+No AWS call is made.
+
+    python load_test.py --sessions 200 --duplicates 0.1
+
+Requires httpx (pip install httpx).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from bedrock_utils import AdaptiveRateLimiter
+from gateway import AgentGateway, create_app
+
+
+class StubAgentRuntime:
+    """
+    Stands in for the bedrock-agent-runtime client: invoke_agent returns a completion stream
+    that blocks like the real one.
+
+    Args:
+        first_chunk_delay (float): seconds before the first chunk, the model latency
+        chunks (int): chunks per answer
+        chunk_delay (float): seconds between chunks
+    """
+
+    def __init__(self, first_chunk_delay=1.0, chunks=20, chunk_delay=0.05):
+        self.first_chunk_delay = first_chunk_delay
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.invocations = 0
+        self._lock = threading.Lock()
+
+    def invoke_agent(self, **params):
+        with self._lock:
+            self.invocations += 1
+
+        def completion():
+            time.sleep(self.first_chunk_delay)
+            yield {"trace": {"trace": {"orchestrationTrace": {"rationale": {"text": "Answering"}}}}}
+            for i in range(self.chunks):
+                yield {"chunk": {"bytes": f"word{i} ".encode("utf-8")}}
+                time.sleep(self.chunk_delay)
+
+        return {"completion": completion()}
+
+
+async def chat(client, url, session_id, prompt):
+    """Send one question and return (time to first chunk, total time, answer)."""
+    start = time.perf_counter()
+    first_chunk = None
+    answer = None
+    async with client.stream(
+        "POST",
+        f"{url}/invoke",
+        json={"agent_id": "stub", "agent_alias_id": "TSTALIASID", "prompt": prompt, "session_id": session_id},
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            if event["type"] == "chunk" and first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            elif event["type"] == "done":
+                answer = event["completion"]
+    return first_chunk, time.perf_counter() - start, answer
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(args):
+    runtime = StubAgentRuntime(args.first_chunk_delay, args.chunks, args.chunk_delay)
+    gateway = AgentGateway(
+        client=runtime,
+        max_concurrency=args.max_concurrency,
+        # the stub is never throttled, do not let admission control skew the measure
+        rate_limiter=AdaptiveRateLimiter(rate=10000, burst=10000, min_rate=1),
+    )
+    app = create_app(gateway, token=None, allowed_agents={("stub", "TSTALIASID")})
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # some sessions submit the same question twice, as with a double click
+    requests = [(f"session-{i}", f"question {i}") for i in range(args.sessions)]
+    requests += random.sample(requests, int(args.sessions * args.duplicates))
+    random.shuffle(requests)
+
+    url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=len(requests))
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(chat(client, url, session_id, prompt) for session_id, prompt in requests))
+        elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    first_chunks = [first_chunk for first_chunk, _, _ in results if first_chunk is not None]
+    totals = [total for _, total, _ in results]
+    answer_time = args.first_chunk_delay + args.chunks * args.chunk_delay
+    print(f"Requests:              {len(requests)} ({args.sessions} sessions)")
+    print(f"Agent invocations:     {runtime.invocations} ({gateway.deduplicated} deduplicated)")
+    print(f"Wall time:             {elapsed:.2f}s, one answer takes {answer_time:.2f}s")
+    print(f"Time to first chunk:   p50 {statistics.median(first_chunks):.2f}s, p95 {percentile(first_chunks, 0.95):.2f}s")
+    print(f"Time to full answer:   p50 {statistics.median(totals):.2f}s, p95 {percentile(totals, 0.95):.2f}s")
+    print(f"Complete answers:      {sum(1 for _, _, answer in results if answer and answer.startswith('word0'))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent chat sessions")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of sessions that submit twice")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="gateway invocations at the same time")
+    parser.add_argument("--first-chunk-delay", type=float, default=1.0, help="simulated model latency")
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per answer")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="seconds between chunks")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))